@@ -0,0 +1,5 @@
+#!/usr/bin/env python
+"""
+Benchmarks of Ojala Cita Previa, run against a local stand-in of the website.
+Run them with `python -m benchmarks`.
+"""
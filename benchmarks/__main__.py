@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+import argparse
+import datetime
+import json
+import platform
+import sys
+from typing import List, Dict, Any, Optional
+
+import urllib3
+
+import ojala_cita_previa
+from benchmarks import probe_bench
+
+
+def _ms(value: Optional[float]) -> str:
+	return f'{value * 1000:.2f}' if value is not None else '-'
+
+
+def _per_probe_kib(result: Dict[str, Any]) -> str:
+	"""
+	Return the size of the bodies received per probe, in KiB.
+	"""
+	if result['probes'] == 0:
+		return '-'
+	return f'{result["compressed_bytes"] / result["probes"] / 1024:.1f}'
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+	print(
+		f'{"scenario":<19} {"mode":<7} {"probes/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"parse ms":>9} {"peak KiB":>9} {"new conns":>9} {"rx KiB":>8}'
+	)
+	for result in results:
+		print(
+			f'{result["scenario"]:<19} {result["detection_mode"]:<7} {result["probes_per_s"] or 0:>9.1f} {_ms(result["latency_s"]["p50"]):>8} {_ms(result["latency_s"]["p99"]):>8} {_ms(result["parse_s"]["mean"]):>9} {result["peak_memory_bytes"] / 1024:>9.1f} {result["connections_created"]:>9} {_per_probe_kib(result):>8}'
+		)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(
+		prog='benchmarks',
+		description='Benchmark the probes against a local stand-in of the website.',
+	)
+	parser.add_argument(
+		'--scenario',
+		'-s',
+		action='append',
+		default=None,
+		help=f'A route of the stand-in server to benchmark. Can be given several times. Defaults to {", ".join(probe_bench.DEFAULT_SCENARIOS)}.'
+	)
+	parser.add_argument(
+		'--detection-mode',
+		'-m',
+		action='append',
+		choices=('stream', 'full'),
+		default=None,
+		help='The detection mode to benchmark. Defaults to both.')
+	parser.add_argument(
+		'--duration',
+		type=float,
+		default=2,
+		help='The duration of each benchmark, in seconds. Defaults to 2.')
+	parser.add_argument(
+		'--concurrency',
+		type=int,
+		default=1,
+		help='The number of probes in flight at the same time. Defaults to 1.')
+	parser.add_argument(
+		'--memory-probes',
+		type=int,
+		default=20,
+		help='The number of probes used to measure the memory. Defaults to 20.')
+	parser.add_argument(
+		'--output',
+		'-o',
+		type=str,
+		default=None,
+		help='The JSON file where the results are written. If not given, they are only printed.'
+	)
+	args = parser.parse_args(argv)
+
+	results: List[Dict[str, Any]] = probe_bench.run(
+		scenarios=args.scenario,
+		detection_modes=args.detection_mode,
+		duration_s=args.duration,
+		concurrency=args.concurrency,
+		memory_probes=args.memory_probes,
+	)
+	print_table(results)
+
+	if args.output is not None:
+		report: Dict[str, Any] = {
+			'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+			'version': ojala_cita_previa.__version__,
+			'python': sys.version.split()[0],
+			'implementation': platform.python_implementation(),
+			'platform': platform.platform(),
+			'urllib3': urllib3.__version__,
+			'results': results,
+		}
+		with open(args.output, mode='w', encoding='utf-8') as f:
+			json.dump(report, f, indent=2)
+			f.write('\n')
+		print(f'Results written in "{args.output}".')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+Follow the appointment flow of a local stand-in of the website with the deep
+check, and measure the cost of each check: its latency, the requests it
+sends, and the connections it opens.
+
+Run it with `python -m benchmarks.deep_check_bench`.
+"""
+import argparse
+import json
+import time
+from typing import List, Optional, Dict, Any
+
+import urllib3
+
+import ojala_cita_previa.io.network as net
+from ojala_cita_previa.io.pool import PoolStatistics, CONNECTION_CREATED, \
+ CONNECTION_REUSED
+from ojala_cita_previa.monitor.deep_check import DeepChecker, DeepCheckStep
+from ojala_cita_previa.monitor.probe import Prober, ProbeResult
+from ojala_cita_previa.utils.duration_aggregator import DurationAggregator
+
+from benchmarks.server import StandInServer, CitaFlow, default_routes
+
+TARGET_PATH: str = '/icpplus/index.html'
+
+# The steps of the flow of the stand-in server, after the index page
+STEPS = (
+	DeepCheckStep(
+		name='procedures',
+		url='/icpplustieb/citar?p=32',
+		static=True,
+		expect='portadaForm',
+	),
+	DeepCheckStep(
+		name='entry',
+		url='/icpplustieb/acEntrada',
+		method='POST',
+		fields={'tramiteGrupo[0]': '4010'},
+		expect='citadoForm',
+	),
+	DeepCheckStep(
+		name='slots',
+		url='/icpplustieb/acCitar',
+		method='POST',
+		fields={
+			'txtIdCitado': 'Y1234567X',
+			'txtDesCitado': 'JOHN DOE',
+		},
+		expect='(?i)oficina|no hay citas disponibles',
+	),
+)
+
+
+def run(
+	checks: int = 200,
+	expire_every: int = 50,
+	cache_ttl_s: float = 3600,
+) -> Dict[str, Any]:
+	"""
+	Probe the stand-in server `checks` times with the deep check, the
+	appointments being available every other check.
+	:param checks: The number of probes.
+	:param expire_every: The sessions of the server expire every
+	`expire_every` probes, so the flow has to be restarted. If 0, they never
+	expire.
+	:param cache_ttl_s: How long the static pages are cached, in seconds.
+	:return: Returns the results, as a JSON-compatible dictionary.
+	"""
+	flow: CitaFlow = CitaFlow()
+	routes = default_routes()
+	routes.update(flow.routes())
+	with StandInServer(routes) as server:
+		net.init(maxsize=1)
+		deep_checker: DeepChecker = DeepChecker(STEPS, cache_ttl_s=cache_ttl_s)
+		prober: Prober = Prober(
+			timeout=urllib3.Timeout(connect=5, read=10),
+			deep_checker=deep_checker,
+		)
+		url: str = server.url(TARGET_PATH)
+		durations: DurationAggregator = DurationAggregator()
+		wrong: int = 0
+		connections: PoolStatistics = net.statistics()
+		connections.reset()
+		begin: float = time.perf_counter()
+		for index in range(checks):
+			if expire_every > 0 and index > 0 and index % expire_every == 0:
+				flow.expire()
+			flow.available = index % 2 == 1
+			check_begin: float = time.perf_counter()
+			result: ProbeResult = prober.probe(url)
+			durations.record(time.perf_counter() - check_begin)
+			if result.online != flow.available:
+				wrong += 1
+		elapsed_s: float = time.perf_counter() - begin
+		net.dispose()
+
+	return {
+		'checks': checks,
+		'duration_s': elapsed_s,
+		'checks_per_s': checks / elapsed_s if elapsed_s > 0 else None,
+		'latency_s': durations.summary(),
+		'wrong_results': wrong,
+		'requests_per_check': sum(server.hits.values()) / checks,
+		'hits': dict(server.hits),
+		'deep_check': dict(deep_checker.counts),
+		'connections_created': connections.total(CONNECTION_CREATED),
+		'connections_reused': connections.total(CONNECTION_REUSED),
+	}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(
+		prog='benchmarks.deep_check_bench',
+		description='Measure the cost of the deep check against a local stand-in of the appointment flow.',
+	)
+	parser.add_argument(
+		'--checks',
+		'-n',
+		type=int,
+		default=200,
+		help='The number of probes. Defaults to 200.')
+	parser.add_argument(
+		'--expire-every',
+		type=int,
+		default=50,
+		help='Expire the sessions of the server every N probes. 0 to never expire them. Defaults to 50.'
+	)
+	parser.add_argument(
+		'--cache-ttl',
+		type=float,
+		default=3600,
+		help='How long the static pages are cached, in seconds. Defaults to 3600.'
+	)
+	parser.add_argument(
+		'--output',
+		'-o',
+		type=str,
+		default=None,
+		help='The JSON file where the results are written.')
+	args = parser.parse_args(argv)
+
+	result: Dict[str, Any] = run(
+		checks=args.checks,
+		expire_every=args.expire_every,
+		cache_ttl_s=args.cache_ttl,
+	)
+	print(
+		f'{result["checks"]} checks in {result["duration_s"]:.2f}s ({result["checks_per_s"] or 0:.1f}/s), p50: {result["latency_s"]["p50"] * 1000:.2f}ms, p99: {result["latency_s"]["p99"] * 1000:.2f}ms'
+	)
+	print(
+		f'{result["requests_per_check"]:.2f} requests per check, {result["deep_check"]["cached"]} cached pages, {result["deep_check"]["restart"]} restarted sessions, {result["wrong_results"]} wrong results'
+	)
+	print(
+		f'Connections: {result["connections_created"]} created, {result["connections_reused"]} reused'
+	)
+	for path, hits in sorted(result['hits'].items()):
+		print(f'{path:<28} {hits:>6}')
+
+	if args.output is not None:
+		with open(args.output, mode='w', encoding='utf-8') as f:
+			json.dump(result, f, indent=2)
+			f.write('\n')
+		print(f'Results written in "{args.output}".')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+"""
+Stand-in copies of the "icpplus" index page, used by the benchmarks.
+
+The pages reproduce the structure of the real one: a large head with styles
+and scripts, a navigation menu, and, when appointments can be booked, a form
+whose `<select id="form" name="form">` lists the provinces.
+"""
+from typing import Optional, Dict
+
+PROVINCES = (
+	'A Coruña',
+	'Albacete',
+	'Alicante',
+	'Almería',
+	'Araba',
+	'Asturias',
+	'Ávila',
+	'Badajoz',
+	'Barcelona',
+	'Bizkaia',
+	'Burgos',
+	'Cáceres',
+	'Cádiz',
+	'Cantabria',
+	'Castellón',
+	'Ceuta',
+	'Ciudad Real',
+	'Córdoba',
+	'Cuenca',
+	'Gipuzkoa',
+	'Girona',
+	'Granada',
+	'Guadalajara',
+	'Huelva',
+	'Huesca',
+	'Illes Balears',
+	'Jaén',
+	'La Rioja',
+	'Las Palmas',
+	'León',
+	'Lleida',
+	'Lugo',
+	'Madrid',
+	'Málaga',
+	'Melilla',
+	'Murcia',
+	'Navarra',
+	'Ourense',
+	'Palencia',
+	'Pontevedra',
+	'Salamanca',
+	'S.Cruz Tenerife',
+	'Segovia',
+	'Sevilla',
+	'Soria',
+	'Tarragona',
+	'Teruel',
+	'Toledo',
+	'Valencia',
+	'Valladolid',
+	'Zamora',
+	'Zaragoza',
+)
+
+_HEAD: str = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="UTF-8">
+<title>Cita Previa Extranjería</title>
+<link rel="stylesheet" type="text/css" href="/icpplus/css/estilos.css">
+<style>
+body { font-family: Arial, Helvetica, sans-serif; font-size: 0.8em; }
+.mf-main--title { color: #333; margin: 1em 0; }
+.mf-layout--module { padding: 0.5em; border: 1px solid #ccc; }
+</style>
+<script type="text/javascript" src="/icpplus/js/jquery.js"></script>
+<script type="text/javascript">
+function envia() { document.forms[0].submit(); }
+</script>
+</head>
+<body>
+<div class="mf-header"><ul class="mf-menu">
+<li><a href="/icpplus/index.html">Inicio</a></li>
+<li><a href="/icpplus/ayuda.html">Ayuda</a></li>
+<li><a href="/icpplus/accesibilidad.html">Accesibilidad</a></li>
+</ul></div>
+"""
+
+_FOOT: str = """<div class="mf-footer">
+<p>Ministerio de Hacienda y Función Pública</p>
+</div>
+</body>
+</html>
+"""
+
+
+def _padding(size: int) -> str:
+	"""
+	Return an HTML comment of about `size` characters, used to enlarge a page.
+	"""
+	line: str = 'Información sobre la cita previa para extranjería.\n'
+	return '<!--\n' + line * (size // len(line) + 1) + '-->\n'
+
+
+def _form() -> str:
+	options: str = ''.join(
+		f'<option value="/icpplus/citar?p={i}">{province}</option>\n'
+		for i, province in enumerate(PROVINCES))
+	return f"""<div class="mf-layout--module">
+<h1 class="mf-main--title">Internet CITA PREVIA</h1>
+<form action="/icpplus/citar" method="POST">
+<label for="form">Seleccione la provincia donde desea solicitar la cita</label>
+<select id="form" name="form" class="mf-input__l">
+<option value="">Seleccione</option>
+{options}</select>
+<input type="button" id="btnAceptar" value="Aceptar" onclick="envia()">
+</form>
+</div>
+"""
+
+
+def online_page(padding: int = 0, trailing_padding: int = 0) -> bytes:
+	"""
+	Return the index page when appointments can be booked.
+	:param padding: The approximate number of characters to insert before the
+	form.
+	:param trailing_padding: The approximate number of characters to insert
+	after the form.
+	"""
+	body: str = _HEAD + (_padding(padding) if padding > 0 else '') + _form() + (
+		_padding(trailing_padding) if trailing_padding > 0 else '')
+	return (body + _FOOT).encode('utf-8')
+
+
+def offline_page(padding: int = 0) -> bytes:
+	"""
+	Return the index page when the appointment system is down.
+	:param padding: The approximate number of characters to insert in the page.
+	"""
+	body: str = _HEAD + (_padding(padding) if padding > 0 else
+							'') + """<div class="mf-layout--module">
+<h1 class="mf-main--title">Internet CITA PREVIA</h1>
+<p>En este momento no hay citas disponibles.</p>
+<p>En breve la Comisaría pondrá a su disposición nuevas citas.</p>
+</div>
+"""
+	return (body + _FOOT).encode('utf-8')
+
+
+def error_page(status: int, message: Optional[str] = None) -> bytes:
+	"""
+	Return an error page, as sent by the load balancer in front of the website.
+	"""
+	if message is None:
+		message = {
+			500: 'Internal Server Error',
+			502: 'Bad Gateway',
+			503: 'Service Unavailable',
+			504: 'Gateway Timeout',
+		}.get(status, 'Error')
+	return f"""<html>
+<head><title>{status} {message}</title></head>
+<body><center><h1>{status} {message}</h1></center></body>
+</html>
+""".encode('utf-8')
+
+
+HTML_HEADERS: Dict[str, str] = {
+	'Content-Type': 'text/html; charset=UTF-8',
+}
+
+# The procedures of the deep check flow, by value
+PROCEDURES = {
+	'4010': 'POLICIA-TOMA DE HUELLAS (EXPEDICIÓN DE TARJETA) Y RENOVACIÓN',
+	'4031': 'POLICIA-CERTIFICADO DE REGISTRO DE CIUDADANO DE LA U.E.',
+	'4036': 'POLICIA-RECOGIDA DE TARJETA DE IDENTIDAD DE EXTRANJERO (TIE)',
+	'4079': 'POLICIA-EXP.TARJETA ASOCIADA AL ACUERDO DE RETIRADA CIUDADANOS BRITÁNICOS',
+}
+
+
+def procedures_page(province: str, token: str) -> bytes:
+	"""
+	Return the catalog of the procedures of a province, the first page of the
+	flow after the index.
+	:param province: The name of the province.
+	:param token: The CSRF token of the session.
+	"""
+	options: str = ''.join(f'<option value="{value}">{name}</option>\n'
+							for value, name in PROCEDURES.items())
+	body: str = _HEAD + f"""<div class="mf-layout--module">
+<h1 class="mf-main--title">{province}</h1>
+<form id="portadaForm" action="/icpplustieb/acEntrada" method="POST">
+<input type="hidden" name="tokenCSRF" value="{token}">
+<label for="tramiteGrupo[0]">TRÁMITES POLICÍA NACIONAL</label>
+<select id="tramiteGrupo[0]" name="tramiteGrupo[0]">
+<option value="-1">Seleccione</option>
+{options}</select>
+<input type="button" id="btnAceptar" value="Aceptar" onclick="envia()">
+</form>
+</div>
+"""
+	return (body + _FOOT).encode('utf-8')
+
+
+def entry_page(procedure: str, token: str) -> bytes:
+	"""
+	Return the form of the personal data, once a procedure has been selected.
+	:param procedure: The value of the procedure.
+	:param token: The CSRF token of the session.
+	"""
+	body: str = _HEAD + f"""<div class="mf-layout--module">
+<h1 class="mf-main--title">{PROCEDURES.get(procedure, procedure)}</h1>
+<form id="citadoForm" action="/icpplustieb/acCitar" method="POST">
+<input type="hidden" name="tokenCSRF" value="{token}">
+<input type="hidden" name="tramite" value="{procedure}">
+<label for="txtIdCitado">N.I.E.</label>
+<input type="text" id="txtIdCitado" name="txtIdCitado" maxlength="9">
+<label for="txtDesCitado">Nombre y apellidos</label>
+<input type="text" id="txtDesCitado" name="txtDesCitado" maxlength="50">
+<input type="button" id="btnEnviar" value="Solicitar Cita" onclick="envia()">
+</form>
+</div>
+"""
+	return (body + _FOOT).encode('utf-8')
+
+
+def slots_page(available: bool) -> bytes:
+	"""
+	Return the last page of the flow: the offices with available appointments,
+	or the message telling there is none.
+	:param available: `True` if appointments are available.
+	"""
+	if available:
+		content: str = """<form id="citadoForm" action="/icpplustieb/acVerFormulario" method="POST">
+<label for="idSede">Seleccione la oficina donde solicitar la cita</label>
+<select id="idSede" name="idSede">
+<option value="1">CNP COMISARÍA PROVINCIAL, CALLE MAYOR, 1</option>
+</select>
+</form>
+"""
+	else:
+		content = """<p>En este momento no hay citas disponibles.</p>
+<p>En breve la Comisaría pondrá a su disposición nuevas citas.</p>
+"""
+	body: str = _HEAD + f"""<div class="mf-layout--module">
+<h1 class="mf-main--title">Solicitud de cita</h1>
+{content}</div>
+"""
+	return (body + _FOOT).encode('utf-8')
+
+
+def expired_page() -> bytes:
+	"""
+	Return the page sent when the session has expired.
+	"""
+	body: str = _HEAD + """<div class="mf-layout--module">
+<p>Su sesión ha caducado. Por favor, vuelva a comenzar el proceso.</p>
+</div>
+"""
+	return (body + _FOOT).encode('utf-8')
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Measure the time spent importing Ojala Cita Previa, and check that a run with
+the message notifier only does not import the dependencies of the other
+notifiers, nor the network stack before the monitor starts.
+
+Run it with `python -m benchmarks.import_time`. It exits with the code 1 if
+the import takes more than `--max-ms` milliseconds, or if a module that should
+be loaded lazily has been imported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Dict, Any, Optional, Tuple
+
+MODULE: str = 'ojala_cita_previa.__main__'
+
+# Modules that must not be imported by a run with the message notifier only
+LAZY_MODULES = (
+	'beepy',
+	'bs4',
+	'smtplib',
+	'http.server',
+	'urllib3',
+	'ojala_cita_previa.io.capture',
+	'ojala_cita_previa.io.dns',
+	'ojala_cita_previa.io.hedge',
+	'ojala_cita_previa.io.network',
+	'ojala_cita_previa.io.pool',
+	'ojala_cita_previa.monitor.deep_check',
+	'ojala_cita_previa.monitor.rules',
+	'ojala_cita_previa.notification.email',
+	'ojala_cita_previa.notification.sound',
+)
+
+# Import the application and build the notifiers of a message-only run, then
+# print the imported modules
+_MESSAGE_ONLY_RUN: str = f"""
+import sys
+import {MODULE}
+from ojala_cita_previa.config.global_config import GlobalConfig
+from ojala_cita_previa.notification import get_notifier_from_args
+get_notifier_from_args(
+	GlobalConfig(sound_enabled=False, message_enabled=True, email_enabled=False),
+	website_url='http://localhost/')
+print('\\n'.join(sys.modules))
+"""
+
+_ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+	env: Dict[str, str] = dict(os.environ)
+	env['PYTHONPATH'] = os.pathsep.join(
+		filter(None, (_ROOT, env.get('PYTHONPATH'))))
+	return subprocess.run(
+		[sys.executable, *args],
+		env=env,
+		stdout=subprocess.PIPE,
+		stderr=subprocess.PIPE,
+		universal_newlines=True,
+		check=True,
+	)
+
+
+def parse_import_times(output: str) -> List[Tuple[str, int, int, int]]:
+	"""
+	Parse the output of `python -X importtime`.
+	:return: Returns the name, the depth, the self time and the cumulative time
+	in microseconds of each imported module.
+	"""
+	modules: List[Tuple[str, int, int, int]] = []
+	for line in output.splitlines():
+		if not line.startswith('import time:') or 'self [us]' in line:
+			continue
+		self_us, cumulative_us, name = line[len('import time:'):].split('|')
+		depth: int = (len(name) - len(name.lstrip())) // 2
+		modules.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+	return modules
+
+
+def measure(runs: int = 5) -> Dict[str, Any]:
+	"""
+	Import the application `runs` times, each time in a new interpreter.
+	:return: Returns the import times in milliseconds, the slowest modules
+	imported directly by the application, and the lazy modules that have been
+	imported by a message-only run.
+	"""
+	totals_ms: List[float] = []
+	slowest: Dict[str, List[int]] = {}
+	for _ in range(runs):
+		modules = parse_import_times(
+			_run(['-X', 'importtime', '-c', f'import {MODULE}']).stderr)
+		for name, depth, _, cumulative_us in modules:
+			if name == MODULE:
+				totals_ms.append(cumulative_us / 1000)
+			elif depth == 1:
+				slowest.setdefault(name, []).append(cumulative_us)
+
+	imported = set(_run(['-c', _MESSAGE_ONLY_RUN]).stdout.split())
+	return {
+		'runs': runs,
+		'median_ms': statistics.median(totals_ms),
+		'min_ms': min(totals_ms),
+		'max_ms': max(totals_ms),
+		'slowest_modules_ms': {
+			name: statistics.median(times) / 1000 for name, times in sorted(
+				slowest.items(),
+				key=lambda item: statistics.median(item[1]),
+				reverse=True)[:10]
+		},
+		'unexpected_modules': [
+			name for name in LAZY_MODULES if name in imported
+		],
+	}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(
+		prog='benchmarks.import_time',
+		description='Measure the time spent importing the application.',
+	)
+	parser.add_argument(
+		'--runs',
+		'-n',
+		type=int,
+		default=5,
+		help='The number of measures. Defaults to 5.')
+	parser.add_argument(
+		'--max-ms',
+		type=float,
+		default=None,
+		help='Fail if the median import time exceeds this budget.')
+	parser.add_argument(
+		'--output',
+		'-o',
+		type=str,
+		default=None,
+		help='The JSON file where the results are written.')
+	args = parser.parse_args(argv)
+
+	result: Dict[str, Any] = measure(runs=args.runs)
+	print(
+		f'Import of {MODULE}: median {result["median_ms"]:.1f}ms (min {result["min_ms"]:.1f}ms, max {result["max_ms"]:.1f}ms)'
+	)
+	print('Slowest imports:')
+	for name, time_ms in result['slowest_modules_ms'].items():
+		print(f'  {name:<50} {time_ms:>7.1f}ms')
+
+	if args.output is not None:
+		with open(args.output, mode='w', encoding='utf-8') as f:
+			json.dump(result, f, indent=2)
+			f.write('\n')
+		print(f'Results written in "{args.output}".')
+
+	failed: bool = False
+	if len(result['unexpected_modules']) > 0:
+		print(
+			f'A message-only run imported: {", ".join(result["unexpected_modules"])}',
+			file=sys.stderr)
+		failed = True
+	if args.max_ms is not None and result['median_ms'] > args.max_ms:
+		print(
+			f'The import takes more than {args.max_ms:.1f}ms.', file=sys.stderr)
+		failed = True
+	if failed:
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,434 @@
+#!/usr/bin/env python
+"""
+Replay an outage timeline through a local stand-in of the website, run the
+real monitor against it, and measure how long it takes to detect each change
+of status and to notify the user.
+
+Run it with `python -m benchmarks.outage_replay`. The arguments given after
+"--" are passed to the monitor, e.g.
+`python -m benchmarks.outage_replay --runs 3 -- --max-concurrency 2`.
+"""
+import argparse
+import datetime
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple, Dict, Any, Sequence
+
+import yaml
+
+from ojala_cita_previa.__main__ import main as ojala_main
+from ojala_cita_previa.config.file_config import FileConfig
+from ojala_cita_previa.config.global_config import GlobalConfig
+from ojala_cita_previa.notification import get_notifier_from_args
+from ojala_cita_previa.notification.abstract_notifier import Notifier
+from ojala_cita_previa.utils.duration_aggregator import DurationAggregator
+
+from benchmarks import fixtures
+from benchmarks.server import StandInServer, Fixture
+
+STATE_UP: str = 'up'
+STATE_DOWN: str = 'down'
+STATE_TIMEOUT: str = 'timeout'
+STATE_5XX: str = '5xx'
+STATES = (STATE_UP, STATE_DOWN, STATE_TIMEOUT, STATE_5XX)
+
+DEFAULT_TIMELINE: str = 'down:20,up:10,5xx:15,up:10,timeout:20,up:10,down:10'
+
+TARGET_PATH: str = '/icpplus/index.html'
+
+
+class Phase:
+	"""
+	A period of the timeline during which the website is in the same state.
+	"""
+
+	__slots__ = ('state', 'duration_s')
+
+	def __init__(self, state: str, duration_s: float):
+		if state not in STATES:
+			raise ValueError(
+				f'Unknown state "{state}". Expected one of: {", ".join(STATES)}.'
+			)
+		if duration_s <= 0:
+			raise ValueError(
+				f'The duration of a phase must be positive, got {duration_s}.')
+		self.state = state
+		self.duration_s = duration_s
+
+	def __repr__(self) -> str:
+		return f'Phase(state: {self.state}, duration_s: {self.duration_s})'
+
+
+def parse_timeline(timeline: str) -> List[Phase]:
+	"""
+	Parse a timeline written as "state:duration_s,state:duration_s,...", e.g.
+	"down:20,up:10,5xx:15".
+	"""
+	phases: List[Phase] = []
+	for item in timeline.split(','):
+		state, _, duration_s = item.strip().partition(':')
+		phases.append(Phase(state.strip(), float(duration_s)))
+	return phases
+
+
+def load_timeline(file_path: str) -> List[Phase]:
+	"""
+	Load a timeline from a YAML file, containing a list of phases such as
+	`{state: down, duration_s: 20}`.
+	"""
+	with open(file_path, mode='r', encoding='utf-8') as f:
+		doc = yaml.safe_load(f)
+	return [Phase(item['state'], float(item['duration_s'])) for item in doc]
+
+
+class TimelineRoute:
+	"""
+	Route of the `StandInServer` that serves the state of the timeline at the
+	time of the request, and records when each response was served.
+	"""
+
+	def __init__(self, phases: Sequence[Phase], timeout_delay_s: float):
+		"""
+		:param phases: The timeline.
+		:param timeout_delay_s: How long the server waits before answering
+		during a "timeout" phase. It should exceed the read timeout.
+		"""
+		self.phases: Tuple[Phase, ...] = tuple(phases)
+		self.timeout_delay_s = timeout_delay_s
+		self._fixtures: Dict[str, Fixture] = {
+			STATE_UP: Fixture(200, fixtures.online_page()),
+			STATE_DOWN: Fixture(200, fixtures.offline_page()),
+			STATE_TIMEOUT: Fixture(
+				200, fixtures.offline_page(), delay_s=timeout_delay_s),
+			STATE_5XX: Fixture(503, fixtures.error_page(503)),
+		}
+		self.begin: Optional[float] = None
+		# Time and state of each served response, relative to `begin`
+		self.served: List[Tuple[float, str]] = []
+		self._lock: threading.Lock = threading.Lock()
+
+	def start(self) -> None:
+		with self._lock:
+			self.begin = time.perf_counter()
+			self.served = []
+
+	@property
+	def duration_s(self) -> float:
+		return sum(phase.duration_s for phase in self.phases)
+
+	def transitions(self) -> List[Tuple[float, bool]]:
+		"""
+		Return the time at which the website goes up or down, along with `True`
+		if it goes up. The timeline starts with a transition.
+		"""
+		transitions: List[Tuple[float, bool]] = []
+		t: float = 0
+		for phase in self.phases:
+			up: bool = phase.state == STATE_UP
+			if len(transitions) == 0 or transitions[-1][1] != up:
+				transitions.append((t, up))
+			t += phase.duration_s
+		return transitions
+
+	def state_at(self, t: float) -> str:
+		for phase in self.phases:
+			if t < phase.duration_s:
+				return phase.state
+			t -= phase.duration_s
+		# The last state lasts until the end of the run
+		return self.phases[-1].state
+
+	def __call__(self) -> Fixture:
+		t: float = time.perf_counter() - self.begin
+		state: str = self.state_at(t)
+		with self._lock:
+			self.served.append((t, state))
+		return self._fixtures[state]
+
+
+class RecordingNotifier(Notifier):
+	"""
+	Notifier that records when each notification has been delivered, after
+	calling the notifier it wraps.
+	"""
+
+	def __init__(self, route: TimelineRoute, notifier: Optional[Notifier]):
+		self.route = route
+		self.notifier = notifier
+		# Time of each notification relative to the start of the timeline,
+		# along with `True` for "success"
+		self.notified: List[Tuple[float, bool]] = []
+
+	def _record(self, up: bool) -> None:
+		self.notified.append((time.perf_counter() - self.route.begin, up))
+
+	def success(self, *args, **kwargs):
+		if self.notifier is not None:
+			self.notifier.success(*args, **kwargs)
+		self._record(True)
+
+	def error(self, *args, **kwargs):
+		if self.notifier is not None:
+			self.notifier.error(*args, **kwargs)
+		self._record(False)
+
+	def close(self):
+		if self.notifier is not None:
+			self.notifier.close()
+
+	def members(self) -> tuple:
+		return self.notifier,
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, RecordingNotifier) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'RecordingNotifier(notifier: {self.notifier})'
+
+
+def _first_after(
+	events: Sequence[Tuple[float, bool]],
+	begin: float,
+	end: float,
+	up: bool,
+) -> Optional[float]:
+	for t, event_up in events:
+		if begin <= t < end and event_up == up:
+			return t
+	return None
+
+
+def measure(
+	route: TimelineRoute,
+	notifier: RecordingNotifier,
+	read_timeout_s: float,
+	run_duration_s: float,
+) -> List[Dict[str, Any]]:
+	"""
+	Match each transition of the timeline with its detection and its
+	notification.
+
+	A change can be detected at the earliest when the first response of the new
+	state is served, or, during a "timeout" phase, when the read timeout of that
+	request expires. It is missed if it is not notified before the next
+	transition.
+	"""
+	# When the monitor could have seen each state, and if it is "up"
+	seen: List[Tuple[float, bool]] = [
+		(t + (read_timeout_s if state == STATE_TIMEOUT else 0),
+			state == STATE_UP) for t, state in route.served
+	]
+	transitions: List[Tuple[float, bool]] = route.transitions()
+	results: List[Dict[str, Any]] = []
+	for i, (t, up) in enumerate(transitions):
+		end: float = transitions[
+			i + 1][0] if i + 1 < len(transitions) else run_duration_s
+		detected: Optional[float] = _first_after(seen, t, end, up)
+		notified: Optional[float] = _first_after(notifier.notified, t, end, up)
+		results.append({
+			'time_s': t,
+			'up': up,
+			'detection_s': detected - t if detected is not None else None,
+			'notification_s': notified - t if notified is not None else None,
+		})
+	return results
+
+
+def replay(
+		phases: Sequence[Phase],
+		runs: int = 1,
+		file_config: Optional[FileConfig] = None,
+		argv: Sequence[str] = (),
+) -> List[List[Dict[str, Any]]]:
+	"""
+	Replay the timeline `runs` times, running the monitor against it each time.
+	:param phases: The timeline.
+	:param runs: The number of runs.
+	:param file_config: The file configuration of the monitor. If `None`, the
+	default configuration is used.
+	:param argv: Additional command-line arguments of the monitor.
+	:return: Returns the result of `measure` for each run.
+	"""
+	if file_config is None:
+		file_config = FileConfig()
+
+	all_results: List[List[Dict[str, Any]]] = []
+	with StandInServer(routes={}) as server:
+		config: GlobalConfig = GlobalConfig.parse(
+			file_config=file_config,
+			argv=['--no-sound', *argv, '--target',
+					server.url(TARGET_PATH)],
+		)
+		route = TimelineRoute(phases, timeout_delay_s=config.read_timeout_s + 1)
+		server.routes[TARGET_PATH] = route
+
+		for run in range(runs):
+			print(f'Run {run + 1}/{runs} ({route.duration_s:.0f}s)...')
+			notifiers: List[RecordingNotifier] = []
+
+			def notifier_factory(
+				config: GlobalConfig,
+				website_url: str,
+			) -> RecordingNotifier:
+				recording = RecordingNotifier(
+					route, get_notifier_from_args(config, website_url))
+				notifiers.append(recording)
+				return recording
+
+			# Stop the monitor at the end of the timeline
+			timer = threading.Timer(
+				route.duration_s,
+				lambda: os.kill(os.getpid(), signal.SIGINT),
+			)
+			route.start()
+			timer.start()
+			try:
+				ojala_main(config, notifier_factory=notifier_factory)
+			finally:
+				timer.cancel()
+				signal.signal(signal.SIGINT, signal.default_int_handler)
+
+			all_results.append(
+				measure(
+					route,
+					notifiers[0],
+					read_timeout_s=config.read_timeout_s,
+					run_duration_s=route.duration_s,
+				))
+	return all_results
+
+
+def summarize(all_results: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+	"""
+	Summarize the detection and notification delays of all the runs, for the
+	transitions to "up" and to "down" separately. The first transition of each
+	run is the start of the monitor, so it is not counted.
+	"""
+	summary: Dict[str, Any] = {}
+	for up, name in ((True, 'up'), (False, 'down')):
+		detection = DurationAggregator()
+		notification = DurationAggregator()
+		transitions: int = 0
+		missed: int = 0
+		for results in all_results:
+			for result in results[1:]:
+				if result['up'] != up:
+					continue
+				transitions += 1
+				if result['notification_s'] is None:
+					missed += 1
+				if result['detection_s'] is not None:
+					detection.record(result['detection_s'])
+				if result['notification_s'] is not None:
+					notification.record(result['notification_s'])
+		summary[name] = {
+			'transitions': transitions,
+			'missed': missed,
+			'detection_s': detection.summary(),
+			'notification_s': notification.summary(),
+		}
+	return summary
+
+
+def _s(value: Optional[float]) -> str:
+	return f'{value:.2f}s' if value is not None else '-'
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	if argv is None:
+		argv = sys.argv[1:]
+	# The arguments after "--" are given to the monitor
+	ojala_argv: List[str] = []
+	if '--' in argv:
+		index: int = argv.index('--')
+		argv, ojala_argv = argv[:index], argv[index + 1:]
+
+	parser = argparse.ArgumentParser(
+		prog='benchmarks.outage_replay',
+		description='Measure the time-to-detection and the time-to-notification of the monitor by replaying an outage timeline.',
+	)
+	parser.add_argument(
+		'--timeline',
+		'-t',
+		type=str,
+		default=DEFAULT_TIMELINE,
+		help=f'The timeline, as "state:duration_s,..." where the state is one of {", ".join(STATES)}. Defaults to "{DEFAULT_TIMELINE}".'
+	)
+	parser.add_argument(
+		'--timeline-file',
+		type=str,
+		default=None,
+		help='A YAML file containing the timeline, as a list of {state, duration_s}. Overrides --timeline.'
+	)
+	parser.add_argument(
+		'--runs',
+		'-n',
+		type=int,
+		default=1,
+		help='The number of times the timeline is replayed. Defaults to 1.')
+	parser.add_argument(
+		'--config',
+		'-c',
+		type=str,
+		default=None,
+		help='The configuration file of the monitor. Defaults to the default configuration.'
+	)
+	parser.add_argument(
+		'--output',
+		'-o',
+		type=str,
+		default=None,
+		help='The JSON file where the results are written.')
+	args = parser.parse_args(argv)
+
+	if args.timeline_file is not None:
+		phases: List[Phase] = load_timeline(args.timeline_file)
+	else:
+		phases = parse_timeline(args.timeline)
+	file_config: Optional[FileConfig] = FileConfig.parse(
+		args.config) if args.config is not None else None
+
+	all_results = replay(
+		phases, runs=args.runs, file_config=file_config, argv=ojala_argv)
+	summary: Dict[str, Any] = summarize(all_results)
+
+	print()
+	print(
+		f'{"transition":<11} {"count":>6} {"missed":>7} {"detect p50":>11} {"detect p90":>11} {"notify p50":>11} {"notify p90":>11} {"notify max":>11}'
+	)
+	for name, stats in summary.items():
+		detection, notification = stats['detection_s'], stats['notification_s']
+		print(
+			f'{"to " + name:<11} {stats["transitions"]:>6} {stats["missed"]:>7} {_s(detection["p50"]):>11} {_s(detection["p90"]):>11} {_s(notification["p50"]):>11} {_s(notification["p90"]):>11} {_s(notification["max"]):>11}'
+		)
+
+	if args.output is not None:
+		report: Dict[str, Any] = {
+			'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+			'timeline': [{
+				'state': phase.state,
+				'duration_s': phase.duration_s
+			} for phase in phases],
+			'monitor_arguments': ojala_argv,
+			'summary': summary,
+			'runs': all_results,
+		}
+		with open(args.output, mode='w', encoding='utf-8') as f:
+			json.dump(report, f, indent=2)
+			f.write('\n')
+		print(f'Results written in "{args.output}".')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List
+
+import urllib3
+
+import ojala_cita_previa.io.network as net
+from ojala_cita_previa.io.pool import PoolStatistics, CONNECTION_CREATED, \
+ CONNECTION_REUSED
+from ojala_cita_previa.monitor.probe import Prober, ProbeResult
+from ojala_cita_previa.utils.duration_aggregator import DurationAggregator
+
+from benchmarks.server import StandInServer
+
+# The routes of the stand-in server that are benchmarked by default
+DEFAULT_SCENARIOS = (
+	'/online',
+	'/offline',
+	'/online-etag',
+	'/online-gzip',
+	'/error/503',
+	'/large-online',
+	'/large-offline',
+	'/large-online-early',
+	'/large-online-gzip',
+	'/slow-drip',
+)
+# The scenarios that measure the reuse of the previous detection result
+REUSE_SCENARIOS = ('/online-etag',)
+
+
+def run_scenario(
+	server: StandInServer,
+	path: str,
+	detection_mode: str,
+	duration_s: float = 2,
+	concurrency: int = 1,
+	memory_probes: int = 20,
+	reuse: Optional[bool] = None,
+) -> Dict[str, Any]:
+	"""
+	Probe the route `path` of `server` in a loop for `duration_s` seconds, and
+	measure the throughput, the latency, the parse time and the memory.
+	:param server: The running stand-in server.
+	:param path: The route to probe.
+	:param detection_mode: The detection mode of the prober.
+	:param duration_s: The duration of the benchmark, in seconds.
+	:param concurrency: The number of probes in flight at the same time.
+	:param memory_probes: The number of probes used to measure the memory. They
+	are run separately, since tracing the allocations slows everything down.
+	:param reuse: If `True`, the detection result of an unchanged content is
+	reused, like the monitor does. Otherwise, every probe inspects the content,
+	so the cost of the detection is measured. If `None`, the result is only
+	reused for the scenarios in `REUSE_SCENARIOS`.
+	:return: Returns the results, as a JSON-compatible dictionary.
+	"""
+	if reuse is None:
+		reuse = path in REUSE_SCENARIOS
+	url: str = server.url(path)
+	net.init(maxsize=concurrency)
+	prober = Prober(
+		timeout=urllib3.Timeout(connect=5, read=10),
+		detection_mode=detection_mode,
+		conditional_requests=True,
+	)
+	parse_durations = DurationAggregator()
+	counts: Dict[str, int] = {
+		'online': 0,
+		'offline': 0,
+		'errors': 0,
+		'reused': 0,
+	}
+	lock = threading.Lock()
+
+	def probe() -> ProbeResult:
+		if not reuse:
+			prober.forget(url)
+		result: ProbeResult = prober.probe(url)
+		if result.parse_s is not None:
+			parse_durations.record(result.parse_s)
+		with lock:
+			counts['online' if result.online else 'offline'] += 1
+			if result.error is not None:
+				counts['errors'] += 1
+			if result.reused:
+				counts['reused'] += 1
+		return result
+
+	# Warm up the connections and the caches
+	probe()
+	prober.durations.reset()
+	parse_durations.reset()
+	connections: PoolStatistics = net.statistics()
+	connections.reset()
+	for key in counts:
+		counts[key] = 0
+	for key in prober.transfer:
+		prober.transfer[key] = 0
+
+	def loop(deadline: float) -> None:
+		while time.perf_counter() < deadline:
+			probe()
+
+	begin: float = time.perf_counter()
+	deadline: float = begin + duration_s
+	with ThreadPoolExecutor(max_workers=concurrency) as executor:
+		for future in [
+			executor.submit(loop, deadline) for _ in range(concurrency)
+		]:
+			future.result()
+	elapsed_s: float = time.perf_counter() - begin
+
+	probes: int = prober.durations.count
+	result: Dict[str, Any] = {
+		'scenario': path,
+		'detection_mode': detection_mode,
+		'concurrency': concurrency,
+		'reuse': reuse,
+		'duration_s': elapsed_s,
+		'probes': probes,
+		'probes_per_s': probes / elapsed_s if elapsed_s > 0 else None,
+		'latency_s': prober.durations.summary(),
+		'parse_s': parse_durations.summary(),
+		'connections_created': connections.total(CONNECTION_CREATED),
+		'connections_reused': connections.total(CONNECTION_REUSED),
+		'compressed_bytes': prober.transfer['compressed'],
+		'decompressed_bytes': prober.transfer['decompressed'],
+	}
+	result.update(counts)
+
+	# Measure the memory separately
+	tracemalloc.start()
+	try:
+		for _ in range(memory_probes):
+			probe()
+		_, result['peak_memory_bytes'] = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+
+	net.dispose()
+	return result
+
+
+def run(
+	scenarios: Optional[List[str]] = None,
+	detection_modes: Optional[List[str]] = None,
+	**kwargs,
+) -> List[Dict[str, Any]]:
+	"""
+	Run `run_scenario` for each scenario and each detection mode, against a
+	stand-in server started for the occasion.
+	:param scenarios: The routes to probe. Defaults to `DEFAULT_SCENARIOS`.
+	:param detection_modes: The detection modes. Defaults to both.
+	:param kwargs: Additional arguments given to `run_scenario`.
+	:return: Returns the results of each run.
+	"""
+	if scenarios is None:
+		scenarios = list(DEFAULT_SCENARIOS)
+	if detection_modes is None:
+		detection_modes = ['stream', 'full']
+
+	results: List[Dict[str, Any]] = []
+	with StandInServer() as server:
+		for path in scenarios:
+			for detection_mode in detection_modes:
+				results.append(
+					run_scenario(server, path, detection_mode, **kwargs))
+	return results
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+import gzip
+import http.cookies
+import secrets
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Union, Callable
+
+from benchmarks import fixtures
+
+
+class Fixture:
+	"""
+	A response served by the `StandInServer`.
+	"""
+
+	__slots__ = (
+		'status',
+		'body',
+		'headers',
+		'delay_s',
+		'chunk_size',
+		'chunk_delay_s',
+		'etag',
+		'gzip_body',
+	)
+
+	def __init__(
+		self,
+		status: int,
+		body: bytes,
+		headers: Optional[Dict[str, str]] = None,
+		delay_s: float = 0,
+		chunk_size: Optional[int] = None,
+		chunk_delay_s: float = 0,
+		etag: Optional[str] = None,
+		compressed: bool = False,
+	):
+		"""
+		:param status: The HTTP status code.
+		:param body: The body.
+		:param headers: The HTTP headers. Defaults to the headers of an HTML
+		page.
+		:param delay_s: The time to wait before answering, in seconds.
+		:param chunk_size: If given, the body is sent in chunks of this size,
+		with `chunk_delay_s` seconds between each chunk, like a slow server.
+		:param chunk_delay_s: The time to wait between two chunks, in seconds.
+		:param etag: If given, the "ETag" header is sent, and the server
+		answers "304 Not Modified" to the requests that send it back.
+		:param compressed: If `True`, the body is sent compressed with gzip to
+		the clients that accept it.
+		"""
+		self.status = status
+		self.body = body
+		self.headers = headers if headers is not None else fixtures.HTML_HEADERS
+		self.delay_s = delay_s
+		self.chunk_size = chunk_size
+		self.chunk_delay_s = chunk_delay_s
+		self.etag = etag
+		self.gzip_body: Optional[bytes] = gzip.compress(
+			body) if compressed else None
+
+
+class StandInRequest:
+	"""
+	A request received by the `StandInServer`, given to the `Endpoint` routes.
+	"""
+
+	__slots__ = ('method', 'path', 'fields', 'cookies')
+
+	def __init__(
+		self,
+		method: str,
+		path: str,
+		fields: Dict[str, str],
+		cookies: Dict[str, str],
+	):
+		"""
+		:param method: The HTTP method.
+		:param path: The path, without the query string.
+		:param fields: The fields of the query string and of the URL-encoded
+		body.
+		:param cookies: The cookies sent by the client.
+		"""
+		self.method = method
+		self.path = path
+		self.fields = fields
+		self.cookies = cookies
+
+
+class Endpoint:
+	"""
+	A route whose response depends on the request, like the pages of the
+	appointment flow.
+	"""
+
+	__slots__ = ('handler',)
+
+	def __init__(self, handler: Callable[[StandInRequest], Fixture]):
+		self.handler = handler
+
+	def respond(self, request: StandInRequest) -> Fixture:
+		return self.handler(request)
+
+
+Route = Union[Fixture, Callable[[], Fixture], Endpoint]
+
+
+def default_routes() -> Dict[str, Route]:
+	"""
+	Return the routes served by default:
+
+	* "/online" and "/offline": the index page, with and without the form.
+	* "/online-etag": the index page with an ETag, to measure the "304 Not
+	  Modified" path.
+	* "/online-gzip" and "/large-online-gzip": the same pages as "/online" and
+	  "/large-online", compressed with gzip.
+	* "/error/500", "/error/502", "/error/503": error pages.
+	* "/large-online" and "/large-offline": 1 MiB pages, the form being at the
+	  end.
+	* "/large-online-early": a 1 MiB page, the form being at the beginning, to
+	  measure what the early exit of the "stream" mode saves.
+	* "/slow-drip": the index page sent in small chunks by a slow server.
+	"""
+	large_padding: int = 1024 * 1024
+	online: bytes = fixtures.online_page()
+	return {
+		'/online': Fixture(200, online),
+		'/offline': Fixture(200, fixtures.offline_page()),
+		'/online-etag': Fixture(200, online, etag='"icpplus-1"'),
+		'/online-gzip': Fixture(200, online, compressed=True),
+		'/error/500': Fixture(500, fixtures.error_page(500)),
+		'/error/502': Fixture(502, fixtures.error_page(502)),
+		'/error/503': Fixture(503, fixtures.error_page(503)),
+		'/large-online': Fixture(200, fixtures.online_page(large_padding)),
+		'/large-offline': Fixture(200, fixtures.offline_page(large_padding)),
+		'/large-online-early': Fixture(
+			200, fixtures.online_page(trailing_padding=large_padding)),
+		'/large-online-gzip': Fixture(
+			200,
+			fixtures.online_page(large_padding),
+			compressed=True,
+		),
+		'/slow-drip': Fixture(
+			200,
+			online,
+			chunk_size=512,
+			chunk_delay_s=0.002,
+		),
+	}
+
+
+class CitaFlow:
+	"""
+	Stand-in of the appointment flow: the catalog of the procedures of a
+	province ("/icpplustieb/citar?p=<province>"), the selection of a procedure
+	("/icpplustieb/acEntrada"), then the available appointments
+	("/icpplustieb/acCitar").
+
+	Like the website, each session has a cookie and a CSRF token, and the
+	dynamic pages answer that the session has expired if they are requested
+	out of order or with an unknown session.
+	"""
+
+	def __init__(self, available: bool = False):
+		"""
+		:param available: `True` if appointments are available.
+		"""
+		self.available = available
+		# The CSRF token and the last step of each session, by session ID
+		self.sessions: Dict[str, Dict[str, str]] = {}
+		self._lock: threading.Lock = threading.Lock()
+
+	def routes(self) -> Dict[str, Route]:
+		"""
+		Return the routes of the flow, along with the index page at
+		"/icpplus/index.html".
+		"""
+		return {
+			'/icpplus/index.html': Fixture(200, fixtures.online_page()),
+			'/icpplustieb/citar': Endpoint(self._procedures),
+			'/icpplustieb/acEntrada': Endpoint(self._entry),
+			'/icpplustieb/acCitar': Endpoint(self._slots),
+		}
+
+	def expire(self) -> None:
+		"""
+		Expire all the sessions, like a restart of the website.
+		"""
+		with self._lock:
+			self.sessions.clear()
+
+	def _session(self, request: StandInRequest) -> Optional[Dict[str, str]]:
+		with self._lock:
+			return self.sessions.get(request.cookies.get('JSESSIONID', ''))
+
+	def _procedures(self, request: StandInRequest) -> Fixture:
+		session_id: str = secrets.token_hex(16)
+		token: str = secrets.token_hex(8)
+		with self._lock:
+			self.sessions[session_id] = {'token': token, 'step': 'citar'}
+		province: str = fixtures.PROVINCES[int(request.fields.get('p', 0))
+											% len(fixtures.PROVINCES)]
+		return Fixture(
+			200,
+			fixtures.procedures_page(province, token),
+			headers=dict(
+				fixtures.HTML_HEADERS,
+				**{'Set-Cookie': f'JSESSIONID={session_id}; Path=/; HttpOnly'}))
+
+	def _entry(self, request: StandInRequest) -> Fixture:
+		session: Optional[Dict[str, str]] = self._session(request)
+		procedure: Optional[str] = request.fields.get('tramiteGrupo[0]')
+		if request.method != 'POST' or session is None or request.fields.get(
+			'tokenCSRF') != session['token'] or procedure is None:
+			return Fixture(200, fixtures.expired_page())
+		session['step'] = 'entrada'
+		return Fixture(200, fixtures.entry_page(procedure, session['token']))
+
+	def _slots(self, request: StandInRequest) -> Fixture:
+		session: Optional[Dict[str, str]] = self._session(request)
+		if request.method != 'POST' or session is None or session[
+			'step'] != 'entrada' or request.fields.get(
+				'tokenCSRF') != session['token']:
+			return Fixture(200, fixtures.expired_page())
+		return Fixture(200, fixtures.slots_page(self.available))
+
+
+class StandInServer:
+	"""
+	Local HTTP server that stands in for the website, from a background thread.
+
+	Each route is either a `Fixture`, or a function that returns the fixture to
+	serve, so the responses can change over time.
+	"""
+
+	def __init__(
+		self,
+		routes: Optional[Dict[str, Route]] = None,
+		host: str = '127.0.0.1',
+		port: int = 0,
+	):
+		"""
+		:param routes: The fixture served at each path. Defaults to
+		`default_routes()`.
+		:param host: The host to bind.
+		:param port: The port to bind. If 0, a free port is chosen.
+		"""
+		self.routes: Dict[
+			str, Route] = routes if routes is not None else default_routes()
+		self.host = host
+		self.port = port
+		# Number of requests received, for each path
+		self.hits: Dict[str, int] = {}
+		self._lock: threading.Lock = threading.Lock()
+		self._server: Optional[ThreadingHTTPServer] = None
+		self._thread: Optional[threading.Thread] = None
+
+	def url(self, path: str) -> str:
+		return f'http://{self.host}:{self.port}{path}'
+
+	def _fixture(self, request: StandInRequest) -> Optional[Fixture]:
+		with self._lock:
+			self.hits[request.path] = self.hits.get(request.path, 0) + 1
+		route: Optional[Route] = self.routes.get(request.path)
+		if route is None or isinstance(route, Fixture):
+			return route
+		if isinstance(route, Endpoint):
+			return route.respond(request)
+		return route()
+
+	def start(self) -> 'StandInServer':
+		stand_in: StandInServer = self
+
+		class Handler(BaseHTTPRequestHandler):
+			# Keep the connections alive, like the real website
+			protocol_version = 'HTTP/1.1'
+			# Otherwise, the body waits for the acknowledgement of the headers
+			disable_nagle_algorithm = True
+
+			def _request(self) -> StandInRequest:
+				path, _, query = self.path.partition('?')
+				fields: Dict[str, str] = dict(urllib.parse.parse_qsl(query))
+				length: int = int(self.headers.get('Content-Length') or 0)
+				if length > 0:
+					fields.update(
+						urllib.parse.parse_qsl(
+							self.rfile.read(length).decode('utf-8')))
+				cookies: http.cookies.SimpleCookie = http.cookies.SimpleCookie(
+					self.headers.get('Cookie') or '')
+				return StandInRequest(
+					method=self.command,
+					path=path,
+					fields=fields,
+					cookies={
+						name: morsel.value for name, morsel in cookies.items()
+					},
+				)
+
+			def handle(self):
+				try:
+					super().handle()
+				except (BrokenPipeError, ConnectionResetError,
+						ConnectionAbortedError):
+					# The client closed a connection it did not drain, which is
+					# expected, so socketserver must not print a traceback
+					self.close_connection = True
+
+			def do_POST(self):
+				self.do_GET()
+
+			def do_GET(self):
+				fixture: Optional[Fixture] = stand_in._fixture(self._request())
+				if fixture is None:
+					self.send_error(404)
+					return
+
+				if fixture.delay_s > 0:
+					time.sleep(fixture.delay_s)
+
+				if fixture.etag is not None and self.headers.get(
+					'If-None-Match') == fixture.etag:
+					self.send_response(304)
+					self.send_header('ETag', fixture.etag)
+					self.send_header('Content-Length', '0')
+					self.end_headers()
+					return
+
+				body: bytes = fixture.body
+				self.send_response(fixture.status)
+				for name, value in fixture.headers.items():
+					self.send_header(name, value)
+				if fixture.etag is not None:
+					self.send_header('ETag', fixture.etag)
+				if fixture.gzip_body is not None:
+					self.send_header('Vary', 'Accept-Encoding')
+					if 'gzip' in self.headers.get('Accept-Encoding', ''):
+						body = fixture.gzip_body
+						self.send_header('Content-Encoding', 'gzip')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+
+				try:
+					if fixture.chunk_size is None:
+						self.wfile.write(body)
+						return
+					for i in range(0, len(body), fixture.chunk_size):
+						self.wfile.write(body[i:i + fixture.chunk_size])
+						self.wfile.flush()
+						time.sleep(fixture.chunk_delay_s)
+				except (BrokenPipeError, ConnectionResetError):
+					# The client stopped reading, as the streaming detection does
+					self.close_connection = True
+
+			# noinspection PyShadowingBuiltins
+			def log_message(self, format, *args):
+				pass
+
+		self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+		self._server.daemon_threads = True
+		self.port = self._server.server_address[1]
+		self._thread = threading.Thread(
+			target=self._server.serve_forever,
+			name='ojala-stand-in-server',
+			daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self) -> None:
+		if self._server is not None:
+			self._server.shutdown()
+			self._server.server_close()
+			self._server = None
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+	def __enter__(self) -> 'StandInServer':
+		return self.start()
+
+	def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+		self.stop()
@@ -1,117 +1,392 @@
 #!/usr/bin/env python
 import signal
-from typing import Optional, NoReturn
-
-import bs4
-import urllib3
+import sys
+from typing import List, NoReturn, Optional, Callable, Set, Dict, \
+ TYPE_CHECKING
 
 import ojala_cita_previa as init_ojala
-import ojala_cita_previa.io.network as net
 
 from ojala_cita_previa.config.global_config import GlobalConfig
+from ojala_cita_previa.config.reloader import ConfigReloader, PROBE_FIELDS, \
+ SCHEDULER_FIELDS, NOTIFIER_FIELDS, RELOADABLE_FIELDS
+from ojala_cita_previa.metrics.monitor_metrics import MonitorMetrics
 from ojala_cita_previa.notification import Notifier, get_notifier_from_args
+from ojala_cita_previa.notification.dispatcher import NotificationDispatcher, \
+ queue_notifier
 from ojala_cita_previa.utils.stopwatch import Stopwatch
 
+if TYPE_CHECKING:
+	from ojala_cita_previa.io.capture import CaptureArchive
+	from ojala_cita_previa.io.dns import DNSCache
+	from ojala_cita_previa.io.event_log import EventLog
+	from ojala_cita_previa.metrics.exporter import MetricsServer, MetricsFileWriter
+	from ojala_cita_previa.monitor.deep_check import DeepChecker
+
 __doc__ = init_ojala.__doc__
 
 
-def main(config: GlobalConfig) -> NoReturn:
+def main(
+	config: GlobalConfig,
+	notifier_factory: Optional[Callable[..., Optional[Notifier]]] = None,
+	reload: bool = True,
+) -> NoReturn:
+	"""
+	Monitor the targets until the program receives SIGINT.
+	:param config: The configuration.
+	:param notifier_factory: The function that builds the notifier of each
+	target, called with the keyword arguments `config` and `website_url`.
+	Defaults to `get_notifier_from_args`.
+	:param reload: If `True`, the configuration is reloaded on SIGHUP, and when
+	the configuration file changes if `reload_watch_interval_s` is set.
+	"""
+	# Imported here, so the subcommands and the notifiers are loaded without
+	# the network stack
+	import urllib3
+
+	import ojala_cita_previa.io.network as net
+	from ojala_cita_previa.io.hedge import RetryBudget, HedgedRequester
+	from ojala_cita_previa.io.pool import PoolStatistics
+	from ojala_cita_previa.io.pool import CONNECTION_CREATED, CONNECTION_REUSED
+	from ojala_cita_previa.monitor.engine import MonitorEngine
+	from ojala_cita_previa.monitor.probe import Prober, DETECTION_MODES
+	from ojala_cita_previa.monitor.rules import RuleSet
+	from ojala_cita_previa.monitor.scheduler import PollingScheduler
+	from ojala_cita_previa.monitor.target import Target
+
+	if notifier_factory is None:
+		notifier_factory = get_notifier_from_args
+
 	# Stopwatch that measure the time used by this script
 	main_stopwatch: Stopwatch = Stopwatch(start_now=True)
 
-	net.init()
+	metrics: MonitorMetrics = MonitorMetrics()
+	dns_cache: Optional['DNSCache'] = None
+	if config.dns_cache_enabled:
+		# Imported here, since it is only used with the DNS cache
+		from ojala_cita_previa.io.dns import DNSCache
+		dns_cache = DNSCache(
+			ttl_s=config.dns_ttl_s,
+			min_ttl_s=config.dns_min_ttl_s,
+			max_ttl_s=config.dns_max_ttl_s,
+			stale_ttl_s=config.dns_stale_ttl_s,
+		)
+	net.init(
+		maxsize=config.pool_maxsize
+		if config.pool_maxsize is not None else config.max_concurrency,
+		num_pools=config.pool_num_pools,
+		block=config.pool_block,
+		idle_timeout_s=config.pool_idle_timeout_s,
+		host_overrides={
+			host: dict(overrides) for host, overrides in config.pool_hosts
+		} if config.pool_hosts is not None else None,
+		tls_verify=config.tls_verify,
+		tls_ca_certs=config.tls_ca_certs,
+		tls_minimum_version=config.tls_minimum_version,
+		statistics=PoolStatistics(listener=metrics.observe_connection),
+		dns_cache=dns_cache,
+	)
+
+	capture_archive: Optional['CaptureArchive'] = None
+	if config.capture_dir is not None:
+		# Imported here, since it is only used in capture mode
+		from ojala_cita_previa.io.capture import CaptureArchive
+		capture_archive = CaptureArchive(
+			directory=config.capture_dir,
+			max_bytes=config.capture_max_bytes,
+		)
+		net.enable_capture(capture_archive)
+
+	# Define the default timeout for all request connections
+	request_timeout: urllib3.Timeout = urllib3.Timeout(
+		connect=config.connect_timeout_s,
+		read=config.read_timeout_s,
+	)
+
+	metrics_server: Optional['MetricsServer'] = None
+	if config.metrics_port is not None:
+		# Imported here, since the HTTP server is slow to import
+		from ojala_cita_previa.metrics.exporter import MetricsServer
+		metrics_server = MetricsServer(
+			registry=metrics.registry,
+			port=config.metrics_port,
+			host=config.metrics_host,
+		)
+		metrics_server.start()
+		print(
+			f'Metrics available on http://{metrics_server.host}:{metrics_server.port}/metrics'
+		)
+	metrics_writer: Optional['MetricsFileWriter'] = None
+	if config.metrics_file is not None:
+		from ojala_cita_previa.metrics.exporter import MetricsFileWriter
+		metrics_writer = MetricsFileWriter(
+			registry=metrics.registry,
+			file_path=config.metrics_file,
+			interval_s=config.metrics_file_interval_s,
+		)
+		metrics_writer.start()
+
+	# The notifications are sent by worker threads, so they never delay probes
+	dispatcher: NotificationDispatcher = NotificationDispatcher(
+		max_size=config.notification_queue_size,
+		workers=config.notification_workers,
+		overflow=config.notification_overflow,
+		metrics=metrics,
+	)
+
+	def queued_notifier(config: GlobalConfig, url: str) -> Optional[Notifier]:
+		return queue_notifier(
+			notifier_factory(config=config, website_url=url),
+			dispatcher=dispatcher,
+			key=url)
 
-	# Variable that indicates if the main loop should continue
-	keep_looping: bool = True
+	def deep_checker(config: GlobalConfig) -> Optional['DeepChecker']:
+		if config.deep_check_steps is None or len(config.deep_check_steps) == 0:
+			return None
+		# Imported here, since it is only used with a deep check
+		from ojala_cita_previa.monitor.deep_check import DeepChecker
+		return DeepChecker.from_config(
+			config.deep_check_steps,
+			rules=config.deep_check_rules,
+			cache_ttl_s=config.deep_check_cache_ttl_s,
+		)
+
+	event_log: Optional['EventLog'] = None
+	last_statuses: Dict[str, bool] = {}
+	if config.event_log_file is not None:
+		# Imported here, since it is only used with an event log
+		from ojala_cita_previa.io.event_log import EventLog
+		event_log = EventLog(
+			file_path=config.event_log_file,
+			flush_interval_s=config.event_log_flush_interval_s,
+		)
+		# A restart only notifies the targets whose status changed since the last
+		# run, as recorded in the event log
+		last_statuses = event_log.last_statuses()
+
+	# Each target has its own notifier, so they notify independently
+	targets: List[Target] = [
+		Target(
+			url=url,
+			notifier=queued_notifier(config, url),
+			scheduler=PollingScheduler(
+				interval_s=config.poll_interval_s,
+				max_interval_s=config.poll_max_interval_s,
+				backoff_factor=config.poll_backoff_factor,
+				jitter_ratio=config.poll_jitter_ratio,
+				hot_interval_s=config.poll_hot_interval_s,
+				hot_duration_s=config.poll_hot_duration_s,
+			),
+			last_status=last_statuses.get(url),
+		) for url in config.targets
+	]
+
+	# The retries and the hedged requests share the same budget
+	retry_budget: RetryBudget = RetryBudget(
+		ratio=config.retry_budget_ratio,
+		min_per_s=config.retry_budget_min_per_s,
+	)
+	hedger: Optional[HedgedRequester] = None
+	if config.hedge_enabled:
+		hedger = HedgedRequester(
+			budget=retry_budget,
+			percentile=config.hedge_percentile,
+			min_delay_s=config.hedge_min_delay_s,
+			max_workers=2 * config.max_concurrency,
+		)
+
+	prober: Prober = Prober(
+		timeout=request_timeout,
+		detection_mode=config.detection_mode,
+		stream_max_bytes=config.stream_max_bytes,
+		conditional_requests=config.conditional_requests,
+		retry_budget=retry_budget,
+		hedger=hedger,
+		rules=RuleSet.from_config(config.detection_rules),
+		deep_checker=deep_checker(config),
+	)
+
+	engine: MonitorEngine = MonitorEngine(
+		targets=targets,
+		prober=prober,
+		max_concurrency=config.max_concurrency,
+		verbose=config.verbose,
+		metrics=metrics,
+		event_log=event_log,
+	)
+
+	def apply_config(
+		previous: GlobalConfig,
+		new: GlobalConfig,
+		changed: Set[str],
+	) -> None:
+		"""
+		Apply a reloaded configuration. The new notifiers are built in the
+		thread of the reloader, then everything is swapped at once between two
+		probe iterations.
+		:raise ValueError: Raised if the new configuration is invalid.
+		"""
+		nonlocal config
+		if new.detection_mode not in DETECTION_MODES:
+			raise ValueError(
+				f'Unknown detection mode "{new.detection_mode}". Expected one of: {", ".join(DETECTION_MODES)}.'
+			)
+		rules: RuleSet = RuleSet.from_config(new.detection_rules)
+		new_deep_checker: Optional['DeepChecker'] = deep_checker(new)
+
+		notifiers: Optional[Dict[str, Optional[Notifier]]] = None
+		if len(changed & NOTIFIER_FIELDS) > 0:
+			notifiers = {
+				target.url: queued_notifier(new, target.url)
+				for target in targets
+			}
+
+		def update() -> None:
+			if len(changed & PROBE_FIELDS) > 0:
+				prober.timeout = urllib3.Timeout(
+					connect=new.connect_timeout_s,
+					read=new.read_timeout_s,
+				)
+				prober.conditional_requests = new.conditional_requests
+				if new.detection_mode != prober.detection_mode or new.stream_max_bytes != prober.stream_max_bytes or rules != prober.rules:
+					prober.detection_mode = new.detection_mode
+					prober.stream_max_bytes = new.stream_max_bytes
+					prober.rules = rules
+					# The previous results have been computed with other settings
+					prober.forget()
+				if new_deep_checker != prober.deep_checker:
+					prober.deep_checker = new_deep_checker
+
+			for target in targets:
+				if len(changed & SCHEDULER_FIELDS) > 0:
+					target.scheduler.interval_s = new.poll_interval_s
+					target.scheduler.max_interval_s = new.poll_max_interval_s
+					target.scheduler.backoff_factor = new.poll_backoff_factor
+					target.scheduler.jitter_ratio = new.poll_jitter_ratio
+					target.scheduler.hot_interval_s = new.poll_hot_interval_s
+					target.scheduler.hot_duration_s = new.poll_hot_duration_s
+				if notifiers is not None:
+					previous_notifier: Optional[Notifier] = target.notifier
+					target.notifier = notifiers[target.url]
+					# Closed once its pending notifications are sent
+					if previous_notifier is not None:
+						previous_notifier.close()
+
+			engine.verbose = new.verbose
+
+		config = new
+		engine.call_between_probes(update)
+
+		print(f'Configuration reloaded: {", ".join(sorted(changed))}.')
+		ignored: Set[str] = changed - RELOADABLE_FIELDS
+		if len(ignored) > 0:
+			print(
+				f'These settings need a restart to be applied: {", ".join(sorted(ignored))}.',
+				file=sys.stderr)
+
+	reloader: ConfigReloader = ConfigReloader(
+		config=config,
+		on_reload=apply_config,
+		watch_interval_s=config.reload_watch_interval_s,
+	)
+
+	# Indicates if the program is already stopping
+	stopping: bool = False
 
 	# noinspection PyUnusedLocal
 	def handle_exit_signals(signum=None, frame=None) -> NoReturn:
 		"""
-		Callback that handles an exit signal.
+		Callback that handles an exit signal. The first signal stops the probes
+		and lets the pending notifications be sent, the second one drops them.
 		"""
-		nonlocal keep_looping
-		keep_looping = False
+		nonlocal stopping
+		if stopping:
+			print('Dropping the pending notifications...')
+			dispatcher.close(drain=False, timeout=0)
+			return
+
+		stopping = True
+		engine.stop()
 		print('Stopping program...')
 
 	signal.signal(signal.SIGINT, handle_exit_signals)
-
-	# Define the default timeout for all request connections
-	request_timeout: urllib3.Timeout = urllib3.Timeout(
-		connect=config.connect_timeout_s,
-		read=config.read_timeout_s,
-	)
+	if reload:
+		# SIGHUP does not exist on Windows
+		if hasattr(signal, 'SIGHUP'):
+			signal.signal(signal.SIGHUP,
+							lambda signum, frame: reloader.request_reload())
+		reloader.start()
 
 	print('Stalking website... Press Ctrl+C to stop it.')
 	try:
-		last_status = None
-		index_url: str = 'https://icp.administracionelectronica.gob.es/icpplus/index.html'
-		notifier: Notifier = get_notifier_from_args(
-			config=config, website_url=index_url)
-		request_stopwatch: Stopwatch = Stopwatch(start_now=False)
-
-		# Main loop
-		while keep_looping:
-			request_stopwatch.start()
-			index_response: Optional[urllib3.response.HTTPResponse] = None
-			try:
-				index_response = net.request(index_url, timeout=request_timeout)
-			except TimeoutError:
-				pass
-			except urllib3.exceptions.MaxRetryError:
-				pass
-			except urllib3.exceptions.TimeoutError:
-				pass
-
-			request_stopwatch.stop()
-			if config.verbose:
-				print(f'Request took {request_stopwatch.elapsed():.2f}s.')
-
-			# Parse the response
-			if index_response is None:
-				if last_status is not False:
-					notifier.error(
-						reason=f'The request timed out ({request_stopwatch.elapsed():.2f}s).'
-					)
-					last_status = False
-			# If success, try to parse the webpage
-			elif 200 <= index_response.status < 300:
-				soup = bs4.BeautifulSoup(
-					index_response.data, features='html.parser')
-				select_button: Optional[bs4.element.Tag] = soup.find(
-					'select',
-					attrs={
-						'id': 'form',
-						'name': 'form',
-					},
-				)
-
-				# If the select button is found, send a notification
-				if select_button is not None and (last_status is not True or
-													last_status is None):
-					notifier.success()
-					last_status = True
-				elif select_button is None and (last_status is True or
-												last_status is None):
-					notifier.error(
-						reason='The dropdown-button could not be found.')
-					last_status = False
-			else:
-				if last_status is not False:
-					notifier.error(
-						reason=f'The website returned the HTTP code {index_response.status}.'
-					)
-					last_status = False
+		engine.run()
 	except KeyboardInterrupt:
 		handle_exit_signals()
+	reloader.stop()
+
+	if dispatcher.pending() > 0:
+		print('Sending the pending notifications... Press Ctrl+C to skip them.')
+	dispatcher.close(drain=True)
 
+	for target in targets:
+		if target.notifier is not None:
+			target.notifier.close()
+
+	if hedger is not None:
+		hedger.close()
+	if event_log is not None:
+		event_log.close()
+	connections: Optional[PoolStatistics] = net.statistics()
 	net.dispose()
+	if capture_archive is not None:
+		net.disable_capture()
+		capture_archive.close()
+
+	if metrics_server is not None:
+		metrics_server.stop()
+	if metrics_writer is not None:
+		metrics_writer.stop()
 
 	main_stopwatch.stop()
 	if config.verbose:
 		print(f'Time elapsed: {main_stopwatch.elapsed()}s')
+		if prober.durations.count > 0:
+			print(
+				f'Probes: {prober.durations.count}, mean: {prober.durations.mean:.3f}s, p50: {prober.durations.percentile(50):.3f}s, p99: {prober.durations.percentile(99):.3f}s'
+			)
+		if prober.transfer['decompressed'] > 0:
+			print(
+				f'Bodies: {prober.transfer["compressed"]} bytes received, {prober.transfer["decompressed"]} bytes decompressed ({1 - prober.transfer["compressed"] / prober.transfer["decompressed"]:.0%} saved)'
+			)
+		if connections is not None and connections.reuse_ratio() is not None:
+			print(
+				f'Connections: {connections.total(CONNECTION_CREATED)} created, {connections.total(CONNECTION_REUSED)} reused ({connections.reuse_ratio():.0%})'
+			)
+		print(
+			f'Retry budget: {retry_budget.counts["retry"]} retries, {retry_budget.counts["hedge"]} hedged requests, {retry_budget.counts["denied"]} denied'
+		)
+		if dns_cache is not None:
+			print(
+				f'DNS cache: {dns_cache.counts["hit"]} hits, {dns_cache.counts["miss"]} misses, {dns_cache.counts["stale"]} stale'
+			)
+		if prober.deep_checker is not None:
+			print(
+				f'Deep check: {prober.deep_checker.counts["request"]} requests, {prober.deep_checker.counts["cached"]} cached pages, {prober.deep_checker.counts["restart"]} restarted sessions'
+			)
 
 	print('Goodbye!')
 
 
 if __name__ == '__main__':
-	main(GlobalConfig.parse())
+	if len(sys.argv) > 1 and sys.argv[1] == 'analyze':
+		# Imported here, since it is only used by the "analyze" subcommand
+		from ojala_cita_previa.monitor.analysis import main as analyze
+		analyze(sys.argv[2:])
+		sys.exit(0)
+
+	global_config: GlobalConfig = GlobalConfig.parse()
+	if global_config.workers > 1:
+		# Imported here, since it is only used with several workers
+		from ojala_cita_previa.monitor.supervisor import Supervisor
+		Supervisor(global_config).run()
+	else:
+		main(global_config)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 import abc
-from typing import Union, Optional
+from typing import Union, Optional, Tuple, Any
 
 from typeguard import typechecked
 
@@ -12,6 +12,8 @@ class AbstractConfiguration(abc.ABC):
 		self,
 		connect_timeout_s: Union[int, float, None] = None,
 		read_timeout_s: Union[int, float, None] = None,
+		targets: Optional[Tuple[str, ...]] = None,
+		max_concurrency: Optional[int] = None,
 		sound_enabled: Optional[bool] = None,
 		message_enabled: Optional[bool] = None,
 		email_enabled: Optional[bool] = None,
@@ -22,11 +24,72 @@ class AbstractConfiguration(abc.ABC):
 		email_password: Optional[str] = None,
 		email_from_email: Optional[str] = None,
 		email_timeout_s: Union[int, float, None] = None,
+		detection_mode: Optional[str] = None,
+		stream_max_bytes: Optional[int] = None,
+		poll_interval_s: Union[int, float, None] = None,
+		poll_max_interval_s: Union[int, float, None] = None,
+		poll_backoff_factor: Union[int, float, None] = None,
+		poll_jitter_ratio: Union[int, float, None] = None,
+		poll_hot_interval_s: Union[int, float, None] = None,
+		poll_hot_duration_s: Union[int, float, None] = None,
+		conditional_requests: Optional[bool] = None,
+		email_keepalive_s: Union[int, float, None] = None,
+		notification_queue_size: Optional[int] = None,
+		notification_workers: Optional[int] = None,
+		notification_overflow: Optional[str] = None,
+		email_digest_window_s: Union[int, float, None] = None,
+		metrics_port: Optional[int] = None,
+		metrics_host: Optional[str] = None,
+		metrics_file: Optional[str] = None,
+		metrics_file_interval_s: Union[int, float, None] = None,
+		capture_dir: Optional[str] = None,
+		capture_max_bytes: Optional[int] = None,
+		reload_watch_interval_s: Union[int, float, None] = None,
+		workers: Optional[int] = None,
+		pool_num_pools: Optional[int] = None,
+		pool_maxsize: Optional[int] = None,
+		pool_block: Optional[bool] = None,
+		pool_idle_timeout_s: Union[int, float, None] = None,
+		pool_hosts: Optional[Tuple[Tuple[str, Tuple[Tuple[str, Any], ...]],
+									...]] = None,
+		tls_verify: Optional[bool] = None,
+		tls_ca_certs: Optional[str] = None,
+		tls_minimum_version: Optional[str] = None,
+		dns_cache_enabled: Optional[bool] = None,
+		dns_ttl_s: Union[int, float, None] = None,
+		dns_min_ttl_s: Union[int, float, None] = None,
+		dns_max_ttl_s: Union[int, float, None] = None,
+		dns_stale_ttl_s: Union[int, float, None] = None,
+		hedge_enabled: Optional[bool] = None,
+		hedge_percentile: Union[int, float, None] = None,
+		hedge_min_delay_s: Union[int, float, None] = None,
+		retry_budget_ratio: Union[int, float, None] = None,
+		retry_budget_min_per_s: Union[int, float, None] = None,
+		event_log_file: Optional[str] = None,
+		event_log_flush_interval_s: Union[int, float, None] = None,
+		detection_rules: Optional[Tuple[Tuple[Tuple[str, Any], ...],
+										...]] = None,
+		deep_check_steps: Optional[Tuple[Tuple[Tuple[str, Any], ...],
+											...]] = None,
+		deep_check_rules: Optional[Tuple[Tuple[Tuple[str, Any], ...],
+											...]] = None,
+		deep_check_cache_ttl_s: Union[int, float, None] = None,
+		webhook_enabled: Optional[bool] = None,
+		webhook_url: Optional[str] = None,
+		webhook_headers: Optional[Tuple[Tuple[str, str], ...]] = None,
+		webhook_timeout_s: Union[int, float, None] = None,
+		webhook_batch_window_s: Union[int, float, None] = None,
+		webhook_max_retries: Optional[int] = None,
+		webhook_backoff_s: Union[int, float, None] = None,
+		notification_rate_limits: Optional[Tuple[Tuple[str, int, float],
+													...]] = None,
 		verbose: Optional[bool] = None,
 		debug: Optional[bool] = None,
 	):
 		self.connect_timeout_s = connect_timeout_s
 		self.read_timeout_s = read_timeout_s
+		self.targets = targets
+		self.max_concurrency = max_concurrency
 		self.sound_enabled = sound_enabled
 		self.message_enabled = message_enabled
 		self.email_enabled = email_enabled
@@ -37,6 +100,60 @@ class AbstractConfiguration(abc.ABC):
 		self.email_password = email_password
 		self.email_from_email = email_from_email
 		self.email_timeout_s = email_timeout_s
+		self.detection_mode = detection_mode
+		self.stream_max_bytes = stream_max_bytes
+		self.poll_interval_s = poll_interval_s
+		self.poll_max_interval_s = poll_max_interval_s
+		self.poll_backoff_factor = poll_backoff_factor
+		self.poll_jitter_ratio = poll_jitter_ratio
+		self.poll_hot_interval_s = poll_hot_interval_s
+		self.poll_hot_duration_s = poll_hot_duration_s
+		self.conditional_requests = conditional_requests
+		self.email_keepalive_s = email_keepalive_s
+		self.notification_queue_size = notification_queue_size
+		self.notification_workers = notification_workers
+		self.notification_overflow = notification_overflow
+		self.email_digest_window_s = email_digest_window_s
+		self.metrics_port = metrics_port
+		self.metrics_host = metrics_host
+		self.metrics_file = metrics_file
+		self.metrics_file_interval_s = metrics_file_interval_s
+		self.capture_dir = capture_dir
+		self.capture_max_bytes = capture_max_bytes
+		self.reload_watch_interval_s = reload_watch_interval_s
+		self.workers = workers
+		self.pool_num_pools = pool_num_pools
+		self.pool_maxsize = pool_maxsize
+		self.pool_block = pool_block
+		self.pool_idle_timeout_s = pool_idle_timeout_s
+		self.pool_hosts = pool_hosts
+		self.tls_verify = tls_verify
+		self.tls_ca_certs = tls_ca_certs
+		self.tls_minimum_version = tls_minimum_version
+		self.dns_cache_enabled = dns_cache_enabled
+		self.dns_ttl_s = dns_ttl_s
+		self.dns_min_ttl_s = dns_min_ttl_s
+		self.dns_max_ttl_s = dns_max_ttl_s
+		self.dns_stale_ttl_s = dns_stale_ttl_s
+		self.hedge_enabled = hedge_enabled
+		self.hedge_percentile = hedge_percentile
+		self.hedge_min_delay_s = hedge_min_delay_s
+		self.retry_budget_ratio = retry_budget_ratio
+		self.retry_budget_min_per_s = retry_budget_min_per_s
+		self.event_log_file = event_log_file
+		self.event_log_flush_interval_s = event_log_flush_interval_s
+		self.detection_rules = detection_rules
+		self.deep_check_steps = deep_check_steps
+		self.deep_check_rules = deep_check_rules
+		self.deep_check_cache_ttl_s = deep_check_cache_ttl_s
+		self.webhook_enabled = webhook_enabled
+		self.webhook_url = webhook_url
+		self.webhook_headers = webhook_headers
+		self.webhook_timeout_s = webhook_timeout_s
+		self.webhook_batch_window_s = webhook_batch_window_s
+		self.webhook_max_retries = webhook_max_retries
+		self.webhook_backoff_s = webhook_backoff_s
+		self.notification_rate_limits = notification_rate_limits
 		self.verbose = verbose
 		self.debug = debug
 
@@ -46,7 +163,7 @@ class AbstractConfiguration(abc.ABC):
 		raise NotImplementedError()
 
 	def members(self) -> tuple:
-		return self.connect_timeout_s, self.read_timeout_s, self.sound_enabled, self.message_enabled, self.email_enabled, self.email_recipients, self.email_host, self.email_port, self.email_username, self.email_password, self.email_from_email, self.email_timeout_s, self.verbose, self.debug
+		return self.connect_timeout_s, self.read_timeout_s, self.targets, self.max_concurrency, self.sound_enabled, self.message_enabled, self.email_enabled, self.email_recipients, self.email_host, self.email_port, self.email_username, self.email_password, self.email_from_email, self.email_timeout_s, self.detection_mode, self.stream_max_bytes, self.poll_interval_s, self.poll_max_interval_s, self.poll_backoff_factor, self.poll_jitter_ratio, self.poll_hot_interval_s, self.poll_hot_duration_s, self.conditional_requests, self.email_keepalive_s, self.notification_queue_size, self.notification_workers, self.notification_overflow, self.email_digest_window_s, self.metrics_port, self.metrics_host, self.metrics_file, self.metrics_file_interval_s, self.capture_dir, self.capture_max_bytes, self.reload_watch_interval_s, self.workers, self.pool_num_pools, self.pool_maxsize, self.pool_block, self.pool_idle_timeout_s, self.pool_hosts, self.tls_verify, self.tls_ca_certs, self.tls_minimum_version, self.dns_cache_enabled, self.dns_ttl_s, self.dns_min_ttl_s, self.dns_max_ttl_s, self.dns_stale_ttl_s, self.hedge_enabled, self.hedge_percentile, self.hedge_min_delay_s, self.retry_budget_ratio, self.retry_budget_min_per_s, self.event_log_file, self.event_log_flush_interval_s, self.detection_rules, self.deep_check_steps, self.deep_check_rules, self.deep_check_cache_ttl_s, self.webhook_enabled, self.webhook_url, self.webhook_headers, self.webhook_timeout_s, self.webhook_batch_window_s, self.webhook_max_retries, self.webhook_backoff_s, self.notification_rate_limits, self.verbose, self.debug
 
 	def __eq__(self, other) -> bool:
 		return isinstance(
@@ -62,6 +179,8 @@ class AbstractConfiguration(abc.ABC):
 		return 'Configuration(' + ', '.join([
 			f'connect_timeout_s: {self.connect_timeout_s}',
 			f'read_timeout_s: {self.read_timeout_s}',
+			f'targets: {self.targets}',
+			f'max_concurrency: {self.max_concurrency}',
 			f'sound_enabled: {self.sound_enabled}',
 			f'message_enabled: {self.message_enabled}',
 			f'email_enabled: {self.email_enabled}',
@@ -72,6 +191,60 @@ class AbstractConfiguration(abc.ABC):
 			f'email_password: {self.email_password}',
 			f'email_from_email: {self.email_from_email}',
 			f'email_timeout_s: {self.email_timeout_s}',
+			f'detection_mode: {self.detection_mode}',
+			f'stream_max_bytes: {self.stream_max_bytes}',
+			f'poll_interval_s: {self.poll_interval_s}',
+			f'poll_max_interval_s: {self.poll_max_interval_s}',
+			f'poll_backoff_factor: {self.poll_backoff_factor}',
+			f'poll_jitter_ratio: {self.poll_jitter_ratio}',
+			f'poll_hot_interval_s: {self.poll_hot_interval_s}',
+			f'poll_hot_duration_s: {self.poll_hot_duration_s}',
+			f'conditional_requests: {self.conditional_requests}',
+			f'email_keepalive_s: {self.email_keepalive_s}',
+			f'notification_queue_size: {self.notification_queue_size}',
+			f'notification_workers: {self.notification_workers}',
+			f'notification_overflow: {self.notification_overflow}',
+			f'email_digest_window_s: {self.email_digest_window_s}',
+			f'metrics_port: {self.metrics_port}',
+			f'metrics_host: {self.metrics_host}',
+			f'metrics_file: {self.metrics_file}',
+			f'metrics_file_interval_s: {self.metrics_file_interval_s}',
+			f'capture_dir: {self.capture_dir}',
+			f'capture_max_bytes: {self.capture_max_bytes}',
+			f'reload_watch_interval_s: {self.reload_watch_interval_s}',
+			f'workers: {self.workers}',
+			f'pool_num_pools: {self.pool_num_pools}',
+			f'pool_maxsize: {self.pool_maxsize}',
+			f'pool_block: {self.pool_block}',
+			f'pool_idle_timeout_s: {self.pool_idle_timeout_s}',
+			f'pool_hosts: {self.pool_hosts}',
+			f'tls_verify: {self.tls_verify}',
+			f'tls_ca_certs: {self.tls_ca_certs}',
+			f'tls_minimum_version: {self.tls_minimum_version}',
+			f'dns_cache_enabled: {self.dns_cache_enabled}',
+			f'dns_ttl_s: {self.dns_ttl_s}',
+			f'dns_min_ttl_s: {self.dns_min_ttl_s}',
+			f'dns_max_ttl_s: {self.dns_max_ttl_s}',
+			f'dns_stale_ttl_s: {self.dns_stale_ttl_s}',
+			f'hedge_enabled: {self.hedge_enabled}',
+			f'hedge_percentile: {self.hedge_percentile}',
+			f'hedge_min_delay_s: {self.hedge_min_delay_s}',
+			f'retry_budget_ratio: {self.retry_budget_ratio}',
+			f'retry_budget_min_per_s: {self.retry_budget_min_per_s}',
+			f'event_log_file: {self.event_log_file}',
+			f'event_log_flush_interval_s: {self.event_log_flush_interval_s}',
+			f'detection_rules: {self.detection_rules}',
+			f'deep_check_steps: {self.deep_check_steps}',
+			f'deep_check_rules: {self.deep_check_rules}',
+			f'deep_check_cache_ttl_s: {self.deep_check_cache_ttl_s}',
+			f'webhook_enabled: {self.webhook_enabled}',
+			f'webhook_url: {self.webhook_url}',
+			f'webhook_headers: {self.webhook_headers}',
+			f'webhook_timeout_s: {self.webhook_timeout_s}',
+			f'webhook_batch_window_s: {self.webhook_batch_window_s}',
+			f'webhook_max_retries: {self.webhook_max_retries}',
+			f'webhook_backoff_s: {self.webhook_backoff_s}',
+			f'notification_rate_limits: {self.notification_rate_limits}',
 			f'verbose: {self.verbose}',
 			f'debug: {self.debug}',
 		]) + ')'
@@ -1,13 +1,19 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import argparse
-from typing import Optional, Sequence
+import sys
+import threading
+from typing import Optional, Sequence, Dict, Tuple
 
 import ojala_cita_previa as init_ojala
 from ojala_cita_previa.config.abstract_configuration import \
  AbstractConfiguration
 import ojala_cita_previa.config.default_values as default_values
 
+# The arguments already parsed, for each command line
+_cache: Dict[Tuple[str, ...], 'AppArguments'] = {}
+_cache_lock: threading.Lock = threading.Lock()
+
 
 class AppArguments(AbstractConfiguration):
 	"""
@@ -20,8 +26,20 @@ class AppArguments(AbstractConfiguration):
 		Constructor for `AppArguments`. It parse the given arguments.
 		:param argv: The list of arguments to parse. If not given, it will
 		default to `sys.argv`
-		:return: Return the corresponding instance of `AppArguments`.
+		:return: Return the corresponding instance of `AppArguments`. The
+		result is cached, so the same command line is only parsed once.
 		"""
+		key: Tuple[str, ...] = tuple(argv if argv is not None else sys.argv[1:])
+		with _cache_lock:
+			cached: Optional[AppArguments] = _cache.get(key)
+		if cached is None:
+			cached = cls._parse(list(key))
+			with _cache_lock:
+				_cache[key] = cached
+		return cached
+
+	@classmethod
+	def _parse(cls, argv: Sequence[str]) -> 'AppArguments':
 		# Create main parser
 		p = argparse.ArgumentParser(
 			prog='ojala_cita_previa',
@@ -42,16 +60,31 @@ class AppArguments(AbstractConfiguration):
 			default=None,
 			help=f'The read timeout in seconds. Defaults to {default_values.DEFAULT_READ_TIMEOUT_S}s.',
 		)
+		p.add_argument(
+			'--target',
+			'-t',
+			action='append',
+			default=None,
+			help=f'The URL of a website to monitor. Can be given several times. Defaults to {", ".join(default_values.DEFAULT_TARGETS)}.',
+		)
+		p.add_argument(
+			'--max-concurrency',
+			default=None,
+			help=f'The maximum number of requests in flight at the same time. Defaults to {default_values.DEFAULT_MAX_CONCURRENCY}.',
+			type=int,
+		)
 		p.add_argument(
 			'--no-sound',
-			action='store_true',
+			action='store_false',
 			default=None,
+			dest='sound_enabled',
 			help=f'Disable the sound. Defaults to {not default_values.DEFAULT_SOUND_ENABLED}.',
 		)
 		p.add_argument(
 			'--no-message',
-			action='store_true',
+			action='store_false',
 			default=None,
+			dest='message_enabled',
 			help=f'Disable the output on the terminal. Defaults to {not default_values.DEFAULT_MESSAGE_ENABLED}.',
 		)
 		p.add_argument(
@@ -89,6 +122,285 @@ class AppArguments(AbstractConfiguration):
 			default=None,
 			help=f'The email sending timeout. Defaults to {default_values.DEFAULT_EMAIL_TIMEOUT_S}s',
 		)
+		p.add_argument(
+			'--detection-mode',
+			choices=['stream', 'full'],
+			default=None,
+			help=f'How the webpage is inspected: "stream" stops reading as soon as the form is found, "full" parses the whole page. Defaults to {default_values.DEFAULT_DETECTION_MODE}.',
+		)
+		p.add_argument(
+			'--stream-max-bytes',
+			default=None,
+			help=f'In stream mode, the maximum number of bytes to inspect before giving up. Defaults to {default_values.DEFAULT_STREAM_MAX_BYTES}.',
+			type=int,
+		)
+		p.add_argument(
+			'--poll-interval',
+			default=None,
+			help=f'The base delay between two requests to the same website, in seconds. Defaults to {default_values.DEFAULT_POLL_INTERVAL_S}s.',
+			type=float,
+		)
+		p.add_argument(
+			'--poll-max-interval',
+			default=None,
+			help=f'The maximum delay between two requests when the website is down, in seconds. Defaults to {default_values.DEFAULT_POLL_MAX_INTERVAL_S}s.',
+			type=float,
+		)
+		p.add_argument(
+			'--poll-backoff-factor',
+			default=None,
+			help=f'The factor applied to the delay after each consecutive failure. Defaults to {default_values.DEFAULT_POLL_BACKOFF_FACTOR}.',
+			type=float,
+		)
+		p.add_argument(
+			'--poll-jitter',
+			default=None,
+			help=f'The maximum relative random variation applied to each delay. Defaults to {default_values.DEFAULT_POLL_JITTER_RATIO}.',
+			type=float,
+		)
+		p.add_argument(
+			'--poll-hot-interval',
+			default=None,
+			help=f'The maximum delay between two requests right after a change of status, in seconds. Defaults to {default_values.DEFAULT_POLL_HOT_INTERVAL_S}s.',
+			type=float,
+		)
+		p.add_argument(
+			'--poll-hot-duration',
+			default=None,
+			help=f'How long the short delay is used after a change of status, in seconds. Defaults to {default_values.DEFAULT_POLL_HOT_DURATION_S}s.',
+			type=float,
+		)
+		p.add_argument(
+			'--no-conditional-requests',
+			action='store_false',
+			default=None,
+			dest='conditional_requests',
+			help=f'Do not send conditional requests (If-None-Match, If-Modified-Since). Defaults to {not default_values.DEFAULT_CONDITIONAL_REQUESTS}.',
+		)
+		p.add_argument(
+			'--email-keepalive',
+			default=None,
+			help=f'The delay between two NOOP commands sent to keep the SMTP connection alive, in seconds. Defaults to {default_values.DEFAULT_EMAIL_KEEPALIVE_S}s',
+		)
+		p.add_argument(
+			'--notification-queue-size',
+			default=None,
+			help=f'The maximum number of notifications waiting to be sent. Defaults to {default_values.DEFAULT_NOTIFICATION_QUEUE_SIZE}.',
+			type=int,
+		)
+		p.add_argument(
+			'--notification-workers',
+			default=None,
+			help=f'The number of threads that send the notifications. Defaults to {default_values.DEFAULT_NOTIFICATION_WORKERS}.',
+			type=int,
+		)
+		p.add_argument(
+			'--notification-overflow',
+			choices=['block', 'drop-oldest', 'coalesce'],
+			default=None,
+			help=f'What to do when the notification queue is full. Defaults to {default_values.DEFAULT_NOTIFICATION_OVERFLOW}.',
+		)
+		p.add_argument(
+			'--email-digest-window',
+			default=None,
+			help=f'Send the status changes that happen within this window, in seconds, in a single email. Defaults to {default_values.DEFAULT_EMAIL_DIGEST_WINDOW_S}',
+		)
+		p.add_argument(
+			'--metrics-port',
+			default=None,
+			help=f'Serve the metrics in the Prometheus text format on this port. Defaults to {default_values.DEFAULT_METRICS_PORT}.',
+			type=int,
+		)
+		p.add_argument(
+			'--metrics-host',
+			default=None,
+			help=f'The address the metrics server listens to. Defaults to {default_values.DEFAULT_METRICS_HOST}.',
+		)
+		p.add_argument(
+			'--metrics-file',
+			default=None,
+			help=f'Write the metrics in the Prometheus text format into this file. Defaults to {default_values.DEFAULT_METRICS_FILE}.',
+		)
+		p.add_argument(
+			'--metrics-file-interval',
+			default=None,
+			help=f'The delay between two writes of the metrics file, in seconds. Defaults to {default_values.DEFAULT_METRICS_FILE_INTERVAL_S}s.',
+			type=float,
+		)
+		p.add_argument(
+			'--capture-dir',
+			default=None,
+			help=f'Capture the responses of the website into an archive in this directory, to replay them later with "python -m ojala_cita_previa.monitor.replay". Defaults to {default_values.DEFAULT_CAPTURE_DIR}.',
+		)
+		p.add_argument(
+			'--capture-max-bytes',
+			default=None,
+			help=f'The maximum size of the capture archive, in bytes. The oldest responses are dropped beyond. Defaults to {default_values.DEFAULT_CAPTURE_MAX_BYTES}.',
+			type=int,
+		)
+		p.add_argument(
+			'--reload-watch-interval',
+			default=None,
+			help=f'Check if the configuration file changed every this number of seconds, and apply the new configuration without restarting. The configuration is also reloaded on SIGHUP. Defaults to {default_values.DEFAULT_RELOAD_WATCH_INTERVAL_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--workers',
+			'-w',
+			default=None,
+			help=f'The number of processes that probe the targets. With more than one, the targets are split between the processes, and the notifications are sent by the main process. Defaults to {default_values.DEFAULT_WORKERS}.',
+			type=int,
+		)
+		p.add_argument(
+			'--pool-num-pools',
+			default=None,
+			help=f'The number of connection pools (one per host) to keep. Defaults to {default_values.DEFAULT_POOL_NUM_POOLS}.',
+			type=int,
+		)
+		p.add_argument(
+			'--pool-maxsize',
+			default=None,
+			help='The number of connections to keep in each connection pool. Defaults to the maximum concurrency.',
+			type=int,
+		)
+		p.add_argument(
+			'--pool-block',
+			action='store_true',
+			default=None,
+			help=f'Wait for a free connection when a pool is full, instead of opening a connection that is not kept. Defaults to {default_values.DEFAULT_POOL_BLOCK}.',
+		)
+		p.add_argument(
+			'--pool-idle-timeout',
+			default=None,
+			help=f'Close the connections that stayed idle for longer than this number of seconds instead of reusing them. Defaults to {default_values.DEFAULT_POOL_IDLE_TIMEOUT_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--no-tls-verify',
+			action='store_false',
+			default=None,
+			dest='tls_verify',
+			help=f'Do not verify the TLS certificates. Defaults to {not default_values.DEFAULT_TLS_VERIFY}.',
+		)
+		p.add_argument(
+			'--tls-ca-certs',
+			default=None,
+			help='The file of the certificate authorities used to verify the TLS certificates. Defaults to the certificates of the system.',
+		)
+		p.add_argument(
+			'--tls-minimum-version',
+			choices=['TLSv1.2', 'TLSv1.3'],
+			default=None,
+			help=f'The minimum TLS version. Defaults to {default_values.DEFAULT_TLS_MINIMUM_VERSION}.',
+		)
+		p.add_argument(
+			'--dns-cache',
+			action='store_true',
+			default=None,
+			dest='dns_cache_enabled',
+			help=f'Cache the resolved host names, instead of resolving them for each new connection. Defaults to {default_values.DEFAULT_DNS_CACHE_ENABLED}.',
+		)
+		p.add_argument(
+			'--dns-ttl',
+			default=None,
+			help=f'How long a host name stays in the DNS cache, in seconds, since the resolver of the system does not give the TTL of the records. Defaults to {default_values.DEFAULT_DNS_TTL_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--dns-min-ttl',
+			default=None,
+			help=f'The minimum time a host name stays in the DNS cache, in seconds. Defaults to {default_values.DEFAULT_DNS_MIN_TTL_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--dns-max-ttl',
+			default=None,
+			help=f'The maximum time a host name stays in the DNS cache, in seconds. Defaults to {default_values.DEFAULT_DNS_MAX_TTL_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--dns-stale-ttl',
+			default=None,
+			help=f'How long an expired host name can still be used while it is resolved again, in seconds. Defaults to {default_values.DEFAULT_DNS_STALE_TTL_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--hedge',
+			action='store_true',
+			default=None,
+			dest='hedge_enabled',
+			help=f'Send a request a second time when it is slower than usual, and use the first response. Defaults to {default_values.DEFAULT_HEDGE_ENABLED}.',
+		)
+		p.add_argument(
+			'--hedge-percentile',
+			default=None,
+			help=f'The percentile of the previous durations after which a request is hedged. Defaults to {default_values.DEFAULT_HEDGE_PERCENTILE}.',
+			type=float,
+		)
+		p.add_argument(
+			'--hedge-min-delay',
+			default=None,
+			help=f'The minimum delay before hedging a request, in seconds. Defaults to {default_values.DEFAULT_HEDGE_MIN_DELAY_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--retry-budget-ratio',
+			default=None,
+			help=f'The maximum number of retries and hedged requests per request, over the last 10 seconds. Defaults to {default_values.DEFAULT_RETRY_BUDGET_RATIO}.',
+			type=float,
+		)
+		p.add_argument(
+			'--retry-budget-min-per-s',
+			default=None,
+			help=f'The number of retries and hedged requests per second that are always allowed. Defaults to {default_values.DEFAULT_RETRY_BUDGET_MIN_PER_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--event-log',
+			default=None,
+			help='The SQLite file where the probes and the status changes are recorded. The last status of each website is restored from it at startup, so a restart does not notify again. Defaults to no event log.',
+		)
+		p.add_argument(
+			'--event-log-flush-interval',
+			default=None,
+			help=f'The maximum delay before an event is written in the event log, in seconds. Defaults to {default_values.DEFAULT_EVENT_LOG_FLUSH_INTERVAL_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--deep-check-cache-ttl',
+			default=None,
+			help=f'How long the static pages of the deep check are cached, in seconds. Defaults to {default_values.DEFAULT_DEEP_CHECK_CACHE_TTL_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--webhook-url',
+			default=None,
+			help='Post the status changes as JSON to this URL. Defaults to no webhook.',
+		)
+		p.add_argument(
+			'--webhook-timeout',
+			default=None,
+			help=f'The timeout of the webhook requests, in seconds. Defaults to {default_values.DEFAULT_WEBHOOK_TIMEOUT_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--webhook-batch-window',
+			default=None,
+			help=f'Post the status changes that happen within this window, in seconds, in a single request. Defaults to {default_values.DEFAULT_WEBHOOK_BATCH_WINDOW_S}.',
+			type=float,
+		)
+		p.add_argument(
+			'--webhook-max-retries',
+			default=None,
+			help=f'The number of times a failed webhook request is sent again. Defaults to {default_values.DEFAULT_WEBHOOK_MAX_RETRIES}.',
+			type=int,
+		)
+		p.add_argument(
+			'--webhook-backoff',
+			default=None,
+			help=f'The delay before the first retry of a webhook request, in seconds. It doubles after each retry. Defaults to {default_values.DEFAULT_WEBHOOK_BACKOFF_S}.',
+			type=float,
+		)
 		p.add_argument(
 			'--verbose',
 			'-v',
@@ -117,8 +429,10 @@ class AppArguments(AbstractConfiguration):
 				args.connect_timeout, str) else args.connect_timeout,
 			read_timeout_s=float(args.read_timeout) if isinstance(
 				args.read_timeout, str) else args.read_timeout,
-			sound_enabled=args.no_sound,
-			message_enabled=args.no_message,
+			targets=tuple(args.target) if args.target is not None else None,
+			max_concurrency=args.max_concurrency,
+			sound_enabled=args.sound_enabled,
+			message_enabled=args.message_enabled,
 			email_enabled=None,
 			email_recipients=args.email_recipients,
 			email_host=args.email_host,
@@ -129,6 +443,62 @@ class AppArguments(AbstractConfiguration):
 			email_from_email=args.email_from_email,
 			email_timeout_s=float(args.email_timeout) if isinstance(
 				args.email_timeout, str) else args.email_timeout,
+			detection_mode=args.detection_mode,
+			stream_max_bytes=args.stream_max_bytes,
+			poll_interval_s=args.poll_interval,
+			poll_max_interval_s=args.poll_max_interval,
+			poll_backoff_factor=args.poll_backoff_factor,
+			poll_jitter_ratio=args.poll_jitter,
+			poll_hot_interval_s=args.poll_hot_interval,
+			poll_hot_duration_s=args.poll_hot_duration,
+			conditional_requests=args.conditional_requests,
+			email_keepalive_s=float(args.email_keepalive) if isinstance(
+				args.email_keepalive, str) else args.email_keepalive,
+			notification_queue_size=args.notification_queue_size,
+			notification_workers=args.notification_workers,
+			notification_overflow=args.notification_overflow,
+			email_digest_window_s=float(args.email_digest_window) if isinstance(
+				args.email_digest_window, str) else args.email_digest_window,
+			metrics_port=args.metrics_port,
+			metrics_host=args.metrics_host,
+			metrics_file=args.metrics_file,
+			metrics_file_interval_s=args.metrics_file_interval,
+			capture_dir=args.capture_dir,
+			capture_max_bytes=args.capture_max_bytes,
+			reload_watch_interval_s=args.reload_watch_interval,
+			workers=args.workers,
+			pool_num_pools=args.pool_num_pools,
+			pool_maxsize=args.pool_maxsize,
+			pool_block=args.pool_block,
+			pool_idle_timeout_s=args.pool_idle_timeout,
+			pool_hosts=None,
+			tls_verify=args.tls_verify,
+			tls_ca_certs=args.tls_ca_certs,
+			tls_minimum_version=args.tls_minimum_version,
+			dns_cache_enabled=args.dns_cache_enabled,
+			dns_ttl_s=args.dns_ttl,
+			dns_min_ttl_s=args.dns_min_ttl,
+			dns_max_ttl_s=args.dns_max_ttl,
+			dns_stale_ttl_s=args.dns_stale_ttl,
+			hedge_enabled=args.hedge_enabled,
+			hedge_percentile=args.hedge_percentile,
+			hedge_min_delay_s=args.hedge_min_delay,
+			retry_budget_ratio=args.retry_budget_ratio,
+			retry_budget_min_per_s=args.retry_budget_min_per_s,
+			event_log_file=args.event_log,
+			event_log_flush_interval_s=args.event_log_flush_interval,
+			detection_rules=None,
+			deep_check_steps=None,
+			deep_check_rules=None,
+			deep_check_cache_ttl_s=args.deep_check_cache_ttl,
+			webhook_enabled=True if args.webhook_url is not None else None,
+			webhook_url=args.webhook_url,
+			webhook_headers=None,
+			webhook_timeout_s=args.webhook_timeout,
+			webhook_batch_window_s=args.webhook_batch_window,
+			webhook_max_retries=args.webhook_max_retries,
+			webhook_backoff_s=args.webhook_backoff,
+			notification_rate_limits=None,
 			verbose=args.verbose,
 			debug=args.debug,
 		)
@@ -1,8 +1,39 @@
 #!/usr/bin/env python
-from typing import Union, Optional
+from typing import Union, Optional, Tuple, Any
 
 DEFAULT_CONNECT_TIMEOUT_S: Union[int, float, None] = 5
-DEFAULT_READ_TIMEOUT_S: Union[int, float, None] = None
+DEFAULT_READ_TIMEOUT_S: Union[int, float, None] = 10
+DEFAULT_TARGETS: Tuple[str, ...] = (
+	'https://icp.administracionelectronica.gob.es/icpplus/index.html',)
+DEFAULT_MAX_CONCURRENCY: int = 10
+
+DEFAULT_POOL_NUM_POOLS: int = 10
+DEFAULT_POOL_MAXSIZE: Optional[int] = None
+DEFAULT_POOL_BLOCK: bool = False
+DEFAULT_POOL_IDLE_TIMEOUT_S: Union[int, float, None] = None
+DEFAULT_POOL_HOSTS: Optional[Tuple[Tuple[str, Tuple[Tuple[str, Any], ...]],
+									...]] = None
+DEFAULT_TLS_VERIFY: bool = True
+DEFAULT_TLS_CA_CERTS: Optional[str] = None
+DEFAULT_TLS_MINIMUM_VERSION: Optional[str] = None
+
+DEFAULT_DNS_CACHE_ENABLED: bool = False
+DEFAULT_DNS_TTL_S: Union[int, float] = 60
+DEFAULT_DNS_MIN_TTL_S: Union[int, float] = 5
+DEFAULT_DNS_MAX_TTL_S: Union[int, float] = 600
+DEFAULT_DNS_STALE_TTL_S: Union[int, float] = 600
+
+DEFAULT_HEDGE_ENABLED: bool = False
+DEFAULT_HEDGE_PERCENTILE: Union[int, float] = 95
+DEFAULT_HEDGE_MIN_DELAY_S: Union[int, float] = 0.1
+DEFAULT_RETRY_BUDGET_RATIO: Union[int, float] = 0.1
+DEFAULT_RETRY_BUDGET_MIN_PER_S: Union[int, float] = 1
+
+DEFAULT_WORKERS: int = 1
+
+DEFAULT_NOTIFICATION_QUEUE_SIZE: int = 100
+DEFAULT_NOTIFICATION_WORKERS: int = 2
+DEFAULT_NOTIFICATION_OVERFLOW: str = 'block'
 
 DEFAULT_SOUND_ENABLED: bool = True
 
@@ -16,6 +47,56 @@ DEFAULT_EMAIL_USERNAME: Optional[str] = None
 DEFAULT_EMAIL_PASSWORD: Optional[str] = None
 DEFAULT_EMAIL_FROM_EMAIL: Optional[str] = None
 DEFAULT_EMAIL_TIMEOUT_S: Union[int, float, None] = 5
+DEFAULT_EMAIL_KEEPALIVE_S: Union[int, float, None] = 60
+DEFAULT_EMAIL_DIGEST_WINDOW_S: Union[int, float, None] = None
+
+DEFAULT_WEBHOOK_ENABLED: bool = False
+DEFAULT_WEBHOOK_URL: Optional[str] = None
+DEFAULT_WEBHOOK_HEADERS: Optional[Tuple[Tuple[str, str], ...]] = None
+DEFAULT_WEBHOOK_TIMEOUT_S: Union[int, float] = 10
+DEFAULT_WEBHOOK_BATCH_WINDOW_S: Union[int, float] = 0.5
+DEFAULT_WEBHOOK_MAX_RETRIES: int = 5
+DEFAULT_WEBHOOK_BACKOFF_S: Union[int, float] = 1
+
+# The rate limit of the notifiers, as (notifier, burst, interval_s)
+DEFAULT_NOTIFICATION_RATE_LIMITS: Optional[Tuple[Tuple[str, int, float],
+													...]] = None
+
+DEFAULT_DETECTION_MODE: str = 'stream'
+DEFAULT_STREAM_MAX_BYTES: Optional[int] = 512 * 1024
+
+# No rules: the form of the appointments must be present
+DEFAULT_DETECTION_RULES: Optional[Tuple[Tuple[Tuple[str, Any], ...],
+										...]] = None
+
+# No steps: the deep check is disabled
+DEFAULT_DEEP_CHECK_STEPS: Optional[Tuple[Tuple[Tuple[str, Any], ...],
+											...]] = None
+DEFAULT_DEEP_CHECK_RULES: Optional[Tuple[Tuple[Tuple[str, Any], ...],
+											...]] = None
+DEFAULT_DEEP_CHECK_CACHE_TTL_S: Union[int, float] = 3600
+
+DEFAULT_POLL_INTERVAL_S: Union[int, float] = 5
+DEFAULT_POLL_MAX_INTERVAL_S: Union[int, float] = 120
+DEFAULT_POLL_BACKOFF_FACTOR: Union[int, float] = 2
+DEFAULT_POLL_JITTER_RATIO: Union[int, float] = 0.1
+DEFAULT_POLL_HOT_INTERVAL_S: Union[int, float] = 1
+DEFAULT_POLL_HOT_DURATION_S: Union[int, float] = 30
+
+DEFAULT_CONDITIONAL_REQUESTS: bool = True
+
+DEFAULT_METRICS_PORT: Optional[int] = None
+DEFAULT_METRICS_HOST: str = '127.0.0.1'
+DEFAULT_METRICS_FILE: Optional[str] = None
+DEFAULT_METRICS_FILE_INTERVAL_S: Union[int, float] = 15
+
+DEFAULT_CAPTURE_DIR: Optional[str] = None
+DEFAULT_CAPTURE_MAX_BYTES: int = 64 * 1024 * 1024
+
+DEFAULT_EVENT_LOG_FILE: Optional[str] = None
+DEFAULT_EVENT_LOG_FLUSH_INTERVAL_S: Union[int, float] = 1
+
+DEFAULT_RELOAD_WATCH_INTERVAL_S: Union[int, float, None] = None
 
 DEFAULT_VERBOSE: bool = False
 DEFAULT_DEBUG: bool = False
@@ -1,5 +1,8 @@
 #!/usr/bin/env python
-from typing import Dict, Any, Type, Union, Optional
+import hashlib
+import os
+import threading
+from typing import Dict, Any, Type, Union, Optional, Tuple, Sequence
 
 from ojala_cita_previa.config.abstract_configuration import \
  AbstractConfiguration
@@ -7,22 +10,74 @@ import ojala_cita_previa.config.default_values as default_values
 
 import yaml
 
+# Define the YAML object type in Python
+yaml_object_type: Type = Dict[str, Any]
+
+# The last configuration parsed from each file, along with the modification
+# time and size of the file, and the hash of its content
+_cache: Dict[str, Tuple[Tuple[int, int], bytes, 'FileConfig']] = {}
+_cache_lock: threading.Lock = threading.Lock()
+
+
+def _freeze_items(
+	items: Sequence[yaml_object_type]
+) -> Tuple[Tuple[Tuple[str, Any], ...], ...]:
+	"""
+	Convert a list of YAML objects to a hashable tuple: each object becomes
+	((key, value), ...), and its nested objects ((name, value), ...).
+	"""
+	return tuple(
+		tuple(
+			sorted((str(key), tuple(sorted(value.items())
+									) if isinstance(value, dict) else value)
+					for key, value in item.items())) for item in items)
+
 
 class FileConfig(AbstractConfiguration):
 
 	@classmethod
 	def parse(cls, file_path: Optional[str] = None) -> 'FileConfig':
+		"""
+		Parse the configuration file.
+
+		The result is cached: as long as the modification time and the size of
+		the file do not change, the file is not read again, and if its content
+		did not change either, it is not parsed again.
+		:param file_path: The path to the YAML file. Defaults to "ojala.yml".
+		:return: Returns the configuration.
+		"""
 		if file_path is None:
 			file_path = default_values.DEFAULT_CONFIG_FILE_PATH
+		file_path = os.path.abspath(file_path)
 
-		# Define the YAML object type in Python
-		yaml_object_type: Type = Dict[str, Any]
+		stat: os.stat_result = os.stat(file_path)
+		signature: Tuple[int, int] = (stat.st_mtime_ns, stat.st_size)
+		with _cache_lock:
+			cached = _cache.get(file_path)
+		if cached is not None and cached[0] == signature:
+			return cached[2]
 
-		# Read the YAML document
-		with open(file_path, mode='r', encoding='utf-8') as f:
+		with open(file_path, mode='rb') as f:
+			content: bytes = f.read()
+		digest: bytes = hashlib.blake2b(content, digest_size=16).digest()
+		if cached is not None and cached[1] == digest:
+			config: FileConfig = cached[2]
+		else:
 			# Parse it
-			yaml_doc: yaml_object_type = yaml.load(f.read(), yaml.CLoader)
+			config = cls.from_document(
+				yaml.load(content.decode('utf-8'), yaml.CLoader))
+
+		with _cache_lock:
+			_cache[file_path] = (signature, digest, config)
+		return config
 
+	@classmethod
+	def from_document(cls, yaml_doc: yaml_object_type) -> 'FileConfig':
+		"""
+		Build the configuration from a parsed YAML document.
+		:param yaml_doc: The YAML document.
+		:return: Returns the configuration.
+		"""
 		# REQUESTS
 		request: yaml_object_type = yaml_doc.get('request', {})
 
@@ -30,10 +85,106 @@ class FileConfig(AbstractConfiguration):
 			'connect_timeout_s', None)
 		read_timeout_s: Union[int, float, None] = request.get(
 			'read_timeout_s', None)
+		max_concurrency: Optional[int] = request.get('max_concurrency', None)
+		detection_mode: Optional[str] = request.get('detection_mode', None)
+		stream_max_bytes: Optional[int] = request.get('stream_max_bytes', None)
+		poll_interval_s: Union[int, float, None] = request.get(
+			'interval_s', None)
+		poll_max_interval_s: Union[int, float, None] = request.get(
+			'max_interval_s', None)
+		poll_backoff_factor: Union[int, float, None] = request.get(
+			'backoff_factor', None)
+		poll_jitter_ratio: Union[int, float, None] = request.get(
+			'jitter_ratio', None)
+		poll_hot_interval_s: Union[int, float, None] = request.get(
+			'hot_interval_s', None)
+		poll_hot_duration_s: Union[int, float, None] = request.get(
+			'hot_duration_s', None)
+		conditional_requests: Optional[bool] = request.get(
+			'conditional_requests', None)
+
+		# REQUESTS.POOL
+		pool: yaml_object_type = request.get('pool', {})
+		pool_num_pools: Optional[int] = pool.get('num_pools', None)
+		pool_maxsize: Optional[int] = pool.get('maxsize', None)
+		pool_block: Optional[bool] = pool.get('block', None)
+		pool_idle_timeout_s: Union[int, float, None] = pool.get(
+			'idle_timeout_s', None)
+		# The overrides of each host, as (host, ((parameter, value), ...))
+		pool_hosts: Optional[Tuple[Tuple[str, Tuple[Tuple[str, Any], ...]],
+									...]] = None
+		if pool.get('hosts', None) is not None:
+			pool_hosts = tuple(
+				(str(host), tuple(sorted((overrides or {}).items())))
+				for host, overrides in pool['hosts'].items())
+
+		# REQUESTS.TLS
+		tls: yaml_object_type = request.get('tls', {})
+		tls_verify: Optional[bool] = tls.get('verify', None)
+		tls_ca_certs: Optional[str] = tls.get('ca_certs', None)
+		tls_minimum_version: Optional[str] = tls.get('minimum_version', None)
+
+		# REQUESTS.DNS
+		dns: yaml_object_type = request.get('dns', {})
+		dns_cache_enabled: Optional[bool] = dns.get('cache', None)
+		dns_ttl_s: Union[int, float, None] = dns.get('ttl_s', None)
+		dns_min_ttl_s: Union[int, float, None] = dns.get('min_ttl_s', None)
+		dns_max_ttl_s: Union[int, float, None] = dns.get('max_ttl_s', None)
+		dns_stale_ttl_s: Union[int, float, None] = dns.get('stale_ttl_s', None)
+
+		# REQUESTS.HEDGE
+		hedge: yaml_object_type = request.get('hedge', {})
+		hedge_enabled: Optional[bool] = hedge.get('enabled', None)
+		hedge_percentile: Union[int, float, None] = hedge.get(
+			'percentile', None)
+		hedge_min_delay_s: Union[int, float, None] = hedge.get(
+			'min_delay_s', None)
+
+		# REQUESTS.RETRY_BUDGET
+		retry_budget: yaml_object_type = request.get('retry_budget', {})
+		retry_budget_ratio: Union[int, float, None] = retry_budget.get(
+			'ratio', None)
+		retry_budget_min_per_s: Union[int, float, None] = retry_budget.get(
+			'min_per_s', None)
+
+		# REQUESTS.DETECTION_RULES
+		detection_rules: Optional[Tuple[Tuple[Tuple[str, Any], ...],
+										...]] = None
+		if request.get('detection_rules', None) is not None:
+			detection_rules = _freeze_items(request['detection_rules'])
+
+		# DEEP_CHECK
+		deep_check: yaml_object_type = yaml_doc.get('deep_check', {})
+		deep_check_steps: Optional[Tuple[Tuple[Tuple[str, Any], ...],
+											...]] = None
+		if deep_check.get('steps', None) is not None:
+			deep_check_steps = _freeze_items(deep_check['steps'])
+		deep_check_rules: Optional[Tuple[Tuple[Tuple[str, Any], ...],
+											...]] = None
+		if deep_check.get('rules', None) is not None:
+			deep_check_rules = _freeze_items(deep_check['rules'])
+		deep_check_cache_ttl_s: Union[int, float, None] = deep_check.get(
+			'cache_ttl_s', None)
+
+		# TARGETS
+		targets: Optional[Tuple[str, ...]] = yaml_doc.get('targets', None)
+		if isinstance(targets, str):
+			targets = (targets,)
+		elif targets is not None:
+			targets = tuple(targets)
+
+		# WORKERS
+		workers: Optional[int] = yaml_doc.get('workers', None)
 
 		# NOTIFICATIONS
 		notifications: yaml_object_type = yaml_doc.get('notifications', {})
 
+		# NOTIFICATIONS.QUEUE
+		queue: yaml_object_type = notifications.get('queue', {})
+		notification_queue_size: Optional[int] = queue.get('size', None)
+		notification_workers: Optional[int] = queue.get('workers', None)
+		notification_overflow: Optional[str] = queue.get('overflow', None)
+
 		# NOTIFICATIONS.SOUND
 		sound: yaml_object_type = notifications.get('sound', {})
 		sound_enabled: Optional[bool] = sound.get('enabled', None)
@@ -53,6 +204,65 @@ class FileConfig(AbstractConfiguration):
 		email_password: Optional[str] = email.get('password', None)
 		email_from_email: Optional[str] = email.get('from_email', None)
 		email_timeout_s: Union[int, float, None] = email.get('timeout_s', None)
+		email_keepalive_s: Union[int, float, None] = email.get(
+			'keepalive_s', None)
+		email_digest_window_s: Union[int, float, None] = email.get(
+			'digest_window_s', None)
+
+		# NOTIFICATIONS.WEBHOOK
+		webhook: yaml_object_type = notifications.get('webhook', {})
+		webhook_enabled: Optional[bool] = webhook.get('enabled', None)
+		webhook_url: Optional[str] = webhook.get('url', None)
+		webhook_headers: Optional[Tuple[Tuple[str, str], ...]] = None
+		if webhook.get('headers', None) is not None:
+			webhook_headers = tuple(
+				sorted((str(name), str(value))
+						for name, value in webhook['headers'].items()))
+		webhook_timeout_s: Union[int, float, None] = webhook.get(
+			'timeout_s', None)
+		webhook_batch_window_s: Union[int, float, None] = webhook.get(
+			'batch_window_s', None)
+		webhook_max_retries: Optional[int] = webhook.get('max_retries', None)
+		webhook_backoff_s: Union[int, float, None] = webhook.get(
+			'backoff_s', None)
+
+		# NOTIFICATIONS.<NAME>.RATE_LIMIT
+		notification_rate_limits: Optional[Tuple[Tuple[str, int, float],
+													...]] = None
+		for name in ('sound', 'message', 'email', 'webhook'):
+			# An empty section, such as "sound:", is parsed as None
+			rate_limit: Optional[yaml_object_type] = (notifications.get(name) or
+														{}).get('rate_limit')
+			if rate_limit is not None:
+				notification_rate_limits = (notification_rate_limits or ()) + ((
+					name,
+					rate_limit.get('burst', 1),
+					rate_limit.get('interval_s', 60),
+				),)
+
+		# METRICS
+		metrics: yaml_object_type = yaml_doc.get('metrics', {})
+		metrics_port: Optional[int] = metrics.get('port', None)
+		metrics_host: Optional[str] = metrics.get('host', None)
+		metrics_file: Optional[str] = metrics.get('file', None)
+		metrics_file_interval_s: Union[int, float, None] = metrics.get(
+			'file_interval_s', None)
+
+		# CAPTURE
+		capture: yaml_object_type = yaml_doc.get('capture', {})
+		capture_dir: Optional[str] = capture.get('directory', None)
+		capture_max_bytes: Optional[int] = capture.get('max_bytes', None)
+
+		# EVENT_LOG
+		event_log: yaml_object_type = yaml_doc.get('event_log', {})
+		event_log_file: Optional[str] = event_log.get('file', None)
+		event_log_flush_interval_s: Union[int, float, None] = event_log.get(
+			'flush_interval_s', None)
+
+		# RELOAD
+		reload: yaml_object_type = yaml_doc.get('reload', {})
+		reload_watch_interval_s: Union[int, float, None] = reload.get(
+			'watch_interval_s', None)
 
 		# MISC
 		verbose: Optional[bool] = yaml_doc.get('verbose', None)
@@ -61,6 +271,8 @@ class FileConfig(AbstractConfiguration):
 		return FileConfig(
 			connect_timeout_s=connect_timeout_s,
 			read_timeout_s=read_timeout_s,
+			targets=targets,
+			max_concurrency=max_concurrency,
 			sound_enabled=sound_enabled,
 			message_enabled=message_enabled,
 			email_enabled=email_enabled,
@@ -71,6 +283,60 @@ class FileConfig(AbstractConfiguration):
 			email_password=email_password,
 			email_from_email=email_from_email,
 			email_timeout_s=email_timeout_s,
+			detection_mode=detection_mode,
+			stream_max_bytes=stream_max_bytes,
+			poll_interval_s=poll_interval_s,
+			poll_max_interval_s=poll_max_interval_s,
+			poll_backoff_factor=poll_backoff_factor,
+			poll_jitter_ratio=poll_jitter_ratio,
+			poll_hot_interval_s=poll_hot_interval_s,
+			poll_hot_duration_s=poll_hot_duration_s,
+			conditional_requests=conditional_requests,
+			email_keepalive_s=email_keepalive_s,
+			notification_queue_size=notification_queue_size,
+			notification_workers=notification_workers,
+			notification_overflow=notification_overflow,
+			email_digest_window_s=email_digest_window_s,
+			metrics_port=metrics_port,
+			metrics_host=metrics_host,
+			metrics_file=metrics_file,
+			metrics_file_interval_s=metrics_file_interval_s,
+			capture_dir=capture_dir,
+			capture_max_bytes=capture_max_bytes,
+			reload_watch_interval_s=reload_watch_interval_s,
+			workers=workers,
+			pool_num_pools=pool_num_pools,
+			pool_maxsize=pool_maxsize,
+			pool_block=pool_block,
+			pool_idle_timeout_s=pool_idle_timeout_s,
+			pool_hosts=pool_hosts,
+			tls_verify=tls_verify,
+			tls_ca_certs=tls_ca_certs,
+			tls_minimum_version=tls_minimum_version,
+			dns_cache_enabled=dns_cache_enabled,
+			dns_ttl_s=dns_ttl_s,
+			dns_min_ttl_s=dns_min_ttl_s,
+			dns_max_ttl_s=dns_max_ttl_s,
+			dns_stale_ttl_s=dns_stale_ttl_s,
+			hedge_enabled=hedge_enabled,
+			hedge_percentile=hedge_percentile,
+			hedge_min_delay_s=hedge_min_delay_s,
+			retry_budget_ratio=retry_budget_ratio,
+			retry_budget_min_per_s=retry_budget_min_per_s,
+			event_log_file=event_log_file,
+			event_log_flush_interval_s=event_log_flush_interval_s,
+			detection_rules=detection_rules,
+			deep_check_steps=deep_check_steps,
+			deep_check_rules=deep_check_rules,
+			deep_check_cache_ttl_s=deep_check_cache_ttl_s,
+			webhook_enabled=webhook_enabled,
+			webhook_url=webhook_url,
+			webhook_headers=webhook_headers,
+			webhook_timeout_s=webhook_timeout_s,
+			webhook_batch_window_s=webhook_batch_window_s,
+			webhook_max_retries=webhook_max_retries,
+			webhook_backoff_s=webhook_backoff_s,
+			notification_rate_limits=notification_rate_limits,
 			verbose=verbose,
 			debug=debug,
 		)
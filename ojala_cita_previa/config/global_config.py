@@ -1,5 +1,6 @@
 #!/usr/bin/env python
-from typing import Optional, Sequence, Any
+import threading
+from typing import Optional, Sequence, Any, Tuple
 
 from ojala_cita_previa.config.abstract_configuration import \
  AbstractConfiguration
@@ -7,6 +8,11 @@ from ojala_cita_previa.config.arguments import AppArguments
 from ojala_cita_previa.config.file_config import FileConfig
 import ojala_cita_previa.config.default_values as default_values
 
+# The last configuration built, along with the file configuration and the
+# command-line arguments it has been built from
+_last: Optional[Tuple[FileConfig, AppArguments, 'GlobalConfig']] = None
+_last_lock: threading.Lock = threading.Lock()
+
 
 class GlobalConfig(AbstractConfiguration):
 	"""
@@ -23,12 +29,36 @@ class GlobalConfig(AbstractConfiguration):
 		file_path: Optional[str] = None,
 		argv: Optional[Sequence[str]] = None,
 	) -> 'GlobalConfig':
+		"""
+		Build the configuration. The file and the command-line arguments are
+		only parsed if they changed since the previous call, and the previous
+		configuration is returned if both are unchanged.
+		"""
+		global _last
 		if file_config is None:
 			file_config = FileConfig.parse(file_path=file_path)
 
 		if command_line_args is None:
 			command_line_args = AppArguments.parse(argv=argv)
 
+		with _last_lock:
+			last = _last
+		if last is not None and last[0] == file_config and last[
+			1] == command_line_args:
+			return last[2]
+
+		config: GlobalConfig = cls._merge(file_config, command_line_args)
+		with _last_lock:
+			_last = (file_config, command_line_args, config)
+		return config
+
+	@classmethod
+	def _merge(
+		cls,
+		file_config: FileConfig,
+		command_line_args: AppArguments,
+	) -> 'GlobalConfig':
+
 		def d(*args) -> Optional[Any]:
 			"""
 			Default chain. Returns the first non-None element in the given list of arguments. If there is no such thing, returns None.
@@ -52,6 +82,16 @@ class GlobalConfig(AbstractConfiguration):
 				file_config.read_timeout_s,
 				default_values.DEFAULT_READ_TIMEOUT_S,
 			),
+			targets=d(
+				command_line_args.targets,
+				file_config.targets,
+				default_values.DEFAULT_TARGETS,
+			),
+			max_concurrency=d(
+				command_line_args.max_concurrency,
+				file_config.max_concurrency,
+				default_values.DEFAULT_MAX_CONCURRENCY,
+			),
 			sound_enabled=d(
 				command_line_args.sound_enabled,
 				file_config.sound_enabled,
@@ -102,6 +142,276 @@ class GlobalConfig(AbstractConfiguration):
 				file_config.email_timeout_s,
 				default_values.DEFAULT_EMAIL_TIMEOUT_S,
 			),
+			detection_mode=d(
+				command_line_args.detection_mode,
+				file_config.detection_mode,
+				default_values.DEFAULT_DETECTION_MODE,
+			),
+			stream_max_bytes=d(
+				command_line_args.stream_max_bytes,
+				file_config.stream_max_bytes,
+				default_values.DEFAULT_STREAM_MAX_BYTES,
+			),
+			poll_interval_s=d(
+				command_line_args.poll_interval_s,
+				file_config.poll_interval_s,
+				default_values.DEFAULT_POLL_INTERVAL_S,
+			),
+			poll_max_interval_s=d(
+				command_line_args.poll_max_interval_s,
+				file_config.poll_max_interval_s,
+				default_values.DEFAULT_POLL_MAX_INTERVAL_S,
+			),
+			poll_backoff_factor=d(
+				command_line_args.poll_backoff_factor,
+				file_config.poll_backoff_factor,
+				default_values.DEFAULT_POLL_BACKOFF_FACTOR,
+			),
+			poll_jitter_ratio=d(
+				command_line_args.poll_jitter_ratio,
+				file_config.poll_jitter_ratio,
+				default_values.DEFAULT_POLL_JITTER_RATIO,
+			),
+			poll_hot_interval_s=d(
+				command_line_args.poll_hot_interval_s,
+				file_config.poll_hot_interval_s,
+				default_values.DEFAULT_POLL_HOT_INTERVAL_S,
+			),
+			poll_hot_duration_s=d(
+				command_line_args.poll_hot_duration_s,
+				file_config.poll_hot_duration_s,
+				default_values.DEFAULT_POLL_HOT_DURATION_S,
+			),
+			conditional_requests=d(
+				command_line_args.conditional_requests,
+				file_config.conditional_requests,
+				default_values.DEFAULT_CONDITIONAL_REQUESTS,
+			),
+			email_keepalive_s=d(
+				command_line_args.email_keepalive_s,
+				file_config.email_keepalive_s,
+				default_values.DEFAULT_EMAIL_KEEPALIVE_S,
+			),
+			notification_queue_size=d(
+				command_line_args.notification_queue_size,
+				file_config.notification_queue_size,
+				default_values.DEFAULT_NOTIFICATION_QUEUE_SIZE,
+			),
+			notification_workers=d(
+				command_line_args.notification_workers,
+				file_config.notification_workers,
+				default_values.DEFAULT_NOTIFICATION_WORKERS,
+			),
+			notification_overflow=d(
+				command_line_args.notification_overflow,
+				file_config.notification_overflow,
+				default_values.DEFAULT_NOTIFICATION_OVERFLOW,
+			),
+			email_digest_window_s=d(
+				command_line_args.email_digest_window_s,
+				file_config.email_digest_window_s,
+				default_values.DEFAULT_EMAIL_DIGEST_WINDOW_S,
+			),
+			metrics_port=d(
+				command_line_args.metrics_port,
+				file_config.metrics_port,
+				default_values.DEFAULT_METRICS_PORT,
+			),
+			metrics_host=d(
+				command_line_args.metrics_host,
+				file_config.metrics_host,
+				default_values.DEFAULT_METRICS_HOST,
+			),
+			metrics_file=d(
+				command_line_args.metrics_file,
+				file_config.metrics_file,
+				default_values.DEFAULT_METRICS_FILE,
+			),
+			metrics_file_interval_s=d(
+				command_line_args.metrics_file_interval_s,
+				file_config.metrics_file_interval_s,
+				default_values.DEFAULT_METRICS_FILE_INTERVAL_S,
+			),
+			capture_dir=d(
+				command_line_args.capture_dir,
+				file_config.capture_dir,
+				default_values.DEFAULT_CAPTURE_DIR,
+			),
+			capture_max_bytes=d(
+				command_line_args.capture_max_bytes,
+				file_config.capture_max_bytes,
+				default_values.DEFAULT_CAPTURE_MAX_BYTES,
+			),
+			reload_watch_interval_s=d(
+				command_line_args.reload_watch_interval_s,
+				file_config.reload_watch_interval_s,
+				default_values.DEFAULT_RELOAD_WATCH_INTERVAL_S,
+			),
+			workers=d(
+				command_line_args.workers,
+				file_config.workers,
+				default_values.DEFAULT_WORKERS,
+			),
+			pool_num_pools=d(
+				command_line_args.pool_num_pools,
+				file_config.pool_num_pools,
+				default_values.DEFAULT_POOL_NUM_POOLS,
+			),
+			pool_maxsize=d(
+				command_line_args.pool_maxsize,
+				file_config.pool_maxsize,
+				default_values.DEFAULT_POOL_MAXSIZE,
+			),
+			pool_block=d(
+				command_line_args.pool_block,
+				file_config.pool_block,
+				default_values.DEFAULT_POOL_BLOCK,
+			),
+			pool_idle_timeout_s=d(
+				command_line_args.pool_idle_timeout_s,
+				file_config.pool_idle_timeout_s,
+				default_values.DEFAULT_POOL_IDLE_TIMEOUT_S,
+			),
+			pool_hosts=d(
+				command_line_args.pool_hosts,
+				file_config.pool_hosts,
+				default_values.DEFAULT_POOL_HOSTS,
+			),
+			tls_verify=d(
+				command_line_args.tls_verify,
+				file_config.tls_verify,
+				default_values.DEFAULT_TLS_VERIFY,
+			),
+			tls_ca_certs=d(
+				command_line_args.tls_ca_certs,
+				file_config.tls_ca_certs,
+				default_values.DEFAULT_TLS_CA_CERTS,
+			),
+			tls_minimum_version=d(
+				command_line_args.tls_minimum_version,
+				file_config.tls_minimum_version,
+				default_values.DEFAULT_TLS_MINIMUM_VERSION,
+			),
+			dns_cache_enabled=d(
+				command_line_args.dns_cache_enabled,
+				file_config.dns_cache_enabled,
+				default_values.DEFAULT_DNS_CACHE_ENABLED,
+			),
+			dns_ttl_s=d(
+				command_line_args.dns_ttl_s,
+				file_config.dns_ttl_s,
+				default_values.DEFAULT_DNS_TTL_S,
+			),
+			dns_min_ttl_s=d(
+				command_line_args.dns_min_ttl_s,
+				file_config.dns_min_ttl_s,
+				default_values.DEFAULT_DNS_MIN_TTL_S,
+			),
+			dns_max_ttl_s=d(
+				command_line_args.dns_max_ttl_s,
+				file_config.dns_max_ttl_s,
+				default_values.DEFAULT_DNS_MAX_TTL_S,
+			),
+			dns_stale_ttl_s=d(
+				command_line_args.dns_stale_ttl_s,
+				file_config.dns_stale_ttl_s,
+				default_values.DEFAULT_DNS_STALE_TTL_S,
+			),
+			hedge_enabled=d(
+				command_line_args.hedge_enabled,
+				file_config.hedge_enabled,
+				default_values.DEFAULT_HEDGE_ENABLED,
+			),
+			hedge_percentile=d(
+				command_line_args.hedge_percentile,
+				file_config.hedge_percentile,
+				default_values.DEFAULT_HEDGE_PERCENTILE,
+			),
+			hedge_min_delay_s=d(
+				command_line_args.hedge_min_delay_s,
+				file_config.hedge_min_delay_s,
+				default_values.DEFAULT_HEDGE_MIN_DELAY_S,
+			),
+			retry_budget_ratio=d(
+				command_line_args.retry_budget_ratio,
+				file_config.retry_budget_ratio,
+				default_values.DEFAULT_RETRY_BUDGET_RATIO,
+			),
+			retry_budget_min_per_s=d(
+				command_line_args.retry_budget_min_per_s,
+				file_config.retry_budget_min_per_s,
+				default_values.DEFAULT_RETRY_BUDGET_MIN_PER_S,
+			),
+			event_log_file=d(
+				command_line_args.event_log_file,
+				file_config.event_log_file,
+				default_values.DEFAULT_EVENT_LOG_FILE,
+			),
+			event_log_flush_interval_s=d(
+				command_line_args.event_log_flush_interval_s,
+				file_config.event_log_flush_interval_s,
+				default_values.DEFAULT_EVENT_LOG_FLUSH_INTERVAL_S,
+			),
+			detection_rules=d(
+				command_line_args.detection_rules,
+				file_config.detection_rules,
+				default_values.DEFAULT_DETECTION_RULES,
+			),
+			deep_check_steps=d(
+				command_line_args.deep_check_steps,
+				file_config.deep_check_steps,
+				default_values.DEFAULT_DEEP_CHECK_STEPS,
+			),
+			deep_check_rules=d(
+				command_line_args.deep_check_rules,
+				file_config.deep_check_rules,
+				default_values.DEFAULT_DEEP_CHECK_RULES,
+			),
+			deep_check_cache_ttl_s=d(
+				command_line_args.deep_check_cache_ttl_s,
+				file_config.deep_check_cache_ttl_s,
+				default_values.DEFAULT_DEEP_CHECK_CACHE_TTL_S,
+			),
+			webhook_enabled=d(
+				command_line_args.webhook_enabled,
+				file_config.webhook_enabled,
+				default_values.DEFAULT_WEBHOOK_ENABLED,
+			),
+			webhook_url=d(
+				command_line_args.webhook_url,
+				file_config.webhook_url,
+				default_values.DEFAULT_WEBHOOK_URL,
+			),
+			webhook_headers=d(
+				command_line_args.webhook_headers,
+				file_config.webhook_headers,
+				default_values.DEFAULT_WEBHOOK_HEADERS,
+			),
+			webhook_timeout_s=d(
+				command_line_args.webhook_timeout_s,
+				file_config.webhook_timeout_s,
+				default_values.DEFAULT_WEBHOOK_TIMEOUT_S,
+			),
+			webhook_batch_window_s=d(
+				command_line_args.webhook_batch_window_s,
+				file_config.webhook_batch_window_s,
+				default_values.DEFAULT_WEBHOOK_BATCH_WINDOW_S,
+			),
+			webhook_max_retries=d(
+				command_line_args.webhook_max_retries,
+				file_config.webhook_max_retries,
+				default_values.DEFAULT_WEBHOOK_MAX_RETRIES,
+			),
+			webhook_backoff_s=d(
+				command_line_args.webhook_backoff_s,
+				file_config.webhook_backoff_s,
+				default_values.DEFAULT_WEBHOOK_BACKOFF_S,
+			),
+			notification_rate_limits=d(
+				command_line_args.notification_rate_limits,
+				file_config.notification_rate_limits,
+				default_values.DEFAULT_NOTIFICATION_RATE_LIMITS,
+			),
 			verbose=d(
 				command_line_args.verbose,
 				file_config.verbose,
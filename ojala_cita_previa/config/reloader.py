@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+import sys
+import threading
+from typing import Optional, Sequence, Callable, Set, Union
+
+from ojala_cita_previa.config.global_config import GlobalConfig
+
+# The settings that can be changed without restarting the monitor, by group
+PROBE_FIELDS: Set[str] = {
+	'connect_timeout_s',
+	'read_timeout_s',
+	'detection_mode',
+	'stream_max_bytes',
+	'conditional_requests',
+	'detection_rules',
+	'deep_check_steps',
+	'deep_check_rules',
+	'deep_check_cache_ttl_s',
+}
+SCHEDULER_FIELDS: Set[str] = {
+	'poll_interval_s',
+	'poll_max_interval_s',
+	'poll_backoff_factor',
+	'poll_jitter_ratio',
+	'poll_hot_interval_s',
+	'poll_hot_duration_s',
+}
+NOTIFIER_FIELDS: Set[str] = {
+	'sound_enabled',
+	'message_enabled',
+	'email_enabled',
+	'email_recipients',
+	'email_host',
+	'email_port',
+	'email_username',
+	'email_password',
+	'email_from_email',
+	'email_timeout_s',
+	'email_keepalive_s',
+	'email_digest_window_s',
+	'webhook_enabled',
+	'webhook_url',
+	'webhook_headers',
+	'webhook_timeout_s',
+	'webhook_batch_window_s',
+	'webhook_max_retries',
+	'webhook_backoff_s',
+	'notification_rate_limits',
+}
+RELOADABLE_FIELDS: Set[
+	str] = PROBE_FIELDS | SCHEDULER_FIELDS | NOTIFIER_FIELDS | {
+		'reload_watch_interval_s',
+		'verbose',
+		'debug',
+	}
+
+
+def changed_fields(old: GlobalConfig, new: GlobalConfig) -> Set[str]:
+	"""
+	Return the names of the settings that differ between two configurations.
+	"""
+	return {
+		name for name, value in vars(new).items()
+		if getattr(old, name, None) != value
+	}
+
+
+class ConfigReloader:
+	"""
+	Reload the configuration when it is requested (for instance on SIGHUP), or
+	when the configuration file changes, and pass the new configuration to a
+	callback.
+
+	The reloads happen in a background thread. Thanks to the cache of
+	`GlobalConfig.parse`, checking an unchanged file only costs a `stat` call.
+	If the new configuration cannot be parsed, or if the callback raises an
+	exception, an error is printed and the current configuration is kept.
+	"""
+
+	def __init__(
+		self,
+		config: GlobalConfig,
+		on_reload: Callable[[GlobalConfig, GlobalConfig, Set[str]], None],
+		file_path: Optional[str] = None,
+		argv: Optional[Sequence[str]] = None,
+		watch_interval_s: Union[int, float, None] = None,
+	):
+		"""
+		:param config: The current configuration.
+		:param on_reload: The function called with the previous configuration,
+		the new one and the names of the settings that changed, from the
+		thread of the reloader.
+		:param file_path: The configuration file. Defaults to "ojala.yml".
+		:param argv: The command-line arguments. Defaults to `sys.argv`.
+		:param watch_interval_s: Check if the configuration file changed every
+		this number of seconds. If `None`, the configuration is only reloaded
+		when `request_reload` is called.
+		"""
+		self.config = config
+		self.on_reload = on_reload
+		self.file_path = file_path
+		self.argv = argv
+		self.watch_interval_s = watch_interval_s
+		self._requested: threading.Event = threading.Event()
+		self._stopped: threading.Event = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+		# The last error raised while parsing the configuration
+		self._error: Optional[str] = None
+		# The last configuration the callback failed to apply
+		self._rejected: Optional[GlobalConfig] = None
+
+	def start(self) -> None:
+		self._stopped.clear()
+		self._thread = threading.Thread(
+			target=self._run,
+			name='ojala-config-reloader',
+			daemon=True,
+		)
+		self._thread.start()
+
+	def stop(self) -> None:
+		self._stopped.set()
+		self._requested.set()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+	def request_reload(self) -> None:
+		"""
+		Ask the reloader to reload the configuration. This method can be called
+		from a signal handler.
+		"""
+		self._requested.set()
+
+	def _run(self) -> None:
+		while not self._stopped.is_set():
+			self._requested.wait(self.watch_interval_s)
+			if self._stopped.is_set():
+				return
+			self._requested.clear()
+			try:
+				self.reload()
+			except Exception as e:
+				print(
+					f'The new configuration could not be applied, the current one is kept: {e}',
+					file=sys.stderr)
+
+	def reload(self) -> bool:
+		"""
+		Parse the configuration, and call the callback if it changed.
+		:return: Returns `True` if the configuration changed.
+		:raise Exception: Raised if the callback failed to apply the new
+		configuration. In that case, the current configuration is kept.
+		"""
+		try:
+			config: GlobalConfig = GlobalConfig.parse(
+				file_path=self.file_path, argv=self.argv)
+		except Exception as e:
+			# Only report a broken file once, not at each check
+			if str(e) != self._error:
+				self._error = str(e)
+				print(
+					f'The configuration could not be reloaded, the current one is kept: {e}',
+					file=sys.stderr)
+			return False
+		self._error = None
+
+		if config == self.config or config == self._rejected:
+			return False
+
+		try:
+			self.on_reload(self.config, config,
+							changed_fields(self.config, config))
+		except Exception:
+			# Do not try to apply it again until it changes
+			self._rejected = config
+			raise
+		self.config = config
+		self.watch_interval_s = config.reload_watch_interval_s
+		return True
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'ConfigReloader(file_path: {self.file_path}, watch_interval_s: {self.watch_interval_s})'
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Optional, Dict, Any, List, Iterator, BinaryIO, Union, Set
+
+SEGMENT_PREFIX: str = 'capture-'
+SEGMENT_SUFFIX: str = '.bin'
+_SEGMENT_PATTERN = re.compile(
+	re.escape(SEGMENT_PREFIX) + r'(\d+)' + re.escape(SEGMENT_SUFFIX) + '$')
+
+# Each record starts with the length of its metadata and of its compressed
+# body, which is empty if the body is already stored in the segment
+_RECORD_HEADER = struct.Struct('>II')
+
+# The ring is split in this number of segments, so dropping the oldest one
+# frees a small part of the archive
+DEFAULT_SEGMENTS: int = 8
+MIN_SEGMENT_BYTES: int = 64 * 1024
+
+
+def hash_content(body: bytes) -> str:
+	return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class CapturedResponse:
+	"""
+	A response read back from a `CaptureArchive`.
+	"""
+
+	__slots__ = (
+		'url',
+		'time',
+		'status',
+		'headers',
+		'elapsed_s',
+		'body',
+		'complete',
+		'extra',
+	)
+
+	def __init__(
+		self,
+		url: str,
+		time: float,
+		status: int,
+		headers: Dict[str, str],
+		elapsed_s: Optional[float],
+		body: bytes,
+		complete: bool,
+		extra: Dict[str, Any],
+	):
+		"""
+		:param url: The requested URL.
+		:param time: When the response was captured, as a UNIX timestamp.
+		:param status: The HTTP status code.
+		:param headers: The HTTP headers.
+		:param elapsed_s: The duration of the request, in seconds.
+		:param body: The body, or the part of it that has been read.
+		:param complete: `False` if only the beginning of the body has been read.
+		:param extra: Additional information given by the caller, such as the
+		detection result.
+		"""
+		self.url = url
+		self.time = time
+		self.status = status
+		self.headers = headers
+		self.elapsed_s = elapsed_s
+		self.body = body
+		self.complete = complete
+		self.extra = extra
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'CapturedResponse(url: {self.url}, time: {self.time}, status: {self.status}, elapsed_s: {self.elapsed_s}, body: {len(self.body)} bytes, complete: {self.complete}, extra: {self.extra})'
+
+
+class CaptureArchive:
+	"""
+	Append-only archive of HTTP responses, bounded in size.
+
+	The archive is a directory of segment files used as a ring: once the
+	current segment is full, a new one is started, and the oldest segments are
+	deleted until the archive fits in `max_bytes`. The bodies are compressed,
+	and a body is stored only once per segment: the responses with an identical
+	body only reference it. Each segment can therefore be read on its own.
+	"""
+
+	def __init__(
+		self,
+		directory: str,
+		max_bytes: int = 64 * 1024 * 1024,
+		segment_bytes: Optional[int] = None,
+		compression_level: int = 6,
+	):
+		"""
+		:param directory: The directory of the archive. It is created if needed.
+		:param max_bytes: The maximum size of the archive, in bytes.
+		:param segment_bytes: The size of a segment, in bytes. Defaults to an
+		eighth of `max_bytes`.
+		:param compression_level: The zlib compression level of the bodies.
+		"""
+		if segment_bytes is None:
+			segment_bytes = max(MIN_SEGMENT_BYTES,
+								max_bytes // DEFAULT_SEGMENTS)
+		if max_bytes < segment_bytes:
+			raise ValueError(
+				f'The archive size ({max_bytes} bytes) must be at least the size of a segment ({segment_bytes} bytes).'
+			)
+
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.segment_bytes = segment_bytes
+		self.compression_level = compression_level
+		self._lock: threading.Lock = threading.Lock()
+		self._file: Optional[BinaryIO] = None
+		self._segment_index: int = 0
+		self._segment_size: int = 0
+		# Hashes of the bodies stored in the current segment
+		self._segment_bodies: Set[str] = set()
+
+		os.makedirs(directory, exist_ok=True)
+		indexes: List[int] = segment_indexes(directory)
+		# Never append to an existing segment, its bodies are not known
+		self._segment_index = indexes[-1] if len(indexes) > 0 else 0
+
+	def _segment_path(self, index: int) -> str:
+		return segment_path(self.directory, index)
+
+	def _open_segment(self) -> None:
+		if self._file is not None:
+			self._file.close()
+		self._segment_index += 1
+		self._file = open(self._segment_path(self._segment_index), mode='ab')
+		self._segment_size = 0
+		self._segment_bodies = set()
+		self._evict()
+
+	def _evict(self) -> None:
+		"""
+		Delete the oldest segments until the archive fits in `max_bytes`,
+		keeping the current one.
+		"""
+		sizes: Dict[int, int] = {}
+		for index in segment_indexes(self.directory):
+			try:
+				sizes[index] = os.path.getsize(self._segment_path(index))
+			except OSError:
+				pass
+		total: int = sum(sizes.values())
+		for index in sorted(sizes):
+			if total <= self.max_bytes - self.segment_bytes or index == self._segment_index:
+				break
+			try:
+				os.remove(self._segment_path(index))
+			except OSError:
+				pass
+			total -= sizes[index]
+
+	def record(
+		self,
+		url: str,
+		status: int,
+		headers: Dict[str, str],
+		body: bytes = b'',
+		elapsed_s: Optional[float] = None,
+		complete: bool = True,
+		**extra: Any,
+	) -> None:
+		"""
+		Append a response to the archive.
+		:param url: The requested URL.
+		:param status: The HTTP status code.
+		:param headers: The HTTP headers.
+		:param body: The body, or the part of it that has been read.
+		:param elapsed_s: The duration of the request, in seconds.
+		:param complete: `False` if only the beginning of the body has been read.
+		:param extra: Additional JSON-compatible information, such as the
+		detection result.
+		"""
+		body_hash: str = hash_content(body)
+		metadata: Dict[str, Any] = {
+			'url': url,
+			'time': time.time(),
+			'status': status,
+			'headers': dict(headers),
+			'elapsed_s': elapsed_s,
+			'body_hash': body_hash,
+			'complete': complete,
+		}
+		if len(extra) > 0:
+			metadata['extra'] = extra
+		encoded_metadata: bytes = json.dumps(
+			metadata, separators=(',', ':')).encode('utf-8')
+
+		with self._lock:
+			if self._file is None or self._segment_size >= self.segment_bytes:
+				self._open_segment()
+
+			compressed: bytes = b''
+			if body_hash not in self._segment_bodies:
+				compressed = zlib.compress(body, self.compression_level)
+				self._segment_bodies.add(body_hash)
+
+			data: bytes = _RECORD_HEADER.pack(
+				len(encoded_metadata),
+				len(compressed)) + encoded_metadata + compressed
+			self._file.write(data)
+			self._file.flush()
+			self._segment_size += len(data)
+
+	def close(self) -> None:
+		with self._lock:
+			if self._file is not None:
+				self._file.close()
+				self._file = None
+
+	def __iter__(self) -> Iterator[CapturedResponse]:
+		return read_archive(self.directory)
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'CaptureArchive(directory: {self.directory}, max_bytes: {self.max_bytes}, segment_bytes: {self.segment_bytes})'
+
+
+def segment_path(directory: str, index: int) -> str:
+	return os.path.join(directory,
+						f'{SEGMENT_PREFIX}{index:06d}{SEGMENT_SUFFIX}')
+
+
+def segment_indexes(directory: str) -> List[int]:
+	"""
+	Return the indexes of the segments of the archive in `directory`, from the
+	oldest to the newest.
+	"""
+	indexes: List[int] = []
+	for name in os.listdir(directory):
+		match = _SEGMENT_PATTERN.match(name)
+		if match is not None:
+			indexes.append(int(match.group(1)))
+	return sorted(indexes)
+
+
+def read_segment(file_path: str) -> Iterator[CapturedResponse]:
+	"""
+	Read the responses of a segment. A truncated record at the end of the
+	segment, left by an interrupted write, is ignored.
+	"""
+	bodies: Dict[str, bytes] = {}
+	with open(file_path, mode='rb') as f:
+		while True:
+			header: bytes = f.read(_RECORD_HEADER.size)
+			if len(header) < _RECORD_HEADER.size:
+				return
+			metadata_length, body_length = _RECORD_HEADER.unpack(header)
+			encoded_metadata: bytes = f.read(metadata_length)
+			compressed: bytes = f.read(body_length)
+			if len(encoded_metadata) < metadata_length or len(
+				compressed) < body_length:
+				return
+
+			metadata: Dict[str, Any] = json.loads(encoded_metadata)
+			body_hash: str = metadata['body_hash']
+			if body_length > 0:
+				bodies[body_hash] = zlib.decompress(compressed)
+			yield CapturedResponse(
+				url=metadata['url'],
+				time=metadata['time'],
+				status=metadata['status'],
+				headers=metadata['headers'],
+				elapsed_s=metadata.get('elapsed_s'),
+				body=bodies.get(body_hash, b''),
+				complete=metadata.get('complete', True),
+				extra=metadata.get('extra', {}),
+			)
+
+
+def read_archive(
+		directory: Union[str, os.PathLike]) -> Iterator[CapturedResponse]:
+	"""
+	Read all the responses of the archive in `directory`, from the oldest to the
+	newest.
+	"""
+	directory = os.fspath(directory)
+	for index in segment_indexes(directory):
+		try:
+			yield from read_segment(segment_path(directory, index))
+		except FileNotFoundError:
+			# The segment has been evicted meanwhile
+			continue
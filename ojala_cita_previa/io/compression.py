@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+import http.client
+import time
+import zlib
+from typing import Optional, List, Iterator, Any
+
+import urllib3
+
+try:
+	import brotlicffi as brotli
+except ImportError:
+	try:
+		import brotli
+	except ImportError:
+		brotli = None
+
+# The content codings that can be decompressed, sent in "Accept-Encoding"
+ACCEPT_ENCODING: str = 'gzip, deflate' + (', br' if brotli is not None else '')
+
+STREAM_CHUNK_SIZE: int = 8 * 1024
+
+# The rest of a body is only drained so the connection can be reused if it is
+# shorter than this number of bytes, and received within this number of
+# seconds. Otherwise, the connection is closed.
+DISCARD_MAX_BYTES: int = 64 * 1024
+DISCARD_MAX_S: float = 0.5
+
+
+class _ZlibDecoder:
+	"""
+	Incremental zlib decoder, whose output can be bounded: the input that is
+	not decompressed yet is kept until the next call.
+	"""
+
+	def __init__(self, wbits: int):
+		self._wbits = wbits
+		self._decompressor = zlib.decompressobj(wbits)
+
+	@property
+	def pending(self) -> bool:
+		"""
+		`True` if some input has not been decompressed yet.
+		"""
+		return len(self._decompressor.unconsumed_tail) > 0
+
+	def decompress(self, data: bytes, max_length: int = 0) -> bytes:
+		"""
+		Decompress `data`, after the input kept by the previous call.
+		:param data: The compressed data.
+		:param max_length: The maximum size of the output. If 0, it is not
+		bounded.
+		:return: Returns the decompressed data.
+		"""
+		return self._decompressor.decompress(
+			self._decompressor.unconsumed_tail + data, max_length)
+
+	def flush(self) -> bytes:
+		return self._decompressor.flush()
+
+
+class _GzipDecoder(_ZlibDecoder):
+	"""
+	Incremental gzip decoder. A body can contain several gzip members, and the
+	garbage after the first member is ignored.
+	"""
+
+	def __init__(self):
+		super().__init__(16 + zlib.MAX_WBITS)
+		self._garbage: bool = False
+
+	@property
+	def pending(self) -> bool:
+		return not self._garbage and (super().pending or (
+			self._decompressor.eof and len(self._decompressor.unused_data) > 0))
+
+	def decompress(self, data: bytes, max_length: int = 0) -> bytes:
+		if self._garbage:
+			return b''
+		output: bytes = super().decompress(data, max_length)
+		while self._decompressor.eof and len(
+			self._decompressor.unused_data) > 0 and (
+				max_length == 0 or len(output) < max_length):
+			data = self._decompressor.unused_data
+			self._decompressor = zlib.decompressobj(self._wbits)
+			try:
+				output += self._decompressor.decompress(
+					data, max_length - len(output) if max_length > 0 else 0)
+			except zlib.error:
+				self._garbage = True
+				break
+		return output
+
+	def flush(self) -> bytes:
+		if self._garbage:
+			return b''
+		return super().flush()
+
+
+class _DeflateDecoder(_ZlibDecoder):
+	"""
+	Incremental deflate decoder. Some servers send a raw deflate stream
+	instead of a zlib stream, like the browsers, both are accepted.
+	"""
+
+	def __init__(self):
+		super().__init__(zlib.MAX_WBITS)
+		# The beginning of the body, until it is known to be a zlib stream
+		self._first: Optional[bytes] = b''
+
+	def decompress(self, data: bytes, max_length: int = 0) -> bytes:
+		if self._first is None:
+			return super().decompress(data, max_length)
+		self._first += data
+		try:
+			output: bytes = super().decompress(data, max_length)
+		except zlib.error:
+			self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+			output = super().decompress(self._first, max_length)
+		if len(output) > 0:
+			self._first = None
+		return output
+
+
+class _BrotliDecoder:
+	"""
+	Incremental brotli decoder. Its output is not bounded.
+	"""
+
+	pending: bool = False
+
+	def __init__(self):
+		self._decompressor = brotli.Decompressor()
+		# "brotli" and "brotlicffi" do not name the method the same way
+		self._process = getattr(self._decompressor, 'process', None) or getattr(
+			self._decompressor, 'decompress')
+
+	def decompress(self, data: bytes, max_length: int = 0) -> bytes:
+		return self._process(data)
+
+	def flush(self) -> bytes:
+		return b''
+
+
+def _decoder(coding: str) -> Optional[Any]:
+	if coding in ('gzip', 'x-gzip'):
+		return _GzipDecoder()
+	elif coding == 'deflate':
+		return _DeflateDecoder()
+	elif coding == 'br' and brotli is not None:
+		return _BrotliDecoder()
+	return None
+
+
+class BodyReader:
+	"""
+	Read the body of a response requested with `preload_content=False`, as it
+	is received, and decompress it incrementally according to its
+	"Content-Encoding".
+
+	The number of bytes received and the number of bytes once decompressed are
+	counted, to measure what the compression saves. The unknown content codings
+	are left as is, like urllib3 does.
+	"""
+
+	def __init__(self, response: urllib3.response.HTTPResponse):
+		self.response = response
+		# The number of bytes of the body received, and once decompressed
+		self.compressed_bytes: int = 0
+		self.decompressed_bytes: int = 0
+		# The codings are applied in order, so they are decoded in reverse
+		codings: List[str] = [
+			coding.strip().lower() for coding in response.headers.get(
+				'Content-Encoding', '').split(',')
+		]
+		self._decoders: List[Any] = [
+			decoder for decoder in map(_decoder, reversed(codings))
+			if decoder is not None
+		]
+
+	@property
+	def encoding(self) -> Optional[str]:
+		"""
+		The "Content-Encoding" of the response, if any.
+		"""
+		return self.response.headers.get('Content-Encoding')
+
+	def _decode(
+		self,
+		data: bytes,
+		max_length: int,
+		final: bool = False,
+	) -> Iterator[bytes]:
+		"""
+		Decompress `data`, in pieces of at most `max_length` bytes when the last
+		content coding allows it, so a small compressed chunk never becomes a
+		huge decompressed chunk.
+		"""
+		try:
+			if len(self._decoders) == 0:
+				yield data
+				return
+			for decoder in self._decoders[:-1]:
+				data = decoder.decompress(data)
+				if final:
+					data += decoder.flush()
+			last = self._decoders[-1]
+			yield last.decompress(data, max_length)
+			while last.pending:
+				yield last.decompress(b'', max_length)
+			if final:
+				yield last.flush()
+		except (zlib.error, getattr(brotli, 'error', zlib.error)) as e:
+			raise urllib3.exceptions.DecodeError(
+				f'The body could not be decompressed ({self.encoding}): {e}'
+			) from e
+
+	def chunks(self, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+		"""
+		Read the rest of the body, and yield it decompressed, chunk by chunk.
+		:param chunk_size: The number of bytes to receive at once. The
+		decompressed chunks are about the same size.
+		:raise urllib3.exceptions.HTTPError: Raised if the body could not be
+		received or decompressed.
+		"""
+		for data in self.response.stream(chunk_size, decode_content=False):
+			self.compressed_bytes += len(data)
+			for chunk in self._decode(data, chunk_size):
+				if len(chunk) > 0:
+					self.decompressed_bytes += len(chunk)
+					yield chunk
+		for chunk in self._decode(b'', chunk_size, final=True):
+			if len(chunk) > 0:
+				self.decompressed_bytes += len(chunk)
+				yield chunk
+
+	def read(self) -> bytes:
+		"""
+		Read the rest of the body, decompressed.
+		:raise urllib3.exceptions.HTTPError: Raised if the body could not be
+		received or decompressed.
+		"""
+		return b''.join(self.chunks())
+
+	def _drain(self, max_bytes: int, max_s: float) -> bool:
+		"""
+		Receive the rest of the body without decompressing it, and return `True`
+		if it ended within `max_bytes` bytes and `max_s` seconds.
+		"""
+		deadline: float = time.monotonic() + max_s
+		drained: int = 0
+		# A reading socket waits at most until the deadline
+		sock = getattr(self.response.connection, 'sock', None)
+		if sock is not None:
+			sock.settimeout(max_s)
+		# Without "read1", a single read would wait until it is full
+		read1 = getattr(self.response._fp, 'read1', None)
+		if self.response.chunked or read1 is None:
+			data_iterator: Iterator[bytes] = self.response.stream(
+				STREAM_CHUNK_SIZE, decode_content=False)
+		else:
+			data_iterator = iter(lambda: read1(STREAM_CHUNK_SIZE), b'')
+		for data in data_iterator:
+			self.compressed_bytes += len(data)
+			drained += len(data)
+			if drained > max_bytes or time.monotonic() > deadline:
+				return False
+		return True
+
+	def discard(
+		self,
+		max_bytes: int = DISCARD_MAX_BYTES,
+		max_s: float = DISCARD_MAX_S,
+	) -> bool:
+		"""
+		Drop the rest of the body. It is drained without being decompressed so
+		the connection can be reused, like `HTTPResponse.drain_conn`, only if it
+		is short and received quickly. Otherwise, the response is closed, which
+		closes its connection. The received bytes are still counted.
+		:param max_bytes: The maximum number of bytes to drain.
+		:param max_s: The maximum time to spend draining, in seconds.
+		:return: Returns `True` if the body has been drained, and `False` if the
+		response has been closed.
+		"""
+		remaining: Optional[int] = getattr(self.response, 'length_remaining',
+											None)
+		if self.response.closed or self.response._fp is None:
+			return True
+		if remaining is None or remaining <= max_bytes:
+			try:
+				if self._drain(max_bytes, max_s):
+					return True
+			except (urllib3.exceptions.HTTPError, OSError,
+					http.client.HTTPException):
+				pass
+		self.response.close()
+		return False
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'BodyReader(encoding: {self.encoding}, compressed_bytes: {self.compressed_bytes}, decompressed_bytes: {self.decompressed_bytes})'
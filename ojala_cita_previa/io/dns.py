@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+import ipaddress
+import socket
+import sys
+import threading
+import time
+from typing import Optional, Dict, List, Tuple, Callable, Any, Set
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+# An entry returned by `socket.getaddrinfo`
+AddrInfo = Tuple[int, int, int, str, Any]
+# Resolve a host: called with the host, the port, the address family and the
+# socket type, returns the addresses and their TTL in seconds, if known
+Resolver = Callable[[str, int, int, int], Tuple[List[AddrInfo],
+												Optional[float]]]
+_Key = Tuple[str, int, int, int]
+
+
+def system_resolver(
+	host: str,
+	port: int,
+	family: int = 0,
+	type: int = 0,
+) -> Tuple[List[AddrInfo], Optional[float]]:
+	"""
+	Resolve `host` with the resolver of the system. The system does not give
+	the TTL of the records.
+	"""
+	return socket.getaddrinfo(host, port, family, type), None
+
+
+class StaticResolver:
+	"""
+	Resolver that answers from a fixed table, to test the DNS cache or to point
+	a host name to a local server. The answers can be changed at any time.
+	"""
+
+	def __init__(
+		self,
+		records: Optional[Dict[str, List[str]]] = None,
+		ttl_s: Optional[float] = None,
+	):
+		"""
+		:param records: The IP addresses of each host name.
+		:param ttl_s: The TTL of the answers, in seconds.
+		"""
+		self.records: Dict[str, List[str]] = dict(records or {})
+		self.ttl_s = ttl_s
+		# Number of resolutions, to check the cache
+		self.calls: int = 0
+		# If set, the resolutions fail with this error
+		self.error: Optional[OSError] = None
+
+	def __call__(
+		self,
+		host: str,
+		port: int,
+		family: int = 0,
+		type: int = 0,
+	) -> Tuple[List[AddrInfo], Optional[float]]:
+		self.calls += 1
+		if self.error is not None:
+			raise self.error
+		if host not in self.records:
+			raise socket.gaierror(socket.EAI_NONAME, f'Unknown host "{host}".')
+
+		addresses: List[AddrInfo] = []
+		for address in self.records[host]:
+			ip = ipaddress.ip_address(address)
+			address_family: int = socket.AF_INET6 if ip.version == 6 else socket.AF_INET
+			if family not in (0, socket.AF_UNSPEC, address_family):
+				continue
+			sockaddr = (address, port, 0, 0) if ip.version == 6 else (address,
+																		port)
+			addresses.append(
+				(address_family, type or
+					socket.SOCK_STREAM, socket.IPPROTO_TCP, '', sockaddr))
+		return addresses, self.ttl_s
+
+	def __repr__(self) -> str:
+		return f'StaticResolver(records: {self.records}, ttl_s: {self.ttl_s})'
+
+
+class _Entry:
+
+	__slots__ = ('addresses', 'resolved_at', 'ttl_s', 'refreshing')
+
+	def __init__(
+		self,
+		addresses: List[AddrInfo],
+		resolved_at: float,
+		ttl_s: float,
+	):
+		self.addresses = addresses
+		self.resolved_at = resolved_at
+		self.ttl_s = ttl_s
+		self.refreshing: bool = False
+
+
+class DNSCache:
+	"""
+	Cache of the resolved host names, so a new connection does not wait for
+	the resolver.
+
+	The TTL given by the resolver is bounded by `min_ttl_s` and `max_ttl_s`,
+	and `ttl_s` is used when the resolver does not give one (like the resolver
+	of the system). When an entry is used after `prefetch_ratio` of its TTL,
+	it is resolved again in the background, so it rarely expires. An expired
+	entry is still used for `stale_ttl_s` seconds while it is resolved again in
+	the background, a single resolution at a time, so a resolver outage does
+	not delay the new connections.
+	"""
+
+	def __init__(
+		self,
+		resolver: Optional[Resolver] = None,
+		ttl_s: float = 60,
+		min_ttl_s: float = 5,
+		max_ttl_s: float = 600,
+		stale_ttl_s: float = 600,
+		prefetch_ratio: float = 0.8,
+		clock: Callable[[], float] = time.monotonic,
+	):
+		"""
+		:param resolver: The resolver. Defaults to the resolver of the system.
+		:param ttl_s: The TTL of the entries when the resolver does not give
+		one, in seconds.
+		:param min_ttl_s: The minimum TTL of the entries, in seconds.
+		:param max_ttl_s: The maximum TTL of the entries, in seconds.
+		:param stale_ttl_s: How long an expired entry can still be used while it
+		is resolved again, in seconds.
+		:param prefetch_ratio: The fraction of the TTL after which a used entry
+		is resolved again in the background.
+		:param clock: The clock, in seconds.
+		"""
+		if not 0 < min_ttl_s <= max_ttl_s:
+			raise ValueError(
+				f'Expected 0 < min_ttl_s <= max_ttl_s, got {min_ttl_s} and {max_ttl_s}.'
+			)
+		if not 0 < prefetch_ratio <= 1:
+			raise ValueError(
+				f'The prefetch ratio must be in ]0, 1], got {prefetch_ratio}.')
+
+		self.resolver: Resolver = resolver if resolver is not None else system_resolver
+		self.ttl_s = ttl_s
+		self.min_ttl_s = min_ttl_s
+		self.max_ttl_s = max_ttl_s
+		self.stale_ttl_s = stale_ttl_s
+		self.prefetch_ratio = prefetch_ratio
+		self.clock = clock
+		self._lock: threading.Lock = threading.Lock()
+		self._entries: Dict[_Key, _Entry] = {}
+		# Counters, by kind of lookup: "hit", "miss", "prefetch", "stale" and
+		# "failure"
+		self.counts: Dict[str, int] = dict.fromkeys(
+			('hit', 'miss', 'prefetch', 'stale', 'failure'), 0)
+
+	def _count(self, kind: str) -> None:
+		with self._lock:
+			self.counts[kind] += 1
+
+	def _resolve(self, key: _Key) -> _Entry:
+		host, port, family, type = key
+		addresses, ttl_s = self.resolver(host, port, family, type)
+		if len(addresses) == 0:
+			raise socket.gaierror(socket.EAI_NONAME,
+									f'No address found for "{host}".')
+		ttl_s = min(
+			max(ttl_s if ttl_s is not None else self.ttl_s, self.min_ttl_s),
+			self.max_ttl_s)
+		entry = _Entry(list(addresses), self.clock(), ttl_s)
+		with self._lock:
+			self._entries[key] = entry
+		return entry
+
+	def _refresh(self, key: _Key, entry: _Entry) -> None:
+		"""
+		Resolve `key` again in a background thread, unless it is already being
+		resolved.
+		"""
+		with self._lock:
+			if entry.refreshing:
+				return
+			entry.refreshing = True
+
+		def refresh() -> None:
+			try:
+				self._resolve(key)
+			except OSError as e:
+				self._count('failure')
+				print(
+					f'Could not resolve "{key[0]}" again, the previous addresses are kept: {e}',
+					file=sys.stderr)
+			finally:
+				entry.refreshing = False
+
+		threading.Thread(
+			target=refresh, name='ojala-dns-refresh', daemon=True).start()
+
+	def getaddrinfo(
+		self,
+		host: str,
+		port: int,
+		family: int = 0,
+		type: int = 0,
+	) -> List[AddrInfo]:
+		"""
+		Resolve `host`, from the cache if possible. Same as `socket.getaddrinfo`.
+		:raise socket.gaierror: Raised if the host cannot be resolved, and no
+		usable address is in the cache. The addresses of the cache are used even
+		if they expired less than `stale_ttl_s` seconds ago.
+		"""
+		try:
+			# The IP addresses are not resolved
+			ipaddress.ip_address(host)
+			return socket.getaddrinfo(host, port, family, type)
+		except ValueError:
+			pass
+
+		key: _Key = (host.lower(), port, family, type)
+		with self._lock:
+			entry: Optional[_Entry] = self._entries.get(key)
+		if entry is None:
+			self._count('miss')
+			return self._resolve(key).addresses
+
+		age_s: float = self.clock() - entry.resolved_at
+		if age_s < entry.ttl_s:
+			self._count('hit')
+			if age_s >= entry.ttl_s * self.prefetch_ratio:
+				self._count('prefetch')
+				self._refresh(key, entry)
+			return entry.addresses
+
+		# An expired entry is used while it is resolved again, so a slow or
+		# failing resolver never delays the connections
+		if age_s < entry.ttl_s + self.stale_ttl_s:
+			self._count('stale')
+			self._refresh(key, entry)
+			return entry.addresses
+
+		self._count('miss')
+		return self._resolve(key).addresses
+
+	def create_connection(
+		self,
+		address: Tuple[str, int],
+		timeout: Any = socket._GLOBAL_DEFAULT_TIMEOUT,
+		source_address: Optional[Tuple[str, int]] = None,
+		socket_options: Optional[List[tuple]] = None,
+	) -> socket.socket:
+		"""
+		Connect to `address`, resolving its host with the cache. Same as
+		`urllib3.util.connection.create_connection`.
+		"""
+		host, port = address
+		if host.startswith('['):
+			host = host.strip('[]')
+
+		error: Optional[OSError] = None
+		for family, socket_type, proto, _, sockaddr in self.getaddrinfo(
+			host, port, allowed_gai_family(), socket.SOCK_STREAM):
+			sock: Optional[socket.socket] = None
+			try:
+				sock = socket.socket(family, socket_type, proto)
+				for option in socket_options or ():
+					sock.setsockopt(*option)
+				if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+					sock.settimeout(timeout)
+				if source_address:
+					sock.bind(source_address)
+				sock.connect(sockaddr)
+				return sock
+			except OSError as e:
+				error = e
+				if sock is not None:
+					sock.close()
+
+		if error is not None:
+			raise error
+		raise OSError('getaddrinfo returns an empty list')
+
+	def forget(self, host: Optional[str] = None) -> None:
+		"""
+		Forget the addresses of `host`, or of all the hosts if `None`.
+		"""
+		with self._lock:
+			if host is None:
+				self._entries.clear()
+			else:
+				for key in [k for k in self._entries if k[0] == host.lower()]:
+					del self._entries[key]
+
+	def hosts(self) -> Set[str]:
+		with self._lock:
+			return {key[0] for key in self._entries}
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'DNSCache(ttl_s: {self.ttl_s}, min_ttl_s: {self.min_ttl_s}, max_ttl_s: {self.max_ttl_s}, stale_ttl_s: {self.stale_ttl_s}, prefetch_ratio: {self.prefetch_ratio}, counts: {self.counts})'
+
+
+class _CachedDNSConnectionMixin:
+	"""
+	Connection that resolves its host with a `DNSCache`, if the pool gave it
+	one.
+	"""
+
+	dns_cache: Optional[DNSCache] = None
+
+	def _new_conn(self) -> socket.socket:
+		if self.dns_cache is None:
+			return super()._new_conn()
+
+		extra_kw: Dict[str, Any] = {}
+		if self.source_address:
+			extra_kw['source_address'] = self.source_address
+		if self.socket_options:
+			extra_kw['socket_options'] = self.socket_options
+
+		try:
+			return self.dns_cache.create_connection((self._dns_host, self.port),
+													self.timeout, **extra_kw)
+		except socket.timeout:
+			raise ConnectTimeoutError(
+				self,
+				f'Connection to {self.host} timed out. (connect timeout={self.timeout})'
+			)
+		except OSError as e:
+			raise NewConnectionError(
+				self, f'Failed to establish a new connection: {e}')
+
+
+class CachedDNSHTTPConnection(_CachedDNSConnectionMixin, HTTPConnection):
+	pass
+
+
+class CachedDNSHTTPSConnection(_CachedDNSConnectionMixin, HTTPSConnection):
+	pass
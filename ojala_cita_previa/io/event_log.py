@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Optional, Dict, List, Tuple, Iterator, Any
+
+from ojala_cita_previa.monitor.probe import ProbeResult
+
+_SCHEMA: str = '''
+CREATE TABLE IF NOT EXISTS probes (
+	id INTEGER PRIMARY KEY,
+	time REAL NOT NULL,
+	url TEXT NOT NULL,
+	online INTEGER NOT NULL,
+	http_status INTEGER,
+	elapsed_s REAL,
+	error TEXT
+);
+CREATE INDEX IF NOT EXISTS probes_url_time ON probes (url, time);
+CREATE TABLE IF NOT EXISTS transitions (
+	id INTEGER PRIMARY KEY,
+	time REAL NOT NULL,
+	url TEXT NOT NULL,
+	online INTEGER NOT NULL,
+	reason TEXT
+);
+CREATE INDEX IF NOT EXISTS transitions_url_id ON transitions (url, id);
+'''
+
+_INSERT_PROBE: str = 'INSERT INTO probes (time, url, online, http_status, elapsed_s, error) VALUES (?, ?, ?, ?, ?, ?)'
+_INSERT_TRANSITION: str = 'INSERT INTO transitions (time, url, online, reason) VALUES (?, ?, ?, ?)'
+
+# A probe, as stored in the log: time, URL, online, HTTP status, duration in
+# seconds and error
+ProbeRow = Tuple[float, str, bool, Optional[int], Optional[float],
+					Optional[str]]
+# A status change: time, URL, online and reason
+TransitionRow = Tuple[float, str, bool, Optional[str]]
+
+
+def connect(file_path: str, timeout_s: float = 5) -> sqlite3.Connection:
+	"""
+	Open the event log database in `file_path`, creating it if needed.
+	:param file_path: The path of the database.
+	:param timeout_s: How long to wait for another process that is writing in
+	the database, in seconds.
+	:return: Returns the connection.
+	"""
+	directory: str = os.path.dirname(os.path.abspath(file_path))
+	os.makedirs(directory, exist_ok=True)
+	connection: sqlite3.Connection = sqlite3.connect(
+		file_path, timeout=timeout_s, check_same_thread=False)
+	# With the write-ahead log, the readers never block the writer, and a
+	# transaction only needs a sync at checkpoints
+	connection.execute('PRAGMA journal_mode=WAL')
+	connection.execute('PRAGMA synchronous=NORMAL')
+	connection.executescript(_SCHEMA)
+	return connection
+
+
+class EventLog:
+	"""
+	Append-only log of the probes and of the status changes of the targets,
+	stored in a SQLite database.
+
+	The events are queued, and written by a background thread in batches of
+	up to `batch_size` events, at least every `flush_interval_s` seconds, so
+	the probes never wait for the disk. Several processes can write in the same
+	log.
+	"""
+
+	def __init__(
+		self,
+		file_path: str,
+		batch_size: int = 256,
+		flush_interval_s: float = 1,
+		max_pending: int = 65536,
+	):
+		"""
+		:param file_path: The path of the database. It is created if needed.
+		:param batch_size: The maximum number of events written in a single
+		transaction.
+		:param flush_interval_s: The maximum delay before an event is written,
+		in seconds.
+		:param max_pending: The maximum number of events waiting to be written.
+		The next ones are dropped.
+		"""
+		if batch_size < 1:
+			raise ValueError(
+				f'The batch size must be at least 1, got {batch_size}.')
+
+		self.file_path = file_path
+		self.batch_size = batch_size
+		self.flush_interval_s = flush_interval_s
+		self.max_pending = max_pending
+		self.dropped: int = 0
+		self._connection: sqlite3.Connection = connect(file_path)
+		self._connection_lock: threading.Lock = threading.Lock()
+		self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+		self._closed: bool = False
+		self._writer: threading.Thread = threading.Thread(
+			target=self._run, name='ojala-event-log', daemon=True)
+		self._writer.start()
+
+	def _put(self, event: Tuple[str, tuple]) -> None:
+		if self._closed:
+			return
+		try:
+			self._queue.put_nowait(event)
+		except queue.Full:
+			self.dropped += 1
+
+	def record_probe(self, url: str, result: ProbeResult) -> None:
+		"""
+		Queue the result of a probe.
+		"""
+		self._put(
+			('probe', (time.time(), url, result.online, result.http_status,
+						result.elapsed_s, result.error)))
+
+	def record_transition(
+		self,
+		url: str,
+		online: bool,
+		reason: Optional[str] = None,
+	) -> None:
+		"""
+		Queue a status change of a target.
+		"""
+		self._put(('transition', (time.time(), url, online, reason)))
+
+	def _write(self, batch: List[Tuple[str, tuple]]) -> None:
+		probes: List[tuple] = [row for kind, row in batch if kind == 'probe']
+		transitions: List[tuple] = [
+			row for kind, row in batch if kind == 'transition'
+		]
+		try:
+			with self._connection_lock, self._connection:
+				if len(probes) > 0:
+					self._connection.executemany(_INSERT_PROBE, probes)
+				if len(transitions) > 0:
+					self._connection.executemany(_INSERT_TRANSITION,
+													transitions)
+		except sqlite3.Error as e:
+			print(
+				f'Could not write {len(batch)} events in the event log "{self.file_path}":\n{e}',
+				file=sys.stderr)
+
+	def _run(self) -> None:
+		"""
+		Write the queued events until the `None` sentinel is received.
+		"""
+		stopping: bool = False
+		while not stopping:
+			event: Optional[Tuple[str, tuple]] = self._queue.get()
+			batch: List[Tuple[str, tuple]] = []
+			deadline: float = time.monotonic() + self.flush_interval_s
+			while True:
+				if event is None:
+					stopping = True
+				else:
+					batch.append(event)
+				if stopping or len(batch) >= self.batch_size:
+					break
+				remaining_s: float = deadline - time.monotonic()
+				if remaining_s <= 0:
+					break
+				try:
+					event = self._queue.get(timeout=remaining_s)
+				except queue.Empty:
+					break
+			if len(batch) > 0:
+				self._write(batch)
+			for _ in range(len(batch) + (1 if stopping else 0)):
+				self._queue.task_done()
+
+	def flush(self) -> None:
+		"""
+		Wait until the queued events are written.
+		"""
+		self._queue.join()
+
+	def last_statuses(self) -> Dict[str, bool]:
+		"""
+		Return the last recorded status of each target, `True` if it was online.
+		The queued events are not included.
+		"""
+		with self._connection_lock:
+			return last_statuses(self._connection)
+
+	def close(self) -> None:
+		"""
+		Write the queued events and close the database.
+		"""
+		if self._closed:
+			return
+		self._closed = True
+		self._queue.put(None)
+		self._writer.join()
+		self._connection.close()
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'EventLog(file_path: {self.file_path}, batch_size: {self.batch_size}, flush_interval_s: {self.flush_interval_s}, pending: {self._queue.qsize()}, dropped: {self.dropped})'
+
+
+def last_statuses(connection: sqlite3.Connection) -> Dict[str, bool]:
+	"""
+	Return the last recorded status of each target, `True` if it was online.
+	"""
+	rows = connection.execute(
+		'SELECT url, online FROM transitions WHERE id IN (SELECT MAX(id) FROM transitions GROUP BY url)'
+	)
+	return {url: bool(online) for url, online in rows}
+
+
+def read_transitions(
+	connection: sqlite3.Connection,
+	url: Optional[str] = None,
+	since: Optional[float] = None,
+) -> Iterator[TransitionRow]:
+	"""
+	Read the recorded status changes, from the oldest to the newest.
+	:param connection: The connection to the event log.
+	:param url: If given, only the changes of this target are read.
+	:param since: If given, only the changes since this UNIX timestamp are read.
+	"""
+	query, parameters = filter_query(
+		'SELECT time, url, online, reason FROM transitions', url, since)
+	for timestamp, target, online, reason in connection.execute(
+		query + ' ORDER BY id', parameters):
+		yield timestamp, target, bool(online), reason
+
+
+def read_probes(
+	connection: sqlite3.Connection,
+	url: Optional[str] = None,
+	since: Optional[float] = None,
+) -> Iterator[ProbeRow]:
+	"""
+	Read the recorded probes, from the oldest to the newest.
+	:param connection: The connection to the event log.
+	:param url: If given, only the probes of this target are read.
+	:param since: If given, only the probes since this UNIX timestamp are read.
+	"""
+	query, parameters = filter_query(
+		'SELECT time, url, online, http_status, elapsed_s, error FROM probes',
+		url, since)
+	for timestamp, target, online, http_status, elapsed_s, error in connection.execute(
+		query + ' ORDER BY id', parameters):
+		yield timestamp, target, bool(online), http_status, elapsed_s, error
+
+
+def filter_query(
+	query: str,
+	url: Optional[str],
+	since: Optional[float],
+) -> Tuple[str, List[Any]]:
+	"""
+	Add to `query` the conditions that select the events of `url` since the
+	UNIX timestamp `since`, if given.
+	:return: Returns the query and its parameters.
+	"""
+	conditions: List[str] = []
+	parameters: List[Any] = []
+	if url is not None:
+		conditions.append('url = ?')
+		parameters.append(url)
+	if since is not None:
+		conditions.append('time >= ?')
+		parameters.append(since)
+	if len(conditions) > 0:
+		query += ' WHERE ' + ' AND '.join(conditions)
+	return query, parameters
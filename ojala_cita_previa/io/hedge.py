@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, \
+ FIRST_COMPLETED
+from typing import Optional, Dict, Callable, Deque, Any, Set, Union, Tuple
+
+import urllib3
+from urllib3.exceptions import MaxRetryError, ResponseError
+
+import ojala_cita_previa.io.network as net
+from ojala_cita_previa.utils.duration_aggregator import DurationAggregator
+from ojala_cita_previa.utils.stopwatch import Stopwatch
+
+SPEND_RETRY: str = 'retry'
+SPEND_HEDGE: str = 'hedge'
+
+
+class RetryBudget:
+	"""
+	Budget shared by the retries and the hedged requests, so they never
+	amplify the load on a server that is already struggling.
+
+	Over the last `window_s` seconds, the number of extra requests can not
+	exceed `ratio` times the number of requests, plus `min_per_s` per second so
+	that a few retries are still possible when the traffic is low. It is
+	thread-safe.
+	"""
+
+	def __init__(
+		self,
+		ratio: float = 0.1,
+		min_per_s: float = 1,
+		window_s: float = 10,
+		clock: Callable[[], float] = time.monotonic,
+	):
+		"""
+		:param ratio: The maximum number of extra requests per request.
+		:param min_per_s: The number of extra requests per second that are
+		always allowed.
+		:param window_s: The duration of the sliding window, in seconds.
+		:param clock: The clock, in seconds.
+		"""
+		if ratio < 0 or min_per_s < 0:
+			raise ValueError(
+				f'The ratio and the minimum rate can not be negative, got {ratio} and {min_per_s}.'
+			)
+		if window_s <= 0:
+			raise ValueError(
+				f'The window must be positive, got {window_s} seconds.')
+
+		self.ratio = ratio
+		self.min_per_s = min_per_s
+		self.window_s = window_s
+		self.clock = clock
+		self._lock: threading.Lock = threading.Lock()
+		self._requests: Deque[float] = collections.deque()
+		self._spent: Deque[float] = collections.deque()
+		# Counters, by kind: "retry", "hedge" and "denied"
+		self.counts: Dict[str, int] = dict.fromkeys(
+			(SPEND_RETRY, SPEND_HEDGE, 'denied'), 0)
+
+	def _prune(self, now: float) -> None:
+		for events in (self._requests, self._spent):
+			while len(events) > 0 and now - events[0] > self.window_s:
+				events.popleft()
+
+	def deposit(self) -> None:
+		"""
+		Record a request, which allows `ratio` extra requests.
+		"""
+		with self._lock:
+			now: float = self.clock()
+			self._prune(now)
+			self._requests.append(now)
+
+	def withdraw(self, kind: str = SPEND_RETRY) -> bool:
+		"""
+		Try to spend the budget on an extra request.
+		:param kind: The kind of extra request, "retry" or "hedge".
+		:return: Returns `True` if the extra request can be sent.
+		"""
+		with self._lock:
+			now: float = self.clock()
+			self._prune(now)
+			allowed: float = self.ratio * len(
+				self._requests) + self.min_per_s * self.window_s
+			if len(self._spent) + 1 > allowed:
+				self.counts['denied'] += 1
+				return False
+			self._spent.append(now)
+			self.counts[kind] += 1
+			return True
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'RetryBudget(ratio: {self.ratio}, min_per_s: {self.min_per_s}, window_s: {self.window_s}, counts: {self.counts})'
+
+
+class BudgetedRetry(urllib3.Retry):
+	"""
+	urllib3 retry policy whose retries are also bounded by a `RetryBudget`.
+	The redirects do not spend the budget. When the budget is exhausted, the
+	request fails with `MaxRetryError`, whose reason is the last error.
+	"""
+
+	def __init__(self, *args, budget: Optional[RetryBudget] = None, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.budget = budget
+
+	def new(self, **kw) -> 'BudgetedRetry':
+		retry: BudgetedRetry = super().new(**kw)
+		retry.budget = self.budget
+		return retry
+
+	def increment(
+		self,
+		method=None,
+		url=None,
+		response=None,
+		error=None,
+		_pool=None,
+		_stacktrace=None,
+	):
+		retry: BudgetedRetry = super().increment(
+			method=method,
+			url=url,
+			response=response,
+			error=error,
+			_pool=_pool,
+			_stacktrace=_stacktrace)
+		redirect: bool = error is None and response is not None and bool(
+			response.get_redirect_location())
+		if self.budget is not None and not redirect and not self.budget.withdraw(
+			SPEND_RETRY):
+			raise MaxRetryError(
+				_pool, url, error or
+				ResponseError('The retry budget is exhausted.'))
+		return retry
+
+
+def _discard(future: Future) -> None:
+	"""
+	Close the response of a request that lost the race, so its connection is
+	not reused with an unread body.
+	"""
+	if future.cancelled() or future.exception() is not None:
+		return
+	response: urllib3.response.HTTPResponse = future.result()
+	response.close()
+	response.release_conn()
+
+
+def _max_wait_s(kwargs: Dict[str, Any]) -> Optional[float]:
+	"""
+	Return how long a request sent with the arguments `kwargs` can take until
+	its response headers, retries included, in seconds, or `None` if it is not
+	bounded.
+	"""
+	timeout: Any = kwargs.get('timeout')
+	if isinstance(timeout, urllib3.Timeout):
+		connect_s: Any = timeout.connect_timeout
+		read_s: Any = timeout.read_timeout
+		if timeout.total is not None:
+			attempt_s: Optional[float] = timeout.total
+		elif isinstance(connect_s,
+						(int, float)) and isinstance(read_s, (int, float)):
+			attempt_s = connect_s + read_s
+		else:
+			attempt_s = None
+	elif isinstance(timeout, (int, float)):
+		# The connect and the read timeouts
+		attempt_s = 2 * timeout
+	else:
+		attempt_s = None
+	if attempt_s is None:
+		return None
+
+	retries: Any = kwargs.get('retries', urllib3.Retry.DEFAULT)
+	if isinstance(retries, urllib3.Retry):
+		retries = retries.total
+	attempts: int = 1 + retries if isinstance(retries,
+												int) and retries > 0 else 1
+	return attempts * attempt_s
+
+
+class HedgedRequester:
+	"""
+	Send the requests with `ojala_cita_previa.io.network.request`, and if a
+	response takes longer than the usual (a percentile of the previous
+	durations of the same URL), send the same request a second time on another
+	connection. The first response wins, and the other one is discarded.
+
+	The hedged requests spend the given `RetryBudget`, so they stop when the
+	server is slow for everyone.
+	"""
+
+	def __init__(
+		self,
+		budget: RetryBudget,
+		percentile: Union[int, float] = 95,
+		min_delay_s: float = 0.1,
+		min_samples: int = 20,
+		max_workers: int = 20,
+	):
+		"""
+		:param budget: The budget spent by the hedged requests.
+		:param percentile: The percentile of the previous durations after which
+		a request is hedged, between 0 and 100.
+		:param min_delay_s: The minimum delay before hedging a request, in
+		seconds.
+		:param min_samples: The number of durations to record for a URL before
+		hedging its requests.
+		:param max_workers: The number of threads sending the requests. A
+		request that lost the race keeps its thread until it completes.
+		"""
+		if not 0 < percentile <= 100:
+			raise ValueError(
+				f'The percentile must be in ]0, 100], got {percentile}.')
+
+		self.budget = budget
+		self.percentile = percentile
+		self.min_delay_s = min_delay_s
+		self.min_samples = min_samples
+		self.max_workers = max_workers
+		self._lock: threading.Lock = threading.Lock()
+		# The duration until the response headers, for each URL
+		self._durations: Dict[str, DurationAggregator] = {}
+		self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+			max_workers=max_workers, thread_name_prefix='ojala-hedge')
+		# Counters: "hedged" requests, and hedged requests that "won"
+		self.counts: Dict[str, int] = dict.fromkeys(('hedged', 'won'), 0)
+
+	def _aggregator(self, url: str) -> DurationAggregator:
+		with self._lock:
+			aggregator: Optional[DurationAggregator] = self._durations.get(url)
+			if aggregator is None:
+				aggregator = DurationAggregator()
+				self._durations[url] = aggregator
+			return aggregator
+
+	def delay_s(self, url: str) -> Optional[float]:
+		"""
+		Return how long a request to `url` can take before being hedged, in
+		seconds, or `None` if not enough durations have been recorded yet.
+		"""
+		aggregator: DurationAggregator = self._aggregator(url)
+		if aggregator.count < self.min_samples:
+			return None
+		return max(self.min_delay_s, aggregator.percentile(self.percentile))
+
+	def _timed_request(
+		self,
+		url: str,
+		kwargs: Dict[str, Any],
+	) -> urllib3.response.HTTPResponse:
+		stopwatch: Stopwatch = Stopwatch(
+			start_now=True, aggregator=self._aggregator(url))
+		response: urllib3.response.HTTPResponse = net.request(url, **kwargs)
+		stopwatch.stop()
+		return response
+
+	def request(
+		self,
+		url: str,
+		**kwargs,
+	) -> Tuple[urllib3.response.HTTPResponse, bool]:
+		"""
+		Send a request to `url`, hedged if it is too slow.
+		:param url: The URL.
+		:param kwargs: The arguments of `ojala_cita_previa.io.network.request`.
+		:return: Returns the response that arrived first, and `True` if the
+		request has been sent twice.
+		:raise TimeoutError: Raised if no response arrived within the timeouts
+		given in `kwargs`, should a request be stuck despite them.
+		"""
+		delay_s: Optional[float] = self.delay_s(url)
+		if delay_s is None:
+			return self._timed_request(url, kwargs), False
+
+		max_wait_s: Optional[float] = _max_wait_s(kwargs)
+		deadline: Optional[float] = time.monotonic(
+		) + max_wait_s if max_wait_s is not None else None
+		primary: Future = self._executor.submit(self._timed_request, url,
+												kwargs)
+		done, _ = wait((primary,), timeout=delay_s)
+		hedge: Optional[Future] = None
+		if len(done) == 0 and self.budget.withdraw(SPEND_HEDGE):
+			with self._lock:
+				self.counts['hedged'] += 1
+			hedge = self._executor.submit(self._timed_request, url, kwargs)
+		hedged: bool = hedge is not None
+
+		pending: Set[Future] = {primary, hedge} if hedged else {primary}
+		while len(pending) > 0:
+			done, pending = wait(
+				pending,
+				timeout=max(0.0, deadline - time.monotonic())
+				if deadline is not None else None,
+				return_when=FIRST_COMPLETED)
+			if len(done) == 0:
+				for other in pending:
+					other.add_done_callback(_discard)
+				raise TimeoutError(
+					f'No response from {url} within {max_wait_s:.2f}s.')
+			for future in done:
+				if future.exception() is not None:
+					continue
+				for other in pending:
+					other.add_done_callback(_discard)
+				if future is hedge:
+					with self._lock:
+						self.counts['won'] += 1
+				return future.result(), hedged
+		# The requests failed, report the error of the first one
+		return primary.result(), hedged
+
+	def forget(self, url: Optional[str] = None) -> None:
+		"""
+		Forget the recorded durations.
+		:param url: The URL to forget. If `None`, all URLs are forgotten.
+		"""
+		with self._lock:
+			if url is None:
+				self._durations.clear()
+			else:
+				self._durations.pop(url, None)
+
+	def close(self) -> None:
+		"""
+		Stop the threads, without waiting for the requests that lost a race.
+		"""
+		self._executor.shutdown(wait=False)
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'HedgedRequester(budget: {self.budget}, percentile: {self.percentile}, min_delay_s: {self.min_delay_s}, min_samples: {self.min_samples}, counts: {self.counts})'
@@ -1,31 +1,154 @@
 #!/usr/bin/env python
-from typing import Optional, NoReturn, Any
+import sys
+import warnings
+from typing import Optional, NoReturn, Any, Dict, Tuple, TYPE_CHECKING
 
 import urllib3
 
-_pool_manager: Optional[urllib3.PoolManager] = None
+from ojala_cita_previa.io.compression import ACCEPT_ENCODING
+from ojala_cita_previa.io.pool import InstrumentedPoolManager, PoolStatistics
 
+if TYPE_CHECKING:
+	from ojala_cita_previa.io.capture import CaptureArchive
+	from ojala_cita_previa.io.dns import DNSCache
 
-def init() -> urllib3.PoolManager:
+TLS_VERSIONS = ('TLSv1.2', 'TLSv1.3')
+
+_pool_manager: Optional[InstrumentedPoolManager] = None
+# The arguments given to `init`, to detect a second call with other parameters
+_pool_settings: Optional[Dict[str, Any]] = None
+
+# Cache validators (ETag, Last-Modified) of the last successful response of
+# each URL, used by conditional requests
+_validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+# Archive where the responses are captured, if the capture mode is enabled
+_capture_archive: Optional['CaptureArchive'] = None
+
+
+def init(
+	maxsize: int = 1,
+	num_pools: int = 10,
+	block: bool = False,
+	idle_timeout_s: Optional[float] = None,
+	host_overrides: Optional[Dict[str, Dict[str, Any]]] = None,
+	tls_verify: bool = True,
+	tls_ca_certs: Optional[str] = None,
+	tls_minimum_version: Optional[str] = None,
+	statistics: Optional[PoolStatistics] = None,
+	dns_cache: Optional['DNSCache'] = None,
+) -> InstrumentedPoolManager:
 	"""
 	Init the pool manager. You must call this function before executing any
 	network operations.
+
+	Calling it again with the same parameters returns the current pool manager.
+	With other parameters, a warning is emitted and the current pool manager is
+	replaced, closing its connections.
+	:param maxsize: The number of connections to keep in each connection pool.
+	It should match the number of requests that can be in flight at the same
+	time. Defaults to 1.
+	:param num_pools: The number of connection pools (one per host) to keep.
+	Defaults to 10.
+	:param block: If `True`, a request waits for a free connection when its
+	pool is full. Otherwise, a new connection is opened, and closed after the
+	request. Defaults to `False`.
+	:param idle_timeout_s: The connections that stayed idle for longer than
+	this number of seconds are closed instead of being reused. If `None`, they
+	are reused until the server closes them.
+	:param host_overrides: The "maxsize" and "block" parameters of some hosts,
+	by "host" or "host:port".
+	:param tls_verify: If `False`, the TLS certificates are not verified.
+	:param tls_ca_certs: The file of the certificate authorities used to verify
+	the TLS certificates. Defaults to the certificates of the system.
+	:param tls_minimum_version: The minimum TLS version, "TLSv1.2" or "TLSv1.3".
+	:param statistics: Where the connections created and reused are counted.
+	Defaults to a new `PoolStatistics`.
+	:param dns_cache: If given, the host names are resolved with this cache
+	instead of asking the resolver of the system for each new connection.
 	:return: Returns the pool manager.
-	:rtype: urllib3.PoolManager.
+	:rtype: InstrumentedPoolManager.
 	"""
-	global _pool_manager
+	global _pool_manager, _pool_settings
+	settings: Dict[str, Any] = {
+		'maxsize': maxsize,
+		'num_pools': num_pools,
+		'block': block,
+		'idle_timeout_s': idle_timeout_s,
+		'host_overrides': host_overrides,
+		'tls_verify': tls_verify,
+		'tls_ca_certs': tls_ca_certs,
+		'tls_minimum_version': tls_minimum_version,
+		'statistics': statistics,
+		'dns_cache': dns_cache,
+	}
 	if _pool_manager is not None:
+		if settings == _pool_settings:
+			return _pool_manager
+		warnings.warn(
+			'The network module is initialized again with other parameters, the open connections are closed.',
+			RuntimeWarning,
+			stacklevel=2)
 		_pool_manager.clear()
 
-	_pool_manager = urllib3.PoolManager()
+	connection_pool_kw: Dict[str, Any] = {'maxsize': maxsize, 'block': block}
+	if not tls_verify:
+		connection_pool_kw['cert_reqs'] = 'CERT_NONE'
+		connection_pool_kw['assert_hostname'] = False
+	elif tls_ca_certs is not None:
+		connection_pool_kw['cert_reqs'] = 'CERT_REQUIRED'
+		connection_pool_kw['ca_certs'] = tls_ca_certs
+	if tls_minimum_version is not None:
+		if tls_minimum_version not in TLS_VERSIONS:
+			raise ValueError(
+				f'Unknown TLS version "{tls_minimum_version}". Expected one of: {", ".join(TLS_VERSIONS)}.'
+			)
+		# Imported here, since it is only needed with a custom TLS context
+		import ssl
+		from urllib3.util.ssl_ import create_urllib3_context
+		context: ssl.SSLContext = create_urllib3_context(
+			cert_reqs=ssl.CERT_REQUIRED if tls_verify else ssl.CERT_NONE)
+		context.minimum_version = ssl.TLSVersion[tls_minimum_version.replace(
+			'.', '_')]
+		if tls_verify and tls_ca_certs is None:
+			# urllib3 only loads them in the contexts it creates
+			context.load_default_certs()
+		connection_pool_kw['ssl_context'] = context
+
+	_pool_manager = InstrumentedPoolManager(
+		num_pools=num_pools,
+		statistics=statistics,
+		idle_timeout_s=idle_timeout_s,
+		host_overrides=host_overrides,
+		dns_cache=dns_cache,
+		**connection_pool_kw,
+	)
+	_pool_settings = settings
 	return _pool_manager
 
 
+def initialized() -> bool:
+	"""
+	Return `True` if the network module is initialized.
+	"""
+	return _pool_manager is not None
+
+
+def statistics() -> Optional[PoolStatistics]:
+	"""
+	Return the connection statistics of the pool manager, or `None` if the
+	network module is not initialized.
+	"""
+	return _pool_manager.statistics if _pool_manager is not None else None
+
+
 def request(
 	url: str,
 	method: str = 'GET',
 	fields: Any = None,
 	headers: Any = None,
+	conditional: bool = False,
+	compressed: bool = True,
 	**kwargs,
 ) -> urllib3.response.HTTPResponse:
 	"""
@@ -37,16 +160,56 @@ def request(
 	:param method: The HTTP method. Defaults to "GET".
 	:param fields: Additional fields.
 	:param headers: Additional HTTP headers.
+	:param conditional: If `True`, the "ETag" and "Last-Modified" headers of
+	the last successful response of `url` are sent back with "If-None-Match"
+	and "If-Modified-Since", so the server can answer "304 Not Modified"
+	instead of sending the same content again. Defaults to `False`.
+	:param compressed: If `True`, the server is allowed to compress the body
+	with gzip, deflate, or brotli if it is installed. The body is decompressed
+	when it is read. Defaults to `True`.
 	:return: The URL-LIB3 response.
 	"""
 	global _pool_manager
 	assert _pool_manager is not None, 'Please call ojala_cita_previa.io.network.init() before performing any network operations.'
+
+	if compressed:
+		headers = dict(headers) if headers is not None else {}
+		headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+
+	if conditional:
+		etag, last_modified = _validators.get(url, (None, None))
+		if etag is not None or last_modified is not None:
+			headers = dict(headers) if headers is not None else {}
+			if etag is not None:
+				headers.setdefault('If-None-Match', etag)
+			if last_modified is not None:
+				headers.setdefault('If-Modified-Since', last_modified)
+
 	res: urllib3.response.HTTPResponse = _pool_manager.request(
 		method, url, fields=fields, headers=headers, **kwargs)
 
+	if conditional and res.status == 200:
+		etag = res.headers.get('ETag')
+		last_modified = res.headers.get('Last-Modified')
+		if etag is not None or last_modified is not None:
+			_validators[url] = (etag, last_modified)
+		else:
+			_validators.pop(url, None)
+
 	return res
 
 
+def forget_validators(url: Optional[str] = None) -> NoReturn:
+	"""
+	Forget the cache validators used by conditional requests.
+	:param url: The URL to forget. If `None`, all URLs are forgotten.
+	"""
+	if url is None:
+		_validators.clear()
+	else:
+		_validators.pop(url, None)
+
+
 def download(
 	url: str,
 	method: str = 'GET',
@@ -77,11 +240,77 @@ def download(
 	return res.data
 
 
+def enable_capture(archive: 'CaptureArchive') -> NoReturn:
+	"""
+	Enable the capture mode: the responses given to `capture` are written in
+	`archive`.
+	:param archive: The archive.
+	"""
+	global _capture_archive
+	_capture_archive = archive
+
+
+def disable_capture() -> Optional['CaptureArchive']:
+	"""
+	Disable the capture mode.
+	:return: Returns the archive that was used, if any. It is not closed.
+	"""
+	global _capture_archive
+	archive: Optional['CaptureArchive'] = _capture_archive
+	_capture_archive = None
+	return archive
+
+
+def capture_enabled() -> bool:
+	return _capture_archive is not None
+
+
+def capture(
+	url: str,
+	response: urllib3.response.HTTPResponse,
+	body: bytes = b'',
+	elapsed_s: Optional[float] = None,
+	complete: bool = True,
+	**extra: Any,
+) -> NoReturn:
+	"""
+	Write a response in the capture archive, if the capture mode is enabled.
+
+	Since a streamed body is only read by the caller, the responses are not
+	captured by `request`: the caller captures them once the body is read.
+	:param url: The requested URL.
+	:param response: The response.
+	:param body: The body, or the part of it that has been read.
+	:param elapsed_s: The duration of the request, in seconds.
+	:param complete: `False` if only the beginning of the body has been read.
+	:param extra: Additional JSON-compatible information, such as the
+	detection result.
+	"""
+	archive: Optional['CaptureArchive'] = _capture_archive
+	if archive is None:
+		return
+
+	try:
+		archive.record(
+			url,
+			status=response.status,
+			headers=dict(response.headers),
+			body=body,
+			elapsed_s=elapsed_s,
+			complete=complete,
+			**extra,
+		)
+	except OSError as e:
+		print(f'Could not capture the response of {url}:\n{e}', file=sys.stderr)
+
+
 def dispose() -> NoReturn:
 	"""
 	Dispose of the pool manager. This function must be called once all network
 	operations are finished.
 	"""
-	global _pool_manager
+	global _pool_manager, _pool_settings
 	if _pool_manager is not None:
 		_pool_manager.clear()
+		_pool_manager = None
+		_pool_settings = None
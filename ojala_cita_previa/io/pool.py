@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+import threading
+import time
+from typing import Optional, Dict, Callable, Any, List
+
+import urllib3
+
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool, \
+ port_by_scheme
+
+from ojala_cita_previa.io.dns import DNSCache, CachedDNSHTTPConnection, \
+ CachedDNSHTTPSConnection
+
+CONNECTION_CREATED: str = 'created'
+CONNECTION_REUSED: str = 'reused'
+CONNECTION_EXPIRED: str = 'expired'
+CONNECTION_KINDS = (CONNECTION_CREATED, CONNECTION_REUSED, CONNECTION_EXPIRED)
+
+# The pool parameters that can be overridden for a single host
+HOST_OVERRIDE_KEYS = ('maxsize', 'block')
+
+
+class PoolStatistics:
+	"""
+	Count, for each host, the requests sent on a new connection ("created"),
+	the requests sent on a warm keep-alive connection ("reused"), and the idle
+	connections closed before being reused ("expired").
+	"""
+
+	def __init__(
+		self,
+		listener: Optional[Callable[[str, str], None]] = None,
+	):
+		"""
+		:param listener: If given, it is called with the host and the kind of
+		event each time an event is recorded.
+		"""
+		self.listener = listener
+		self._lock: threading.Lock = threading.Lock()
+		self._counts: Dict[str, Dict[str, int]] = {}
+
+	def record(self, host: str, kind: str) -> None:
+		with self._lock:
+			counts: Dict[str, int] = self._counts.setdefault(
+				host, dict.fromkeys(CONNECTION_KINDS, 0))
+			counts[kind] += 1
+		if self.listener is not None:
+			self.listener(host, kind)
+
+	def snapshot(self) -> Dict[str, Dict[str, int]]:
+		"""
+		Return a copy of the counts, by host and by kind.
+		"""
+		with self._lock:
+			return {host: dict(counts) for host, counts in self._counts.items()}
+
+	def total(self, kind: str) -> int:
+		with self._lock:
+			return sum(counts[kind] for counts in self._counts.values())
+
+	def reuse_ratio(self) -> Optional[float]:
+		"""
+		Return the fraction of the requests sent on a reused connection, or
+		`None` if no request has been sent.
+		"""
+		created: int = self.total(CONNECTION_CREATED)
+		reused: int = self.total(CONNECTION_REUSED)
+		if created + reused == 0:
+			return None
+		return reused / (created + reused)
+
+	def reset(self) -> None:
+		with self._lock:
+			self._counts.clear()
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'PoolStatistics({self.snapshot()})'
+
+
+class _InstrumentedPoolMixin:
+	"""
+	Connection pool that records its connections in a `PoolStatistics`, closes
+	the connections that stayed idle for too long, and resolves the host names
+	with a `DNSCache` if it has one.
+	"""
+
+	statistics: Optional[PoolStatistics] = None
+	idle_timeout_s: Optional[float] = None
+	dns_cache: Optional[DNSCache] = None
+
+	def _new_conn(self):
+		conn = super()._new_conn()
+		conn.dns_cache = self.dns_cache
+		return conn
+
+	def _get_conn(self, timeout=None):
+		conn = super()._get_conn(timeout=timeout)
+		released_at: Optional[float] = getattr(conn, '_ojala_released_at', None)
+		if self.idle_timeout_s is not None and released_at is not None and getattr(
+			conn, 'sock', None
+		) is not None and time.monotonic() - released_at > self.idle_timeout_s:
+			# The server probably closed it already, do not risk a failed
+			# request
+			conn.close()
+			if self.statistics is not None:
+				self.statistics.record(self.host, CONNECTION_EXPIRED)
+		return conn
+
+	def _put_conn(self, conn) -> None:
+		if conn is not None:
+			conn._ojala_released_at = time.monotonic()
+		super()._put_conn(conn)
+
+	def _make_request(self, conn, method, url, *args, **kwargs):
+		if self.statistics is not None:
+			# A connection without socket connects when the request is sent
+			self.statistics.record(
+				self.host, CONNECTION_CREATED
+				if getattr(conn, 'sock', None) is None else CONNECTION_REUSED)
+		return super()._make_request(conn, method, url, *args, **kwargs)
+
+
+class InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin,
+										HTTPConnectionPool):
+	ConnectionCls = CachedDNSHTTPConnection
+
+
+class InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin,
+										HTTPSConnectionPool):
+	ConnectionCls = CachedDNSHTTPSConnection
+
+
+class InstrumentedPoolManager(urllib3.PoolManager):
+	"""
+	Pool manager whose connection pools are instrumented (see
+	`PoolStatistics`), with pool parameters that can be overridden for some
+	hosts.
+	"""
+
+	def __init__(
+		self,
+		num_pools: int = 10,
+		headers: Optional[Dict[str, str]] = None,
+		statistics: Optional[PoolStatistics] = None,
+		idle_timeout_s: Optional[float] = None,
+		host_overrides: Optional[Dict[str, Dict[str, Any]]] = None,
+		dns_cache: Optional[DNSCache] = None,
+		**connection_pool_kw,
+	):
+		"""
+		:param num_pools: The number of connection pools to cache.
+		:param headers: The headers sent with each request.
+		:param statistics: Where the connections are recorded. Defaults to a
+		new `PoolStatistics`.
+		:param idle_timeout_s: The connections that stayed idle for longer than
+		this number of seconds are closed instead of being reused. If `None`,
+		they are reused until the server closes them.
+		:param host_overrides: The pool parameters of some hosts, by "host" or
+		"host:port". Only "maxsize" and "block" can be overridden.
+		:param dns_cache: If given, the host names are resolved with it.
+		:param connection_pool_kw: The parameters of the connection pools.
+		"""
+		super().__init__(
+			num_pools=num_pools, headers=headers, **connection_pool_kw)
+		host_overrides = dict(host_overrides or {})
+		for host, overrides in host_overrides.items():
+			unknown: List[str] = [
+				key for key in overrides if key not in HOST_OVERRIDE_KEYS
+			]
+			if len(unknown) > 0:
+				raise ValueError(
+					f'Unknown pool parameters for the host "{host}": {", ".join(unknown)}. Expected: {", ".join(HOST_OVERRIDE_KEYS)}.'
+				)
+
+		self.statistics = statistics if statistics is not None else PoolStatistics(
+		)
+		self.idle_timeout_s = idle_timeout_s
+		self.dns_cache = dns_cache
+		self.host_overrides: Dict[str, Dict[str, Any]] = {
+			host.lower(): dict(overrides)
+			for host, overrides in host_overrides.items()
+		}
+		self.pool_classes_by_scheme = {
+			'http': InstrumentedHTTPConnectionPool,
+			'https': InstrumentedHTTPSConnectionPool,
+		}
+
+	def connection_from_host(
+		self,
+		host,
+		port=None,
+		scheme='http',
+		pool_kwargs=None,
+	):
+		if host is not None and len(self.host_overrides) > 0:
+			host_port: int = port if port is not None else port_by_scheme.get(
+				scheme.lower(), 80)
+			overrides: Optional[Dict[str, Any]] = self.host_overrides.get(
+				f'{host.lower()}:{host_port}') or self.host_overrides.get(
+					host.lower())
+			if overrides is not None:
+				pool_kwargs = {**overrides, **(pool_kwargs or {})}
+		return super().connection_from_host(
+			host, port=port, scheme=scheme, pool_kwargs=pool_kwargs)
+
+	def _new_pool(self, scheme, host, port, request_context=None):
+		pool = super()._new_pool(
+			scheme, host, port, request_context=request_context)
+		if isinstance(pool, _InstrumentedPoolMixin):
+			pool.statistics = self.statistics
+			pool.idle_timeout_s = self.idle_timeout_s
+			pool.dns_cache = self.dns_cache
+		return pool
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'InstrumentedPoolManager(num_pools: {self.pools._maxsize}, idle_timeout_s: {self.idle_timeout_s}, dns_cache: {self.dns_cache}, host_overrides: {self.host_overrides}, connection_pool_kw: {self.connection_pool_kw})'
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+import http.cookiejar
+import threading
+import urllib.parse
+import urllib.request
+from typing import Optional, Dict, Any
+
+import urllib3
+
+import ojala_cita_previa.io.network as net
+
+# The redirections after which a POST request becomes a GET request
+_REDIRECT_TO_GET = (301, 302, 303)
+
+
+class Session:
+	"""
+	A browsing session over the pool manager of the network module: the cookies
+	sent by the website are stored and sent back, the redirections are followed
+	with the cookies they set, and each request is sent with the URL of the
+	previous page as "Referer", like a browser.
+
+	The connections are the keep-alive connections of the network module, so
+	a session does not open new connections. A session can be used from several
+	threads, but the pages of a flow must be requested in order.
+	"""
+
+	def __init__(
+		self,
+		headers: Optional[Dict[str, str]] = None,
+		max_redirects: int = 10,
+	):
+		"""
+		:param headers: The HTTP headers sent with every request.
+		:param max_redirects: The maximum number of redirections followed by
+		a request.
+		"""
+		self.headers: Dict[str, str] = dict(headers or {})
+		self.max_redirects = max_redirects
+		self.cookies: http.cookiejar.CookieJar = http.cookiejar.CookieJar()
+		self.referer: Optional[str] = None
+		self._lock: threading.Lock = threading.Lock()
+
+	def request(
+		self,
+		url: str,
+		method: str = 'GET',
+		fields: Optional[Dict[str, Any]] = None,
+		headers: Optional[Dict[str, str]] = None,
+		**kwargs,
+	) -> urllib3.response.HTTPResponse:
+		"""
+		Send an HTTP request with the cookies of the session, and follow the
+		redirections.
+		:param url: The URL to request.
+		:param method: The HTTP method. Defaults to "GET".
+		:param fields: The fields, sent in the query string for a GET request,
+		and URL-encoded in the body otherwise.
+		:param headers: Additional HTTP headers.
+		:param kwargs: Additional arguments given to
+		`ojala_cita_previa.io.network.request`.
+		:return: Returns the response of the last redirection. Its body is
+		preloaded, unless `preload_content=False` is given.
+		:raise urllib3.exceptions.MaxRetryError: Raised if there are more than
+		`max_redirects` redirections.
+		"""
+		for _ in range(self.max_redirects + 1):
+			cookie_request: urllib.request.Request = urllib.request.Request(
+				url, method=method)
+			self.cookies.add_cookie_header(cookie_request)
+			request_headers: Dict[str, str] = dict(self.headers)
+			with self._lock:
+				if self.referer is not None:
+					request_headers['Referer'] = self.referer
+			cookie: Optional[str] = cookie_request.get_header('Cookie')
+			if cookie is not None:
+				request_headers['Cookie'] = cookie
+			request_headers.update(headers or {})
+			if method != 'GET' and fields is not None:
+				kwargs['encode_multipart'] = False
+
+			response: urllib3.response.HTTPResponse = net.request(
+				url,
+				method=method,
+				fields=fields,
+				headers=request_headers,
+				redirect=False,
+				**kwargs)
+			self.cookies.extract_cookies(response, cookie_request)
+
+			location = response.get_redirect_location()
+			if not location:
+				with self._lock:
+					self.referer = url
+				return response
+
+			response.drain_conn()
+			response.release_conn()
+			url = urllib.parse.urljoin(url, location)
+			if response.status in _REDIRECT_TO_GET and method != 'HEAD':
+				method = 'GET'
+				fields = None
+				kwargs.pop('encode_multipart', None)
+
+		raise urllib3.exceptions.MaxRetryError(
+			None,
+			url,
+			reason=urllib3.exceptions.ResponseError(
+				f'More than {self.max_redirects} redirections.'))
+
+	def clear(self) -> None:
+		"""
+		Forget the cookies and the previous page, like a new browser.
+		"""
+		self.cookies.clear()
+		with self._lock:
+			self.referer = None
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'Session(cookies: {len(self.cookies)}, referer: {self.referer}, max_redirects: {self.max_redirects})'
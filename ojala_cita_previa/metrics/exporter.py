@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Union
+
+from ojala_cita_previa.metrics.registry import MetricsRegistry
+
+CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsServer:
+	"""
+	HTTP server that exposes the metrics in the Prometheus text format on
+	"/metrics", from a background thread.
+	"""
+
+	def __init__(
+		self,
+		registry: MetricsRegistry,
+		port: int,
+		host: str = '127.0.0.1',
+	):
+		self.registry = registry
+		self.host = host
+		self.port = port
+		self._server: Optional[ThreadingHTTPServer] = None
+		self._thread: Optional[threading.Thread] = None
+
+	def start(self) -> None:
+		registry: MetricsRegistry = self.registry
+
+		class Handler(BaseHTTPRequestHandler):
+
+			def do_GET(self):
+				if self.path.split('?')[0] not in ('/', '/metrics'):
+					self.send_error(404)
+					return
+
+				body: bytes = registry.render().encode('utf-8')
+				self.send_response(200)
+				self.send_header('Content-Type', CONTENT_TYPE)
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			# noinspection PyShadowingBuiltins
+			def log_message(self, format, *args):
+				pass
+
+		self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+		self._server.daemon_threads = True
+		# The port may have been chosen by the system
+		self.port = self._server.server_address[1]
+		self._thread = threading.Thread(
+			target=self._server.serve_forever,
+			name='ojala-metrics-server',
+			daemon=True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		if self._server is not None:
+			self._server.shutdown()
+			self._server.server_close()
+			self._server = None
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+
+class MetricsFileWriter:
+	"""
+	Write the metrics in the Prometheus text format into a file, periodically,
+	from a background thread. The file is replaced atomically, so it can be
+	collected by the "textfile" collector of the node exporter.
+	"""
+
+	def __init__(
+		self,
+		registry: MetricsRegistry,
+		file_path: str,
+		interval_s: Union[int, float] = 15,
+	):
+		self.registry = registry
+		self.file_path = file_path
+		self.interval_s = interval_s
+		self._stop_event: threading.Event = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+
+	def write(self) -> None:
+		"""
+		Write the metrics now.
+		"""
+		tmp_path: str = f'{self.file_path}.tmp'
+		try:
+			with open(tmp_path, mode='w', encoding='utf-8') as f:
+				f.write(self.registry.render())
+			os.replace(tmp_path, self.file_path)
+		except OSError as e:
+			print(
+				f'Could not write the metrics in "{self.file_path}":\n{e}',
+				file=sys.stderr)
+
+	def _loop(self) -> None:
+		while not self._stop_event.wait(self.interval_s):
+			self.write()
+
+	def start(self) -> None:
+		self._stop_event.clear()
+		self._thread = threading.Thread(
+			target=self._loop, name='ojala-metrics-writer', daemon=True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		self._stop_event.set()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+		self.write()
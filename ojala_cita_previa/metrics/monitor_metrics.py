@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+from typing import Optional, TYPE_CHECKING
+
+from ojala_cita_previa.metrics.registry import MetricsRegistry, Histogram, \
+ Counter, Gauge
+
+if TYPE_CHECKING:
+	from ojala_cita_previa.monitor.probe import ProbeResult
+
+
+class MonitorMetrics:
+	"""
+	The metrics of the monitor: probe latencies, network errors, HTTP codes,
+	parse time, hedged requests, body sizes, connection reuse, notification
+	time, suppressed notifications and current status of each target.
+	"""
+
+	def __init__(self, registry: Optional[MetricsRegistry] = None):
+		if registry is None:
+			registry = MetricsRegistry()
+
+		self.registry = registry
+		self.request_duration: Histogram = registry.histogram(
+			'ojala_request_duration_seconds',
+			'Duration of the probes, from the request to the detection.',
+			label_names=('target',),
+		)
+		self.parse_duration: Histogram = registry.histogram(
+			'ojala_parse_duration_seconds',
+			'Time spent inspecting the webpages.',
+			label_names=('target',),
+		)
+		self.request_errors: Counter = registry.counter(
+			'ojala_request_errors_total',
+			'Number of requests that failed, by kind of error.',
+			label_names=('target', 'error'),
+		)
+		self.http_responses: Counter = registry.counter(
+			'ojala_http_responses_total',
+			'Number of HTTP responses, by status code.',
+			label_names=('target', 'code'),
+		)
+		self.reused_results: Counter = registry.counter(
+			'ojala_reused_results_total',
+			'Number of probes whose content did not change, and whose previous detection result has been reused.',
+			label_names=('target',),
+		)
+		self.hedged_requests: Counter = registry.counter(
+			'ojala_hedged_requests_total',
+			'Number of probes whose request has been sent a second time because the first one was too slow.',
+			label_names=('target',),
+		)
+		self.body_bytes: Counter = registry.counter(
+			'ojala_body_bytes_total',
+			'Number of bytes of the response bodies, as received ("compressed") and once decompressed ("decompressed").',
+			label_names=('target', 'kind'),
+		)
+		self.target_up: Gauge = registry.gauge(
+			'ojala_target_up',
+			'1 if the appointment form is available, 0 otherwise.',
+			label_names=('target',),
+		)
+		self.connections: Counter = registry.counter(
+			'ojala_connections_total',
+			'Number of requests sent on a new connection ("created") or on a kept-alive one ("reused"), and number of idle connections closed ("expired"), by host.',
+			label_names=('host', 'kind'),
+		)
+		self.notification_duration: Histogram = registry.histogram(
+			'ojala_notification_duration_seconds',
+			'Time spent sending the notifications, by notifier.',
+			label_names=('notifier', 'method'),
+		)
+		self.suppressed_notifications: Counter = registry.counter(
+			'ojala_suppressed_notifications_total',
+			'Number of notifications suppressed by the rate limit, by notifier.',
+			label_names=('notifier',),
+		)
+
+	def observe_probe(self, url: str, result: 'ProbeResult') -> None:
+		"""
+		Record the result of a probe.
+		:param url: The URL of the target.
+		:param result: The result of the probe.
+		"""
+		if result.elapsed_s is not None:
+			self.request_duration.observe(result.elapsed_s, target=url)
+		if result.parse_s is not None:
+			self.parse_duration.observe(result.parse_s, target=url)
+		if result.error is not None:
+			self.request_errors.inc(target=url, error=result.error)
+		if result.http_status is not None:
+			self.http_responses.inc(target=url, code=str(result.http_status))
+		if result.reused:
+			self.reused_results.inc(target=url)
+		if result.hedged:
+			self.hedged_requests.inc(target=url)
+		if result.compressed_bytes is not None:
+			self.body_bytes.inc(
+				result.compressed_bytes, target=url, kind='compressed')
+			self.body_bytes.inc(
+				result.decompressed_bytes, target=url, kind='decompressed')
+		self.target_up.set(1 if result.online else 0, target=url)
+
+	def observe_notification(
+		self,
+		notifier: str,
+		method: str,
+		duration_s: float,
+	) -> None:
+		"""
+		Record the time spent sending a notification.
+		:param notifier: The name of the notifier class.
+		:param method: The notification method, "success" or "error".
+		:param duration_s: The duration, in seconds.
+		"""
+		self.notification_duration.observe(
+			duration_s, notifier=notifier, method=method)
+
+	def observe_suppressed(self, notifier: str) -> None:
+		"""
+		Record a notification suppressed by the rate limit.
+		:param notifier: The name of the notifier class.
+		"""
+		self.suppressed_notifications.inc(notifier=notifier)
+
+	def observe_connection(self, host: str, kind: str) -> None:
+		"""
+		Record a connection event of the network module.
+		:param host: The host of the connection.
+		:param kind: The kind of event, "created", "reused" or "expired".
+		"""
+		self.connections.inc(host=host, kind=kind)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+import bisect
+import math
+import threading
+from typing import Dict, Tuple, List, Union, Sequence, Optional
+
+LabelValues = Tuple[str, ...]
+
+# Upper bounds of the default buckets of the histograms, in seconds
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+	0.005,
+	0.01,
+	0.025,
+	0.05,
+	0.1,
+	0.25,
+	0.5,
+	1,
+	2.5,
+	5,
+	10,
+	30,
+	60,
+)
+
+
+def _escape(value: str) -> str:
+	return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: Union[int, float]) -> str:
+	if isinstance(value, float):
+		if math.isinf(value):
+			return '+Inf' if value > 0 else '-Inf'
+		if math.isnan(value):
+			return 'NaN'
+	return repr(value)
+
+
+class Metric:
+	"""
+	Base class of a metric, identified by its name, and split by the values of
+	its labels.
+	"""
+
+	metric_type: str = 'untyped'
+
+	def __init__(
+			self,
+			name: str,
+			documentation: str,
+			label_names: Sequence[str] = (),
+	):
+		self.name = name
+		self.documentation = documentation
+		self.label_names: Tuple[str, ...] = tuple(label_names)
+		self._lock: threading.Lock = threading.Lock()
+
+	def _labels(self, labels: Dict[str, str]) -> LabelValues:
+		if set(labels) != set(self.label_names):
+			raise ValueError(
+				f'The metric {self.name} expects the labels {self.label_names}, got {tuple(labels)}.'
+			)
+		return tuple(str(labels[name]) for name in self.label_names)
+
+	def _format_labels(
+		self,
+		values: LabelValues,
+		extra: Optional[Tuple[str, str]] = None,
+	) -> str:
+		pairs: List[Tuple[str, str]] = list(zip(self.label_names, values))
+		if extra is not None:
+			pairs.append(extra)
+		if len(pairs) == 0:
+			return ''
+		return '{' + ','.join(f'{name}="{_escape(value)}"'
+								for name, value in pairs) + '}'
+
+	def samples(self) -> List[str]:
+		raise NotImplementedError()
+
+	def render(self) -> str:
+		"""
+		Render the metric in the Prometheus text format.
+		"""
+		lines: List[str] = [
+			f'# HELP {self.name} {_escape(self.documentation)}',
+			f'# TYPE {self.name} {self.metric_type}',
+		]
+		lines.extend(self.samples())
+		return '\n'.join(lines) + '\n'
+
+
+class Counter(Metric):
+	"""
+	Metric that can only increase.
+	"""
+
+	metric_type = 'counter'
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._values: Dict[LabelValues, float] = {}
+
+	def inc(self, amount: Union[int, float] = 1, **labels: str) -> None:
+		key = self._labels(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0) + amount
+
+	def get(self, **labels: str) -> float:
+		with self._lock:
+			return self._values.get(self._labels(labels), 0)
+
+	def samples(self) -> List[str]:
+		with self._lock:
+			return [
+				f'{self.name}{self._format_labels(key)} {_format_value(value)}'
+				for key, value in self._values.items()
+			]
+
+
+class Gauge(Metric):
+	"""
+	Metric that can go up and down.
+	"""
+
+	metric_type = 'gauge'
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._values: Dict[LabelValues, float] = {}
+
+	def set(self, value: Union[int, float], **labels: str) -> None:
+		key = self._labels(labels)
+		with self._lock:
+			self._values[key] = value
+
+	def get(self, **labels: str) -> Optional[float]:
+		with self._lock:
+			return self._values.get(self._labels(labels))
+
+	def samples(self) -> List[str]:
+		with self._lock:
+			return [
+				f'{self.name}{self._format_labels(key)} {_format_value(value)}'
+				for key, value in self._values.items()
+			]
+
+
+class Histogram(Metric):
+	"""
+	Metric that counts the observations in cumulative buckets.
+	"""
+
+	metric_type = 'histogram'
+
+	def __init__(
+		self,
+		name: str,
+		documentation: str,
+		label_names: Sequence[str] = (),
+		buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+	):
+		super().__init__(name, documentation, label_names)
+		self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+		# For each label values: counts per bucket (the last one is +Inf), sum
+		self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+	def observe(self, value: Union[int, float], **labels: str) -> None:
+		key = self._labels(labels)
+		index: int = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			counts, total = self._values.setdefault(
+				key, ([0] * (len(self.buckets) + 1), [0.0]))
+			counts[index] += 1
+			total[0] += value
+
+	def count(self, **labels: str) -> int:
+		with self._lock:
+			counts, _ = self._values.get(self._labels(labels), ([], []))
+			return sum(counts)
+
+	def samples(self) -> List[str]:
+		lines: List[str] = []
+		with self._lock:
+			for key, (counts, total) in self._values.items():
+				cumulative: int = 0
+				for bound, count in zip(self.buckets + (math.inf,), counts):
+					cumulative += count
+					lines.append(
+						f'{self.name}_bucket{self._format_labels(key, ("le", _format_value(float(bound))))} {cumulative}'
+					)
+				lines.append(
+					f'{self.name}_sum{self._format_labels(key)} {_format_value(total[0])}'
+				)
+				lines.append(
+					f'{self.name}_count{self._format_labels(key)} {cumulative}')
+		return lines
+
+
+class MetricsRegistry:
+	"""
+	Collection of metrics, rendered together.
+	"""
+
+	def __init__(self):
+		self._metrics: Dict[str, Metric] = {}
+		self._lock: threading.Lock = threading.Lock()
+
+	def register(self, metric: Metric) -> Metric:
+		with self._lock:
+			if metric.name in self._metrics:
+				raise ValueError(
+					f'A metric named {metric.name} is already registered.')
+			self._metrics[metric.name] = metric
+		return metric
+
+	def counter(self, *args, **kwargs) -> Counter:
+		return self.register(Counter(*args, **kwargs))
+
+	def gauge(self, *args, **kwargs) -> Gauge:
+		return self.register(Gauge(*args, **kwargs))
+
+	def histogram(self, *args, **kwargs) -> Histogram:
+		return self.register(Histogram(*args, **kwargs))
+
+	def render(self) -> str:
+		"""
+		Render all the metrics in the Prometheus text format.
+		"""
+		with self._lock:
+			metrics = list(self._metrics.values())
+		return ''.join(metric.render() for metric in metrics)
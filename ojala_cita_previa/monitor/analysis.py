@@ -0,0 +1,477 @@
+#!/usr/bin/env python
+"""
+Uptime, outage and latency analytics over the probes recorded in an event log.
+
+Usage: `python -m ojala_cita_previa analyze [event log...] [--days DAYS] [--url URL]`.
+"""
+import argparse
+import json
+import operator
+import os
+import pathlib
+import sqlite3
+import sys
+import time
+from array import array
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+
+from ojala_cita_previa.io.event_log import filter_query
+from ojala_cita_previa.utils.stopwatch import Stopwatch
+
+try:
+	import numpy
+except ImportError:
+	# The analytics are computed in pure Python without it, only slower
+	numpy = None
+
+PERCENTILES: Sequence[float] = (50, 90, 99)
+# A gap between two probes longer than this is not counted in the uptime, the
+# program was probably stopped
+DEFAULT_MAX_GAP_S: float = 600
+# The number of rows read from the database at once
+_FETCH_SIZE: int = 65536
+
+_time = operator.itemgetter(0)
+_online = operator.itemgetter(1)
+_elapsed_s = operator.itemgetter(2)
+
+
+class ProbeColumns:
+	"""
+	The probes of an event log, stored by column in compact arrays: the probes
+	of each target are contiguous, and sorted by time. A duration that is not
+	known is stored as -1.
+
+	With NumPy, the columns are viewed as NumPy arrays without any copy.
+	"""
+
+	__slots__ = ('urls', 'offsets', 'time', 'online', 'elapsed_s')
+
+	def __init__(
+		self,
+		urls: List[str],
+		offsets: array,
+		time: array,
+		online: array,
+		elapsed_s: array,
+	):
+		"""
+		:param urls: The URL of each target.
+		:param offsets: The index of the first probe of each target, followed
+		by the number of probes.
+		:param time: The time of each probe, as a UNIX timestamp.
+		:param online: 1 if the target was online, 0 otherwise.
+		:param elapsed_s: The duration of each probe, in seconds, or -1.
+		"""
+		self.urls = urls
+		self.offsets = offsets
+		self.time = time
+		self.online = online
+		self.elapsed_s = elapsed_s
+
+	@classmethod
+	def load(
+		cls,
+		connection: sqlite3.Connection,
+		url: Optional[str] = None,
+		since: Optional[float] = None,
+	) -> 'ProbeColumns':
+		"""
+		Read the probes of an event log.
+		:param connection: The connection to the event log.
+		:param url: If given, only the probes of this target are read.
+		:param since: If given, only the probes since this UNIX timestamp are
+		read.
+		"""
+		count_query, parameters = filter_query(
+			'SELECT url, COUNT(*) FROM probes', url, since)
+		rows_query, _ = filter_query(
+			'SELECT time, online, IFNULL(elapsed_s, -1) FROM probes', url,
+			since)
+
+		urls: List[str] = []
+		offsets: array = array('q', [0])
+		times: array = array('d')
+		online: array = array('B')
+		elapsed_s: array = array('d')
+		# Both queries must see the same probes
+		connection.execute('BEGIN')
+		try:
+			for target, count in connection.execute(
+				count_query + ' GROUP BY url ORDER BY url', parameters):
+				urls.append(target)
+				offsets.append(offsets[-1] + count)
+			cursor: sqlite3.Cursor = connection.execute(
+				rows_query + ' ORDER BY url, time', parameters)
+			while True:
+				rows: List[tuple] = cursor.fetchmany(_FETCH_SIZE)
+				if len(rows) == 0:
+					break
+				times.extend(map(_time, rows))
+				online.extend(map(_online, rows))
+				elapsed_s.extend(map(_elapsed_s, rows))
+		finally:
+			connection.rollback()
+		return cls(urls, offsets, times, online, elapsed_s)
+
+	@classmethod
+	def merge(cls, columns: Sequence['ProbeColumns']) -> 'ProbeColumns':
+		"""
+		Merge the probes read from several event logs, like the ones of the
+		workers. The probes of a target found in several logs are sorted by time
+		again.
+		"""
+		if len(columns) == 1:
+			return columns[0]
+
+		probes: Dict[str, List[Tuple[float, int, float]]] = {}
+		for column in columns:
+			for index, url in enumerate(column.urls):
+				start, stop = column.bounds(index)
+				probes.setdefault(url, []).extend(
+					zip(column.time[start:stop], column.online[start:stop],
+						column.elapsed_s[start:stop]))
+
+		urls: List[str] = sorted(probes)
+		offsets: array = array('q', [0])
+		times: array = array('d')
+		online: array = array('B')
+		elapsed_s: array = array('d')
+		for url in urls:
+			rows: List[Tuple[float, int, float]] = sorted(probes[url])
+			offsets.append(offsets[-1] + len(rows))
+			times.extend(map(_time, rows))
+			online.extend(map(_online, rows))
+			elapsed_s.extend(map(_elapsed_s, rows))
+		return cls(urls, offsets, times, online, elapsed_s)
+
+	def bounds(self, index: int) -> Tuple[int, int]:
+		"""
+		Return the index of the first probe of the target at `index`, and the
+		index after its last probe.
+		"""
+		return self.offsets[index], self.offsets[index + 1]
+
+	def __len__(self) -> int:
+		return len(self.time)
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'ProbeColumns(targets: {len(self.urls)}, probes: {len(self)})'
+
+
+def percentiles(
+	values: Any,
+	wanted: Sequence[float] = PERCENTILES,
+) -> Dict[str, Optional[float]]:
+	"""
+	Compute the percentiles of `values` with the nearest-rank method, like
+	`DurationAggregator`. The keys are "p50", "p90"...
+	:param values: A sequence, or a NumPy array if NumPy is installed.
+	"""
+	count: int = len(values)
+	if count == 0:
+		return {f'p{p:g}': None for p in wanted}
+	ranks: List[int] = [max(1, int(-(-count * p // 100))) - 1 for p in wanted]
+	if numpy is not None:
+		# Only the wanted ranks are put in place, the rest is not sorted
+		ordered = numpy.partition(numpy.asarray(values, dtype=float), ranks)
+	else:
+		ordered = sorted(values)
+	return {f'p{p:g}': float(ordered[r]) for p, r in zip(wanted, ranks)}
+
+
+def _changes(online: Any, start: int, stop: int) -> List[int]:
+	"""
+	Return the indexes, between `start` and `stop`, of the probes whose status
+	differs from the previous probe.
+	"""
+	if numpy is not None:
+		status = online[start:stop]
+		return (
+			numpy.flatnonzero(status[1:] != status[:-1]) + start + 1).tolist()
+	return [i for i in range(start + 1, stop) if online[i] != online[i - 1]]
+
+
+def _uptime(
+	times: Any,
+	online: Any,
+	start: int,
+	stop: int,
+	max_gap_s: float,
+) -> Tuple[float, float]:
+	"""
+	Return the observed duration and the online duration of a target, in
+	seconds. Each status lasts until the next probe, at most `max_gap_s`.
+	"""
+	if stop - start < 2:
+		return 0.0, 0.0
+	if numpy is not None:
+		durations = numpy.minimum(numpy.diff(times[start:stop]), max_gap_s)
+		return float(durations.sum()), float(
+			durations[online[start:stop - 1] == 1].sum())
+	observed: float = 0.0
+	up: float = 0.0
+	for i in range(start, stop - 1):
+		duration: float = min(times[i + 1] - times[i], max_gap_s)
+		observed += duration
+		if online[i]:
+			up += duration
+	return observed, up
+
+
+def _latencies(elapsed_s: Any, start: int, stop: int) -> Any:
+	if numpy is not None:
+		latencies = elapsed_s[start:stop]
+		return latencies[latencies >= 0]
+	return [e for e in elapsed_s[start:stop] if e >= 0]
+
+
+def _distribution(durations: List[float]) -> Dict[str, Optional[float]]:
+	summary: Dict[str, Optional[float]] = {
+		'count': len(durations),
+		'mean': sum(durations) / len(durations) if len(durations) > 0 else None,
+		'max': max(durations) if len(durations) > 0 else None,
+	}
+	summary.update(percentiles(durations))
+	return summary
+
+
+def analyze(
+	columns: ProbeColumns,
+	max_gap_s: float = DEFAULT_MAX_GAP_S,
+) -> Dict[str, Any]:
+	"""
+	Compute the uptime, the outages, the recovery hours and the latency of each
+	target, and of all of them.
+
+	An outage is a run of offline probes between two online probes: its
+	duration goes from its first offline probe to the next online probe. The
+	runs at the beginning of the data are not counted, since their beginning
+	is not known, and the run at the end is reported as "ongoing".
+	:param columns: The probes.
+	:param max_gap_s: The gaps between two probes longer than this number of
+	seconds are not counted in the uptime.
+	:return: Returns the summary, JSON-compatible.
+	"""
+	stopwatch: Stopwatch = Stopwatch(start_now=True)
+	if numpy is not None:
+		times = numpy.frombuffer(columns.time, dtype=numpy.float64)
+		online = numpy.frombuffer(columns.online, dtype=numpy.uint8)
+		elapsed_s = numpy.frombuffer(columns.elapsed_s, dtype=numpy.float64)
+	else:
+		times, online, elapsed_s = columns.time, columns.online, columns.elapsed_s
+
+	targets: List[Dict[str, Any]] = []
+	all_outages: List[float] = []
+	all_recovery_hours: List[int] = [0] * 24
+	total_observed_s: float = 0.0
+	total_up_s: float = 0.0
+	for index, url in enumerate(columns.urls):
+		start, stop = columns.bounds(index)
+		observed_s, up_s = _uptime(times, online, start, stop, max_gap_s)
+		total_observed_s += observed_s
+		total_up_s += up_s
+
+		changes: List[int] = _changes(online, start, stop)
+		downs: List[int] = [i for i in changes if not online[i]]
+		ups: List[int] = [i for i in changes if online[i]]
+		if len(ups) > 0 and (len(downs) == 0 or ups[0] < downs[0]):
+			# The data begins during an outage
+			ups = ups[1:]
+		outages: List[float] = [
+			float(times[up] - times[down]) for down, up in zip(downs, ups)
+		]
+		ongoing_s: Optional[float] = None
+		if len(downs) > len(ups):
+			ongoing_s = float(times[stop - 1] - times[downs[-1]])
+		recovery_hours: List[int] = [0] * 24
+		for up in ups:
+			recovery_hours[time.localtime(float(times[up])).tm_hour] += 1
+		all_outages += outages
+		all_recovery_hours = [
+			a + b for a, b in zip(all_recovery_hours, recovery_hours)
+		]
+
+		latencies = _latencies(elapsed_s, start, stop)
+		targets.append({
+			'url': url,
+			'probes': stop - start,
+			'first': float(times[start]),
+			'last': float(times[stop - 1]),
+			'uptime': up_s / observed_s if observed_s > 0 else None,
+			'outages': _distribution(outages),
+			'ongoing_outage_s': ongoing_s,
+			'recovery_hours': recovery_hours,
+			'latency_s': percentiles(latencies),
+		})
+
+	elapsed: float = stopwatch.stop()
+	return {
+		'probes': len(columns),
+		'targets': targets,
+		'uptime': total_up_s / total_observed_s
+		if total_observed_s > 0 else None,
+		'outages': _distribution(all_outages),
+		'recovery_hours': all_recovery_hours,
+		'latency_s': percentiles(_latencies(elapsed_s, 0, len(columns))),
+		'elapsed_s': elapsed,
+		'backend': 'numpy' if numpy is not None else 'python',
+	}
+
+
+def format_duration(duration_s: Optional[float]) -> str:
+	if duration_s is None:
+		return '-'
+	if duration_s < 60:
+		return f'{duration_s:.1f}s'
+	minutes, seconds = divmod(int(duration_s), 60)
+	hours, minutes = divmod(minutes, 60)
+	days, hours = divmod(hours, 24)
+	if days > 0:
+		return f'{days}d{hours:02d}h'
+	if hours > 0:
+		return f'{hours}h{minutes:02d}m'
+	return f'{minutes}m{seconds:02d}s'
+
+
+def _format_uptime(uptime: Optional[float]) -> str:
+	return f'{uptime:.2%}' if uptime is not None else '-'
+
+
+def _format_latency(latency: Dict[str, Optional[float]]) -> str:
+	return ', '.join(
+		f'{name} {value:.3f}s' if value is not None else f'{name} -'
+		for name, value in latency.items())
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+	for target in summary['targets']:
+		outages: Dict[str, Any] = target['outages']
+		print(f'{target["url"]}')
+		print(
+			f'  {target["probes"]} probes, uptime {_format_uptime(target["uptime"])}'
+		)
+		print(
+			f'  {outages["count"]} outages: median {format_duration(outages["p50"])}, p90 {format_duration(outages["p90"])}, max {format_duration(outages["max"])}'
+			+ (f', ongoing for {format_duration(target["ongoing_outage_s"])}'
+				if target['ongoing_outage_s'] is not None else ''))
+		print(f'  Latency: {_format_latency(target["latency_s"])}')
+
+	hours: List[int] = summary['recovery_hours']
+	if sum(hours) > 0:
+		print('Recoveries by hour of the day:')
+		scale: float = 40 / max(hours)
+		for hour, count in enumerate(hours):
+			if count > 0:
+				print(
+					f'  {hour:02d}h {"#" * max(1, round(count * scale))} {count}'
+				)
+
+	outages = summary['outages']
+	print(
+		f'{summary["probes"]} probes of {len(summary["targets"])} targets analyzed in {summary["elapsed_s"]:.3f}s ({summary["backend"]}): uptime {_format_uptime(summary["uptime"])}, {outages["count"]} outages (median {format_duration(outages["p50"])}), latency {_format_latency(summary["latency_s"])}.'
+	)
+
+
+def _configured_event_logs() -> List[str]:
+	"""
+	Return the event logs of "ojala.yml". With several workers, each worker
+	writes its own event log, and the one of an earlier run with a single
+	worker is also read if it exists.
+	"""
+	# Imported here, since the configuration is only needed without a file
+	from ojala_cita_previa.config.file_config import FileConfig
+	try:
+		file_config: FileConfig = FileConfig.parse()
+	except FileNotFoundError:
+		return []
+	file_path: Optional[str] = file_config.event_log_file
+	if file_path is None:
+		return []
+	if file_config.workers is None or file_config.workers <= 1:
+		return [file_path]
+
+	from ojala_cita_previa.monitor.supervisor import worker_file_path
+	file_paths: List[str] = [
+		worker_file_path(file_path, index)
+		for index in range(file_config.workers)
+	]
+	if os.path.exists(file_path):
+		file_paths.insert(0, file_path)
+	return file_paths
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(
+		prog='ojala_cita_previa analyze',
+		description='Compute the uptime, the outages and the latency of the websites from the probes recorded in an event log.',
+	)
+	parser.add_argument(
+		'event_log',
+		type=str,
+		nargs='*',
+		help='The event log files, merged together. Defaults to the one of "ojala.yml", or to the ones of its workers.'
+	)
+	parser.add_argument(
+		'--days',
+		type=float,
+		default=None,
+		help='Only analyze the probes of the last days. Defaults to all of them.'
+	)
+	parser.add_argument(
+		'--url',
+		type=str,
+		default=None,
+		help='Only analyze the probes of this URL.')
+	parser.add_argument(
+		'--max-gap',
+		type=float,
+		default=DEFAULT_MAX_GAP_S,
+		help=f'The gaps between two probes longer than this number of seconds are not counted in the uptime. Defaults to {DEFAULT_MAX_GAP_S:g}.'
+	)
+	parser.add_argument(
+		'--json', action='store_true', help='Print the summary as JSON.')
+	args = parser.parse_args(argv)
+
+	file_paths: List[str] = args.event_log
+	if len(file_paths) == 0:
+		file_paths = _configured_event_logs()
+		if len(file_paths) == 0:
+			parser.error(
+				'No event log given, and none is configured in "ojala.yml".')
+
+	since: Optional[float] = time.time(
+	) - args.days * 86400 if args.days is not None else None
+	all_columns: List[ProbeColumns] = []
+	for file_path in file_paths:
+		connection: Optional[sqlite3.Connection] = None
+		try:
+			# Opened read-only, so a missing file is not created. The path is
+			# quoted in the URI, it can contain "?", "#" or "%"
+			connection = sqlite3.connect(
+				f'{pathlib.Path(file_path).absolute().as_uri()}?mode=ro',
+				uri=True)
+			all_columns.append(
+				ProbeColumns.load(connection, url=args.url, since=since))
+		except sqlite3.Error as e:
+			print(
+				f'Could not read the event log "{file_path}":\n{e}',
+				file=sys.stderr)
+			sys.exit(1)
+		finally:
+			if connection is not None:
+				connection.close()
+	columns: ProbeColumns = ProbeColumns.merge(all_columns)
+
+	summary: Dict[str, Any] = analyze(columns, max_gap_s=args.max_gap)
+	if args.json:
+		print(json.dumps(summary, indent=2))
+	else:
+		print_summary(summary)
+
+
+if __name__ == '__main__':
+	main()
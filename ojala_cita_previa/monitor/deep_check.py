@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+import re
+import threading
+import time
+import urllib.parse
+from html.parser import HTMLParser
+from typing import Optional, List, Tuple, Dict, Any, Sequence, Union, \
+ Mapping, Pattern, Callable
+
+import urllib3
+
+from ojala_cita_previa.io.session import Session
+from ojala_cita_previa.monitor.detection import DetectionResult, RuleEvaluator
+from ojala_cita_previa.monitor.rules import RuleSet, DetectionRule, \
+ RULE_ABSENT
+
+# The keys of a step in the configuration
+STEP_KEYS = ('name', 'url', 'method', 'fields', 'static', 'expect')
+
+
+class DeepCheckStep:
+	"""
+	A page of the appointment flow, requested by the deep check.
+	"""
+
+	def __init__(
+		self,
+		name: str,
+		url: str,
+		method: str = 'GET',
+		fields: Optional[Mapping[str, Any]] = None,
+		static: bool = False,
+		expect: Optional[str] = None,
+	):
+		"""
+		:param name: The name of the step, reported when it fails.
+		:param url: The URL of the page. A relative URL is resolved against the
+		URL of the target.
+		:param method: The HTTP method, "GET" or "POST".
+		:param fields: The fields sent with the request, along with the hidden
+		fields of the previous page.
+		:param static: `True` if the page does not depend on the session, like
+		the list of the provinces. It is only requested again once the cache
+		expires, or when the session is restarted.
+		:param expect: A regular expression that must be found in the page.
+		Otherwise, the session is considered expired and the flow restarts.
+		:raise ValueError: Raised if the step is invalid.
+		"""
+		method = method.upper()
+		if method not in ('GET', 'POST'):
+			raise ValueError(
+				f'Unknown method "{method}" for the step "{name}". Expected GET or POST.'
+			)
+
+		self.name = name
+		self.url = url
+		self.method = method
+		self.fields: Tuple[Tuple[str, str], ...] = tuple(
+			sorted((str(k), str(v)) for k, v in (fields or {}).items()))
+		self.static = static
+		self.expect = expect
+		self.pattern: Optional[Pattern] = None
+		if expect is not None:
+			try:
+				self.pattern = re.compile(expect)
+			except re.error as e:
+				raise ValueError(
+					f'Invalid regex for the step "{name}": {e}') from e
+
+	@classmethod
+	def from_config(
+		cls,
+		step: Union[Mapping[str, Any], Sequence[Tuple[str, Any]]],
+	) -> 'DeepCheckStep':
+		"""
+		Build a step from its configuration, a mapping or a sequence of
+		(key, value) pairs.
+		:raise ValueError: Raised if the step is invalid.
+		"""
+		options: Dict[str, Any] = dict(step)
+		unknown: List[str] = [key for key in options if key not in STEP_KEYS]
+		if len(unknown) > 0:
+			raise ValueError(
+				f'Unknown keys for a deep check step: {", ".join(unknown)}. Expected: {", ".join(STEP_KEYS)}.'
+			)
+		if options.get('name') is None or options.get('url') is None:
+			raise ValueError('A deep check step must have a name and a URL.')
+		if options.get('fields') is not None:
+			options['fields'] = dict(options['fields'])
+		return cls(**options)
+
+	def members(self) -> tuple:
+		return self.name, self.url, self.method, self.fields, self.static, self.expect
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, DeepCheckStep) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'DeepCheckStep(name: {self.name}, url: {self.url}, method: {self.method}, static: {self.static})'
+
+
+class _HiddenFieldsParser(HTMLParser):
+	"""
+	Collect the hidden fields of the forms of a page, like the CSRF tokens.
+	"""
+
+	def __init__(self):
+		super().__init__(convert_charrefs=True)
+		self.fields: Dict[str, str] = {}
+
+	def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+		if tag != 'input':
+			return
+		attributes: Dict[str, Optional[str]] = dict(attrs)
+		if (attributes.get('type') or
+			'').lower() == 'hidden' and attributes.get('name'):
+			self.fields[attributes['name']] = attributes.get('value') or ''
+
+
+def hidden_fields(page: str) -> Dict[str, str]:
+	"""
+	Return the hidden fields of the forms of `page`, by name.
+	"""
+	parser: _HiddenFieldsParser = _HiddenFieldsParser()
+	parser.feed(page)
+	parser.close()
+	return parser.fields
+
+
+class _Flow:
+	"""
+	The state of the deep check of a target: its session, and the hidden fields
+	of the static pages, with their expiration time.
+	"""
+
+	__slots__ = ('session', 'pages', 'lock')
+
+	def __init__(self):
+		self.session: Session = Session()
+		self.pages: Dict[int, Tuple[float, Dict[str, str]]] = {}
+		self.lock: threading.Lock = threading.Lock()
+
+	def restart(self) -> None:
+		self.session.clear()
+		self.pages.clear()
+
+
+# The message of the website when there is no appointment
+DEFAULT_SLOT_RULES: RuleSet = RuleSet([
+	DetectionRule(
+		name='no_slots',
+		regex=r'(?i)no hay citas disponibles',
+		expect=RULE_ABSENT,
+		reason='No appointment is available.',
+	)
+])
+
+
+class DeepChecker:
+	"""
+	Follow the appointment flow of the website (province, procedure, then
+	availability) with a persistent session, and check if appointments can
+	actually be booked.
+
+	The static pages of the flow are cached, so a deep check only requests the
+	dynamic pages. If a dynamic page fails, the session is considered expired:
+	the cookies and the cache are dropped, and the whole flow is followed again
+	once.
+	"""
+
+	def __init__(
+		self,
+		steps: Sequence[DeepCheckStep],
+		rules: RuleSet = DEFAULT_SLOT_RULES,
+		cache_ttl_s: float = 3600,
+		clock: Callable[[], float] = time.monotonic,
+	):
+		"""
+		:param steps: The pages of the flow, in order. The last one is the page
+		of the available appointments.
+		:param rules: The rules evaluated on the last page. The appointments are
+		available if they match.
+		:param cache_ttl_s: How long the static pages are cached, in seconds.
+		:param clock: The monotonic clock, in seconds.
+		:raise ValueError: Raised if there is no step.
+		"""
+		if len(steps) == 0:
+			raise ValueError('The deep check needs at least one step.')
+
+		self.steps: Tuple[DeepCheckStep, ...] = tuple(steps)
+		self.rules = rules
+		self.cache_ttl_s = cache_ttl_s
+		self.clock = clock
+		# The number of requests, of static pages read from the cache, and of
+		# restarted sessions
+		self.counts: Dict[str, int] = {
+			'request': 0,
+			'cached': 0,
+			'restart': 0,
+		}
+		self._flows: Dict[str, _Flow] = {}
+		self._lock: threading.Lock = threading.Lock()
+
+	@classmethod
+	def from_config(
+		cls,
+		steps: Sequence[Union[Mapping[str, Any], Sequence[Tuple[str, Any]]]],
+		rules: Optional[Sequence[Union[Mapping[str, Any],
+										Sequence[Tuple[str, Any]]]]] = None,
+		cache_ttl_s: float = 3600,
+	) -> 'DeepChecker':
+		"""
+		Build the deep check from its configuration. Without rules, the
+		appointments are available unless the page says otherwise.
+		:raise ValueError: Raised if a step or a rule is invalid.
+		"""
+		return cls(
+			[DeepCheckStep.from_config(step) for step in steps],
+			rules=RuleSet.from_config(rules)
+			if rules is not None and len(rules) > 0 else DEFAULT_SLOT_RULES,
+			cache_ttl_s=cache_ttl_s,
+		)
+
+	def _flow(self, url: str) -> _Flow:
+		with self._lock:
+			flow: Optional[_Flow] = self._flows.get(url)
+			if flow is None:
+				flow = _Flow()
+				self._flows[url] = flow
+			return flow
+
+	def _count(self, key: str) -> None:
+		with self._lock:
+			self.counts[key] += 1
+
+	def check(
+		self,
+		url: str,
+		timeout: Optional[urllib3.Timeout] = None,
+	) -> DetectionResult:
+		"""
+		Follow the flow of the target located at `url`.
+		:param url: The URL of the target.
+		:param timeout: The timeout of the requests.
+		:return: Returns the result of the rules on the last page, or an
+		offline result with the reason of the failure.
+		"""
+		flow: _Flow = self._flow(url)
+		with flow.lock:
+			result, expired = self._follow(url, flow, timeout)
+			if expired:
+				self._count('restart')
+				flow.restart()
+				result, _ = self._follow(url, flow, timeout)
+			return result
+
+	def _follow(
+		self,
+		url: str,
+		flow: _Flow,
+		timeout: Optional[urllib3.Timeout],
+	) -> Tuple[DetectionResult, bool]:
+		"""
+		Follow the flow once.
+		:return: Returns the result, and `True` if the session seems expired.
+		"""
+		now: float = self.clock()
+		fields: Dict[str, str] = {}
+		result: Optional[DetectionResult] = None
+		for index, step in enumerate(self.steps):
+			cached: Optional[Tuple[float, Dict[str,
+												str]]] = flow.pages.get(index)
+			if step.static and cached is not None and cached[0] > now:
+				fields = cached[1]
+				self._count('cached')
+				continue
+
+			request_fields: Dict[str, str] = dict(fields)
+			request_fields.update(step.fields)
+			self._count('request')
+			try:
+				response: urllib3.response.HTTPResponse = flow.session.request(
+					urllib.parse.urljoin(url, step.url),
+					method=step.method,
+					fields=request_fields if len(request_fields) > 0 else None,
+					timeout=timeout,
+				)
+			except (TimeoutError, urllib3.exceptions.HTTPError) as e:
+				return DetectionResult(
+					online=False,
+					reason=f'The deep check failed at the step "{step.name}": {e}'
+				), False
+
+			if not 200 <= response.status < 300:
+				return DetectionResult(
+					online=False,
+					reason=f'The step "{step.name}" of the deep check returned the HTTP code {response.status}.'
+				), True
+			page: str = response.data.decode('utf-8', errors='replace')
+			if step.pattern is not None and step.pattern.search(page) is None:
+				return DetectionResult(
+					online=False,
+					reason=f'The step "{step.name}" of the deep check returned an unexpected page.'
+				), True
+
+			if index == len(self.steps) - 1:
+				evaluator: RuleEvaluator = RuleEvaluator(self.rules)
+				evaluator.feed(page)
+				evaluator.close()
+				result = evaluator.result()
+			else:
+				fields = hidden_fields(page)
+				if step.static:
+					flow.pages[index] = (now + self.cache_ttl_s, fields)
+		return result, False
+
+	def forget(self, url: Optional[str] = None) -> None:
+		"""
+		Drop the sessions and the cached pages.
+		:param url: The URL of the target to forget. If `None`, all targets are
+		forgotten.
+		"""
+		with self._lock:
+			if url is None:
+				self._flows.clear()
+			else:
+				self._flows.pop(url, None)
+
+	def members(self) -> tuple:
+		return self.steps, self.rules, self.cache_ttl_s
+
+	def __eq__(self, other) -> bool:
+		return isinstance(other,
+							DeepChecker) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'DeepChecker(steps: {[step.name for step in self.steps]}, rules: {self.rules}, cache_ttl_s: {self.cache_ttl_s}, counts: {self.counts})'
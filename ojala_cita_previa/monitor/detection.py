@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+import codecs
+from html.parser import HTMLParser
+from typing import Optional, List, Tuple, Set, Iterator, Any
+
+import urllib3
+
+from ojala_cita_previa.io.compression import BodyReader
+from ojala_cita_previa.monitor.rules import RuleSet, DetectionRule, \
+ DEFAULT_RULES, Element
+
+STREAM_CHUNK_SIZE: int = 8 * 1024
+# The number of characters of text kept between two chunks, so a regex can
+# match a text split between them
+TEXT_WINDOW: int = 1024
+
+# The elements that never have children
+VOID_ELEMENTS = frozenset(
+	('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+		'param', 'source', 'track', 'wbr'))
+# The elements implicitly closed by a sibling of the same kind, like the
+# browsers do
+_SIBLING_CLOSED_ELEMENTS = frozenset(
+	('p', 'li', 'option', 'dt', 'dd', 'tr', 'td', 'th'))
+# The longest unparsed data kept in a comment or a script before it is trimmed
+_MAX_PENDING_CHARS: int = 4096
+
+
+class DetectionResult:
+	"""
+	Outcome of the detection rules on a webpage.
+	"""
+
+	def __init__(
+			self,
+			online: bool,
+			matched: Tuple[str, ...] = (),
+			reason: Optional[str] = None,
+	):
+		"""
+		:param online: `True` if all the "present" rules matched, and none of
+		the "absent" rules.
+		:param matched: The names of the rules that matched, sorted.
+		:param reason: Why the website is considered offline.
+		"""
+		self.online = online
+		self.matched = matched
+		self.reason = reason
+
+	def members(self) -> tuple:
+		return self.online, self.matched, self.reason
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, DetectionResult) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'DetectionResult(online: {self.online}, matched: {self.matched}, reason: {self.reason})'
+
+
+class RuleEvaluator(HTMLParser):
+	"""
+	Incremental HTML tokenizer that evaluates all the rules of a `RuleSet` in
+	a single pass over the page.
+
+	The page can be fed chunk by chunk, and `decided` tells when the result
+	can not change anymore. The tree walk of the "full" mode drives the same
+	evaluator with `start`, `end` and `text`.
+	"""
+
+	def __init__(self, rules: RuleSet = DEFAULT_RULES):
+		super().__init__(convert_charrefs=True)
+		self.rules = rules
+		self.matched: Set[str] = set()
+		# The open elements, only tracked if a selector needs the ancestors
+		self._stack: List[Element] = []
+		self._track_ancestors: bool = any(
+			rule.selector.needs_ancestors for rule in rules.element_rules)
+		self._pending_element_rules: List[DetectionRule] = list(
+			rules.element_rules)
+		self._pending_text_rules: List[DetectionRule] = list(rules.text_rules)
+		self._text: str = ''
+		self._decided: bool = False
+
+	def _match(self, rule: DetectionRule) -> None:
+		self.matched.add(rule.name)
+		if rule.expect == 'absent' or (len(self.rules.absent) == 0 and len(
+			self.matched) == len(self.rules.present)):
+			self._decided = True
+
+	@property
+	def decided(self) -> bool:
+		"""
+		`True` if the result can not change with the rest of the page: an
+		"absent" rule matched, or all the rules are "present" and they matched.
+		"""
+		return self._decided
+
+	def start(
+		self,
+		tag: str,
+		attrs: List[Tuple[str, Optional[str]]],
+		closed: bool = False,
+	) -> None:
+		"""
+		Handle an opening tag.
+		:param tag: The tag, in lower case.
+		:param attrs: The attributes.
+		:param closed: `True` if the element is closed right away ("<a/>").
+		"""
+		if self._decided:
+			return
+		element: Element = (tag, {
+			name: value if value is not None else '' for name, value in attrs
+		})
+		if len(self._pending_element_rules) > 0:
+			for rule in list(self._pending_element_rules):
+				if rule.selector.matches(element, self._stack):
+					self._pending_element_rules.remove(rule)
+					self._match(rule)
+
+		if self._track_ancestors and not closed and tag not in VOID_ELEMENTS:
+			if tag in _SIBLING_CLOSED_ELEMENTS and len(
+				self._stack) > 0 and self._stack[-1][0] == tag:
+				self._stack.pop()
+			self._stack.append(element)
+
+	def end(self, tag: str) -> None:
+		"""
+		Handle a closing tag. The elements opened after the matching opening tag
+		are closed too, and a closing tag without opening tag is ignored.
+		"""
+		if not self._track_ancestors:
+			return
+		for index in range(len(self._stack) - 1, -1, -1):
+			if self._stack[index][0] == tag:
+				del self._stack[index:]
+				return
+
+	def text(self, data: str) -> None:
+		"""
+		Handle the text of the page, outside of the scripts and the styles.
+		"""
+		if self._decided or len(self._pending_text_rules) == 0:
+			return
+		text: str = self._text + data
+		for rule in list(self._pending_text_rules):
+			if rule.pattern.search(text) is not None:
+				self._pending_text_rules.remove(rule)
+				self._match(rule)
+		self._text = text[-TEXT_WINDOW:]
+
+	def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+		self.start(tag, attrs)
+
+	def handle_startendtag(self, tag: str,
+							attrs: List[Tuple[str, Optional[str]]]):
+		self.start(tag, attrs, closed=True)
+
+	def handle_endtag(self, tag: str):
+		self.end(tag)
+
+	def handle_data(self, data: str):
+		if self.cdata_elem is None:
+			self.text(data)
+
+	def feed(self, data: str) -> None:
+		super().feed(data)
+		self._trim()
+
+	def _trim(self) -> None:
+		"""
+		Drop the unparsed content of an unterminated comment or script.
+		HTMLParser searches the end of a comment or of a script from its
+		beginning each time a chunk is fed, which is quadratic in the size of
+		the comment. Their content is never inspected, only their end matters.
+		"""
+		pending: str = self.rawdata
+		if len(pending) <= _MAX_PENDING_CHARS:
+			return
+		if pending.startswith('<!--'):
+			# The last characters may be the beginning of "-->" or "--!>"
+			self.rawdata = '<!-- ' + pending[-3:]
+		elif self.cdata_elem is not None:
+			# Keep what may be the beginning of the closing tag
+			start: int = pending.rfind('<')
+			self.rawdata = pending[start:] if start >= 0 and len(
+				pending) - start <= _MAX_PENDING_CHARS else ''
+
+	def result(self) -> DetectionResult:
+		"""
+		Return the result of the rules on the page fed so far.
+		"""
+		missing: List[DetectionRule] = [
+			rule for rule in self.rules.present if rule.name not in self.matched
+		]
+		unexpected: List[DetectionRule] = [
+			rule for rule in self.rules.absent if rule.name in self.matched
+		]
+		online: bool = len(missing) == 0 and len(unexpected) == 0
+		reason: Optional[str] = None
+		if not online:
+			reason = (unexpected + missing)[0].offline_reason()
+		return DetectionResult(
+			online=online, matched=tuple(sorted(self.matched)), reason=reason)
+
+
+def detect_document(
+	body: bytes,
+	rules: RuleSet = DEFAULT_RULES,
+) -> DetectionResult:
+	"""
+	Parse the whole webpage with BeautifulSoup, and evaluate the rules in a
+	single walk of the tree.
+	:param body: The content of the webpage.
+	:param rules: The detection rules.
+	:return: Returns the result of the rules.
+	"""
+	# Imported here, so the "stream" mode never loads BeautifulSoup
+	import bs4
+
+	soup = bs4.BeautifulSoup(body, features='html.parser')
+	evaluator: RuleEvaluator = RuleEvaluator(rules)
+	# Iterative walk, the pages can be too deep for a recursion
+	children: List[Iterator[Any]] = [iter(soup.children)]
+	tags: List[str] = []
+	while len(children) > 0 and not evaluator.decided:
+		child = next(children[-1], None)
+		if child is None:
+			children.pop()
+			if len(tags) > 0:
+				evaluator.end(tags.pop())
+		elif isinstance(child, bs4.element.Tag):
+			evaluator.start(
+				child.name,
+				[(name, ' '.join(value) if isinstance(value, list) else value)
+					for name, value in child.attrs.items()])
+			tags.append(child.name)
+			children.append(iter(child.children))
+		elif type(child) is bs4.element.NavigableString and (
+			child.parent is None or
+			child.parent.name not in ('script', 'style')):
+			evaluator.text(str(child))
+	return evaluator.result()
+
+
+def stream_detect(
+	response: urllib3.response.HTTPResponse,
+	rules: RuleSet = DEFAULT_RULES,
+	max_bytes: Optional[int] = None,
+	chunk_size: int = STREAM_CHUNK_SIZE,
+	captured: Optional[bytearray] = None,
+	reader: Optional[BodyReader] = None,
+) -> Tuple[DetectionResult, int, bool]:
+	"""
+	Read the body of `response` chunk by chunk, evaluate the rules while it is
+	read, and stop as soon as the result can not change, or once `max_bytes`
+	bytes have been read.
+
+	The response must have been requested with `preload_content=False`. A
+	compressed body is decompressed as it is read. Once the detection is over,
+	the rest of the body is neither parsed nor decompressed: a short rest is
+	drained so the connection can be reused by the next request, and the
+	connection of a long or slow one is closed, see `BodyReader.discard`.
+	:param response: The streamed response.
+	:param rules: The detection rules.
+	:param max_bytes: The maximum number of bytes to inspect. If `None`, the
+	whole body can be read.
+	:param chunk_size: The number of bytes to read at once.
+	:param captured: If given, the inspected bytes are appended to it.
+	:param reader: The reader of the body, which counts the bytes received.
+	Defaults to a new reader of `response`.
+	:return: Returns a tuple containing the result of the rules, the number of
+	bytes that have been inspected (once decompressed), and `True` if the whole
+	body has been inspected.
+	"""
+	# The markup is in ASCII, so decoding errors are harmless
+	charset: Optional[str] = None
+	content_type: str = response.headers.get('Content-Type', '')
+	for param in content_type.split(';')[1:]:
+		key, _, value = param.strip().partition('=')
+		if key.lower() == 'charset' and value:
+			charset = value.strip('"\'')
+	try:
+		decoder = codecs.getincrementaldecoder(charset or 'utf-8')(
+			errors='replace')
+	except LookupError:
+		decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+	if reader is None:
+		reader = BodyReader(response)
+	evaluator: RuleEvaluator = RuleEvaluator(rules)
+	bytes_read: int = 0
+	complete: bool = True
+	try:
+		for chunk in reader.chunks(chunk_size):
+			if max_bytes is not None and bytes_read + len(chunk) > max_bytes:
+				chunk = chunk[:max_bytes - bytes_read]
+			bytes_read += len(chunk)
+			if captured is not None:
+				captured += chunk
+			evaluator.feed(decoder.decode(chunk))
+			if evaluator.decided or (max_bytes is not None and
+										bytes_read >= max_bytes):
+				complete = False
+				break
+		else:
+			evaluator.feed(decoder.decode(b'', final=True))
+			evaluator.close()
+	finally:
+		reader.discard()
+		response.release_conn()
+
+	return evaluator.result(), bytes_read, complete
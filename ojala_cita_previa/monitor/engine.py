@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+import asyncio
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Callable, TYPE_CHECKING
+
+from ojala_cita_previa.metrics.monitor_metrics import MonitorMetrics
+from ojala_cita_previa.monitor.probe import ProbeResult, Prober
+from ojala_cita_previa.monitor.target import Target
+from ojala_cita_previa.utils.stopwatch import Stopwatch
+
+if TYPE_CHECKING:
+	from ojala_cita_previa.io.event_log import EventLog
+
+
+class MonitorEngine:
+	"""
+	Engine that probes several targets concurrently from a single process.
+
+	Each target is watched by its own asyncio task, and the blocking network
+	operations are executed in a thread pool. The number of probes in flight is
+	bounded by `max_concurrency`.
+	"""
+
+	def __init__(
+		self,
+		targets: List[Target],
+		prober: Prober,
+		max_concurrency: int = 10,
+		verbose: bool = False,
+		metrics: Optional[MonitorMetrics] = None,
+		event_log: Optional['EventLog'] = None,
+	):
+		self.targets = targets
+		self.prober = prober
+		self.max_concurrency = max_concurrency
+		self.verbose = verbose
+		self.metrics = metrics
+		self.event_log = event_log
+		self.keep_looping = True
+		self._loop: Optional[asyncio.AbstractEventLoop] = None
+		self._stop_event: Optional[asyncio.Event] = None
+
+	def run(self) -> None:
+		"""
+		Run the engine until `stop` is called.
+		"""
+		asyncio.run(self.run_async())
+
+	async def run_async(self) -> None:
+		"""
+		Coroutine that runs the engine until `stop` is called.
+		"""
+		self._loop = asyncio.get_running_loop()
+		self._stop_event = asyncio.Event()
+		if not self.keep_looping:
+			self._stop_event.set()
+
+		semaphore = asyncio.Semaphore(self.max_concurrency)
+		with ThreadPoolExecutor(
+			max_workers=self.max_concurrency,
+			thread_name_prefix='ojala-probe') as executor:
+			await asyncio.gather(*[
+				self._watch(target, semaphore, executor)
+				for target in self.targets
+			])
+
+		self._loop = None
+		self._stop_event = None
+
+	def stop(self) -> None:
+		"""
+		Ask the engine to stop. The probes in flight are completed first. This
+		method can be called from a signal handler or from another thread.
+		"""
+		self.keep_looping = False
+		if self._loop is not None and self._stop_event is not None:
+			self._loop.call_soon_threadsafe(self._stop_event.set)
+
+	def call_between_probes(self, callback: Callable[[], None]) -> None:
+		"""
+		Call `callback` from the event loop, between two probe iterations, so
+		the targets never observe a change that is partially applied. The
+		probes in flight complete with the previous settings. If the engine is
+		not running, `callback` is called right away. This method can be called
+		from another thread.
+		"""
+		loop: Optional[asyncio.AbstractEventLoop] = self._loop
+		if loop is not None:
+			try:
+				loop.call_soon_threadsafe(callback)
+				return
+			except RuntimeError:
+				# The loop has been closed meanwhile
+				pass
+		callback()
+
+	async def _watch(
+		self,
+		target: Target,
+		semaphore: asyncio.Semaphore,
+		executor: ThreadPoolExecutor,
+	) -> None:
+		"""
+		Probe `target` in a loop until the engine is stopped. If the probe
+		raises an exception, it is logged and counted as a failed probe.
+		"""
+		while self.keep_looping:
+			async with semaphore:
+				stopwatch: Stopwatch = Stopwatch(start_now=True)
+				try:
+					result: ProbeResult = await self._loop.run_in_executor(
+						executor, self.prober.probe, target.url)
+				except Exception as e:
+					# A bug in the probe of one target must not stop the others
+					print(
+						f'The probe of {target.url} failed:\n{traceback.format_exc()}',
+						file=sys.stderr)
+					result = ProbeResult(
+						online=False,
+						reason=f'The probe failed ({type(e).__name__}: {e}).',
+						elapsed_s=stopwatch.stop(),
+					)
+
+			if self.verbose:
+				print(f'Request to {target.url} took {result.elapsed_s:.2f}s.')
+
+			if self.metrics is not None:
+				self.metrics.observe_probe(target.url, result)
+
+			changed: bool = target.update(result)
+			if self.event_log is not None:
+				self.event_log.record_probe(target.url, result)
+				if changed:
+					self.event_log.record_transition(
+						target.url, result.online, reason=result.reason)
+			delay_s: float = target.scheduler.next_delay(
+				result, changed=changed)
+			if self.verbose:
+				print(f'Next request to {target.url} in {delay_s:.2f}s.')
+
+			# Wait for the next probe, unless the engine is stopped meanwhile
+			try:
+				await asyncio.wait_for(self._stop_event.wait(), timeout=delay_s)
+			except asyncio.TimeoutError:
+				pass
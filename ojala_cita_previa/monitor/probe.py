@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+import hashlib
+import threading
+from typing import Optional, Dict, Any, Tuple, TYPE_CHECKING
+
+import urllib3
+
+import ojala_cita_previa.io.network as net
+from ojala_cita_previa.io.compression import BodyReader
+from ojala_cita_previa.io.hedge import HedgedRequester, RetryBudget, \
+ BudgetedRetry
+from ojala_cita_previa.monitor.detection import DetectionResult, \
+ detect_document, stream_detect
+from ojala_cita_previa.monitor.rules import RuleSet, DEFAULT_RULES
+from ojala_cita_previa.utils.duration_aggregator import DurationAggregator
+from ojala_cita_previa.utils.stopwatch import Stopwatch
+
+if TYPE_CHECKING:
+	from ojala_cita_previa.monitor.deep_check import DeepChecker
+
+DETECTION_MODE_STREAM: str = 'stream'
+DETECTION_MODE_FULL: str = 'full'
+DETECTION_MODES = (DETECTION_MODE_STREAM, DETECTION_MODE_FULL)
+
+
+class ProbeResult:
+	"""
+	Outcome of a single probe of a website.
+	"""
+
+	def __init__(
+		self,
+		online: bool,
+		reason: Optional[str] = None,
+		http_status: Optional[int] = None,
+		elapsed_s: Optional[float] = None,
+		body_hash: Optional[bytes] = None,
+		reused: bool = False,
+		error: Optional[str] = None,
+		parse_s: Optional[float] = None,
+		hedged: bool = False,
+		matched: Tuple[str, ...] = (),
+		compressed_bytes: Optional[int] = None,
+		decompressed_bytes: Optional[int] = None,
+	):
+		"""
+		:param online: `True` if the appointment form is available.
+		:param reason: Why the website is considered offline.
+		:param http_status: The HTTP status code, or `None` if the server did
+		not answer.
+		:param elapsed_s: The duration of the probe, in seconds.
+		:param body_hash: The hash of the whole body, if it has been read.
+		:param reused: `True` if the content did not change since the previous
+		probe, and its detection result has been reused.
+		:param error: The kind of network error, if the request failed:
+		"timeout", "connection", "max_retry" or "read_error".
+		:param parse_s: The time spent inspecting the body, in seconds. In
+		"stream" mode, it includes the time spent downloading it.
+		:param hedged: `True` if the request has been sent a second time because
+		the first one was too slow.
+		:param matched: The names of the detection rules that matched the page.
+		:param compressed_bytes: The number of bytes of the body received, as
+		sent by the server.
+		:param decompressed_bytes: The number of bytes of the body once
+		decompressed. It is the same as `compressed_bytes` if the body is not
+		compressed.
+		"""
+		self.online = online
+		self.reason = reason
+		self.http_status = http_status
+		self.elapsed_s = elapsed_s
+		self.body_hash = body_hash
+		self.reused = reused
+		self.error = error
+		self.parse_s = parse_s
+		self.hedged = hedged
+		self.matched = matched
+		self.compressed_bytes = compressed_bytes
+		self.decompressed_bytes = decompressed_bytes
+
+	def reuse(
+		self,
+		http_status: Optional[int] = None,
+		elapsed_s: Optional[float] = None,
+		hedged: bool = False,
+		compressed_bytes: Optional[int] = None,
+		decompressed_bytes: Optional[int] = None,
+	) -> 'ProbeResult':
+		"""
+		Build a new result that reuses the detection of this one, for a content
+		that did not change.
+		:param http_status: The HTTP status code of the new response.
+		:param elapsed_s: The duration of the new probe, in seconds.
+		:param hedged: `True` if the new request has been hedged.
+		:param compressed_bytes: The number of bytes of the new body received.
+		:param decompressed_bytes: The number of bytes of the new body once
+		decompressed.
+		:return: Returns the new result.
+		"""
+		return ProbeResult(
+			online=self.online,
+			reason=self.reason,
+			http_status=http_status,
+			elapsed_s=elapsed_s,
+			body_hash=self.body_hash,
+			reused=True,
+			hedged=hedged,
+			matched=self.matched,
+			compressed_bytes=compressed_bytes,
+			decompressed_bytes=decompressed_bytes,
+		)
+
+	def members(self) -> tuple:
+		return self.online, self.reason, self.http_status, self.elapsed_s, self.body_hash, self.reused, self.error, self.parse_s, self.hedged, self.matched, self.compressed_bytes, self.decompressed_bytes
+
+	def __eq__(self, other) -> bool:
+		return isinstance(other,
+							ProbeResult) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'ProbeResult(online: {self.online}, reason: {self.reason}, http_status: {self.http_status}, elapsed_s: {self.elapsed_s}, body_hash: {self.body_hash.hex() if self.body_hash is not None else None}, reused: {self.reused}, error: {self.error}, parse_s: {self.parse_s}, hedged: {self.hedged}, matched: {self.matched}, compressed_bytes: {self.compressed_bytes}, decompressed_bytes: {self.decompressed_bytes})'
+
+
+def hash_body(body: bytes) -> bytes:
+	"""
+	Compute a fast hash of a response body, used to detect unchanged content.
+	:param body: The body.
+	:return: Returns the digest.
+	"""
+	return hashlib.blake2b(body, digest_size=16).digest()
+
+
+class Prober:
+	"""
+	Request a website and check if the appointment form is available.
+
+	Before probing any website, you need to initialize the network module with
+	`ojala_cita_previa.io.network.init`.
+	"""
+
+	def __init__(
+		self,
+		timeout: urllib3.Timeout,
+		detection_mode: str = DETECTION_MODE_STREAM,
+		stream_max_bytes: Optional[int] = None,
+		conditional_requests: bool = True,
+		retry_budget: Optional[RetryBudget] = None,
+		hedger: Optional[HedgedRequester] = None,
+		rules: RuleSet = DEFAULT_RULES,
+		deep_checker: Optional['DeepChecker'] = None,
+	):
+		"""
+		:param timeout: The timeout of the requests.
+		:param detection_mode: Either "stream" to inspect the body while it is
+		downloaded and stop as soon as the result is known, or "full" to
+		download the whole body and parse it with BeautifulSoup.
+		:param stream_max_bytes: In "stream" mode, the maximum number of bytes
+		to inspect before giving up. If `None`, the whole body can be read.
+		:param conditional_requests: If `True`, send conditional requests so
+		the server can answer "304 Not Modified", in which case the previous
+		detection result is reused.
+		:param retry_budget: If given, the retries of the requests are bounded
+		by this budget, on top of the retries allowed for each request.
+		:param hedger: If given, the requests that are slower than usual are
+		sent a second time, and the first response is used.
+		:param rules: The rules that tell if the appointment form is available.
+		They are all evaluated in a single pass over the page.
+		:param deep_checker: If given, when the appointment form is available,
+		the appointment flow is followed to check if appointments can actually
+		be booked.
+		"""
+		if detection_mode not in DETECTION_MODES:
+			raise ValueError(
+				f'Unknown detection mode "{detection_mode}". Expected one of: {", ".join(DETECTION_MODES)}.'
+			)
+
+		self.timeout = timeout
+		self.detection_mode = detection_mode
+		self.stream_max_bytes = stream_max_bytes
+		self.conditional_requests = conditional_requests
+		self.retry_budget = retry_budget
+		self.hedger = hedger
+		self.rules = rules
+		self.deep_checker = deep_checker
+
+		# The last result computed from an actual content, for each URL
+		self._content_results: Dict[str, ProbeResult] = {}
+		# The duration of all the probes
+		self.durations: DurationAggregator = DurationAggregator()
+		# The number of bytes of the bodies received, and once decompressed
+		self.transfer: Dict[str, int] = {
+			'compressed': 0,
+			'decompressed': 0,
+		}
+		self._transfer_lock: threading.Lock = threading.Lock()
+
+	def probe(self, url: str) -> ProbeResult:
+		"""
+		Probe the website located at `url`, then follow the appointment flow
+		with the deep check, if enabled and if the appointment form is
+		available.
+		:param url: The URL of the website to inspect.
+		:return: Returns the result of the probe.
+		"""
+		result: ProbeResult = self._probe_page(url)
+		if result.compressed_bytes is not None:
+			with self._transfer_lock:
+				self.transfer['compressed'] += result.compressed_bytes
+				self.transfer['decompressed'] += result.decompressed_bytes
+		if self.deep_checker is None or not result.online:
+			return result
+
+		stopwatch: Stopwatch = Stopwatch(start_now=True)
+		detection: DetectionResult = self.deep_checker.check(
+			url, timeout=self.timeout)
+		deep_check_s: float = stopwatch.stop()
+		return ProbeResult(
+			online=detection.online,
+			reason=detection.reason,
+			http_status=result.http_status,
+			elapsed_s=(result.elapsed_s or 0) + deep_check_s,
+			body_hash=result.body_hash,
+			reused=result.reused,
+			parse_s=result.parse_s,
+			hedged=result.hedged,
+			matched=result.matched + detection.matched,
+			compressed_bytes=result.compressed_bytes,
+			decompressed_bytes=result.decompressed_bytes,
+		)
+
+	def _probe_page(self, url: str) -> ProbeResult:
+		"""
+		Probe the website located at `url`.
+
+		If the content did not change since the last time it has been inspected
+		(the server answered "304 Not Modified", or the body has the same hash),
+		the previous detection result is reused and the page is not parsed
+		again.
+		:param url: The URL of the website to inspect.
+		:return: Returns the result of the probe.
+		"""
+		streaming: bool = self.detection_mode == DETECTION_MODE_STREAM
+		previous: Optional[ProbeResult] = self._content_results.get(url)
+		if previous is None:
+			# Without a previous result, a "304 Not Modified" could not be used
+			net.forget_validators(url)
+		request_stopwatch: Stopwatch = Stopwatch(
+			start_now=True, aggregator=self.durations)
+		request_kwargs: Dict[str, Any] = {
+			'timeout': self.timeout,
+			'conditional': self.conditional_requests,
+			# The body is read with a `BodyReader`, which counts the bytes
+			'preload_content': False,
+		}
+		if self.retry_budget is not None:
+			self.retry_budget.deposit()
+			request_kwargs['retries'] = BudgetedRetry(
+				urllib3.Retry.DEFAULT.total, budget=self.retry_budget)
+		response: Optional[urllib3.response.HTTPResponse] = None
+		error: Optional[str] = None
+		hedged: bool = False
+		try:
+			if self.hedger is not None:
+				response, hedged = self.hedger.request(url, **request_kwargs)
+			else:
+				response = net.request(url, **request_kwargs)
+		except TimeoutError:
+			error = 'timeout'
+		except urllib3.exceptions.MaxRetryError as e:
+			# Note that a refused connection is also a connection timeout
+			if isinstance(e.reason, urllib3.exceptions.NewConnectionError):
+				error = 'connection'
+			elif isinstance(e.reason, urllib3.exceptions.TimeoutError):
+				error = 'timeout'
+			else:
+				error = 'max_retry'
+		except urllib3.exceptions.TimeoutError:
+			error = 'timeout'
+
+		# Parse the response
+		if response is None:
+			elapsed_s: Optional[float] = request_stopwatch.stop()
+			return ProbeResult(
+				online=False,
+				reason=f'The request timed out ({elapsed_s:.2f}s).',
+				elapsed_s=elapsed_s,
+				error=error,
+				hedged=hedged,
+			)
+
+		# The content did not change, reuse the previous detection
+		if response.status == 304 and previous is not None:
+			response.drain_conn()
+			response.release_conn()
+			return previous.reuse(
+				http_status=response.status,
+				elapsed_s=request_stopwatch.stop(),
+				hedged=hedged)
+
+		reader: BodyReader = BodyReader(response)
+		# If success, try to parse the webpage
+		if 200 <= response.status < 300:
+			budget_exhausted: bool = False
+			whole_body: bool = True
+			detection: DetectionResult
+			body_hash: Optional[bytes] = None
+			parse_stopwatch: Stopwatch = Stopwatch(start_now=False)
+			# The inspected bytes, if the responses are captured
+			captured: Optional[bytearray] = bytearray() if net.capture_enabled(
+			) else None
+			try:
+				if streaming:
+					parse_stopwatch.start()
+					detection, bytes_read, whole_body = stream_detect(
+						response,
+						rules=self.rules,
+						max_bytes=self.stream_max_bytes,
+						captured=captured,
+						reader=reader)
+					# The result is only unknown if no "absent" rule matched
+					budget_exhausted = not detection.online and self.stream_max_bytes is not None and bytes_read >= self.stream_max_bytes and not any(
+						rule.name in detection.matched
+						for rule in self.rules.absent)
+				else:
+					try:
+						body: bytes = reader.read()
+					finally:
+						response.release_conn()
+					body_hash = hash_body(body)
+					if captured is not None:
+						captured += body
+					if previous is not None and previous.body_hash == body_hash:
+						result = previous.reuse(
+							http_status=response.status,
+							elapsed_s=request_stopwatch.stop(),
+							hedged=hedged,
+							compressed_bytes=reader.compressed_bytes,
+							decompressed_bytes=reader.decompressed_bytes)
+						self._capture(url, response, captured, result)
+						return result
+					parse_stopwatch.start()
+					detection = detect_document(body, rules=self.rules)
+			except (TimeoutError, urllib3.exceptions.HTTPError):
+				self._content_results.pop(url, None)
+				elapsed_s = request_stopwatch.stop()
+				return ProbeResult(
+					online=False,
+					reason=f'The response could not be read ({elapsed_s:.2f}s).',
+					http_status=response.status,
+					elapsed_s=elapsed_s,
+					error='read_error',
+					hedged=hedged,
+					compressed_bytes=reader.compressed_bytes,
+					decompressed_bytes=reader.decompressed_bytes,
+				)
+			parse_s: Optional[float] = parse_stopwatch.stop()
+			elapsed_s = request_stopwatch.stop()
+
+			reason: Optional[str] = detection.reason
+			if budget_exhausted:
+				reason = f'{reason.rstrip(".")} in the first {self.stream_max_bytes} bytes.'
+			result = ProbeResult(
+				online=detection.online,
+				reason=reason,
+				http_status=response.status,
+				elapsed_s=elapsed_s,
+				body_hash=body_hash,
+				parse_s=parse_s,
+				hedged=hedged,
+				matched=detection.matched,
+				compressed_bytes=reader.compressed_bytes,
+				decompressed_bytes=reader.decompressed_bytes,
+			)
+
+			self._content_results[url] = result
+			# In "stream" mode, the detection may have stopped before the end
+			self._capture(url, response, captured, result, complete=whole_body)
+			return result
+
+		error_body: bytes = b''
+		if net.capture_enabled():
+			try:
+				error_body = reader.read()
+			except (TimeoutError, urllib3.exceptions.HTTPError):
+				pass
+		reader.discard()
+		response.release_conn()
+		elapsed_s = request_stopwatch.stop()
+
+		result = ProbeResult(
+			online=False,
+			reason=f'The website returned the HTTP code {response.status}.',
+			http_status=response.status,
+			elapsed_s=elapsed_s,
+			hedged=hedged,
+			compressed_bytes=reader.compressed_bytes,
+			decompressed_bytes=reader.decompressed_bytes,
+		)
+		self._capture(url, response, error_body, result)
+		return result
+
+	def _capture(
+		self,
+		url: str,
+		response: urllib3.response.HTTPResponse,
+		body: Optional[bytes],
+		result: ProbeResult,
+		complete: bool = True,
+	) -> None:
+		"""
+		Write the response in the capture archive of the network module, along
+		with its detection result, if the capture mode is enabled.
+		"""
+		if body is None or not net.capture_enabled():
+			return
+		net.capture(
+			url,
+			response,
+			body=bytes(body),
+			elapsed_s=result.elapsed_s,
+			complete=complete,
+			online=result.online,
+			reason=result.reason,
+			matched=list(result.matched),
+			detection_mode=self.detection_mode,
+		)
+
+	def forget(self, url: Optional[str] = None) -> None:
+		"""
+		Forget the previous results, so the next probe inspects the content
+		again even if it did not change.
+		:param url: The URL to forget. If `None`, all URLs are forgotten.
+		"""
+		if url is None:
+			self._content_results.clear()
+		else:
+			self._content_results.pop(url, None)
+		net.forget_validators(url)
+		if self.deep_checker is not None:
+			self.deep_checker.forget(url)
+
+	def members(self) -> tuple:
+		return self.timeout, self.detection_mode, self.stream_max_bytes, self.conditional_requests, self.rules
+
+	def __eq__(self, other) -> bool:
+		return isinstance(other, Prober) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'Prober(timeout: {self.timeout}, detection_mode: {self.detection_mode}, stream_max_bytes: {self.stream_max_bytes}, conditional_requests: {self.conditional_requests})'
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""
+Replay the responses of a capture archive through the detection, at full
+speed, and report the responses whose detection result changed.
+
+Usage: `python -m ojala_cita_previa.monitor.replay <capture directory>`.
+"""
+import argparse
+import datetime
+import io
+import sys
+import time
+from typing import Optional, List, Dict, Any, Iterator
+
+import urllib3
+
+from ojala_cita_previa.io.capture import CapturedResponse, read_archive
+from ojala_cita_previa.monitor.detection import detect_document, \
+ stream_detect
+from ojala_cita_previa.monitor.probe import DETECTION_MODE_STREAM, \
+ DETECTION_MODES
+from ojala_cita_previa.monitor.rules import RuleSet, DEFAULT_RULES
+
+# The body of the captured responses is already decoded
+_IGNORED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+def detect(
+	captured: CapturedResponse,
+	detection_mode: str = DETECTION_MODE_STREAM,
+	stream_max_bytes: Optional[int] = None,
+	rules: RuleSet = DEFAULT_RULES,
+) -> bool:
+	"""
+	Run the detection on a captured response.
+	:param captured: The captured response.
+	:param detection_mode: The detection mode, "stream" or "full".
+	:param stream_max_bytes: In "stream" mode, the maximum number of bytes to
+	inspect.
+	:param rules: The detection rules.
+	:return: Returns `True` if the appointments are available.
+	"""
+	if not 200 <= captured.status < 300:
+		return False
+
+	if detection_mode != DETECTION_MODE_STREAM:
+		return detect_document(captured.body, rules=rules).online
+
+	headers: Dict[str, str] = {
+		name: value for name, value in captured.headers.items()
+		if name.lower() not in _IGNORED_HEADERS
+	}
+	response = urllib3.response.HTTPResponse(
+		body=io.BytesIO(captured.body),
+		headers=headers,
+		status=captured.status,
+		preload_content=False,
+	)
+	result, _, _ = stream_detect(
+		response, rules=rules, max_bytes=stream_max_bytes)
+	return result.online
+
+
+def replay(
+	responses: Iterator[CapturedResponse],
+	detection_mode: str = DETECTION_MODE_STREAM,
+	stream_max_bytes: Optional[int] = None,
+	url: Optional[str] = None,
+	rules: RuleSet = DEFAULT_RULES,
+) -> Dict[str, Any]:
+	"""
+	Replay the captured responses through the detection.
+	:param responses: The captured responses.
+	:param detection_mode: The detection mode, "stream" or "full".
+	:param stream_max_bytes: In "stream" mode, the maximum number of bytes to
+	inspect.
+	:param url: If given, only the responses of this URL are replayed.
+	:param rules: The detection rules.
+	:return: Returns a summary, with the list of the responses whose detection
+	result differs from the captured one under "mismatches".
+	"""
+	count: int = 0
+	online: int = 0
+	bytes_replayed: int = 0
+	mismatches: List[Dict[str, Any]] = []
+	begin: float = time.perf_counter()
+	for captured in responses:
+		if url is not None and captured.url != url:
+			continue
+
+		found: bool = detect(
+			captured,
+			detection_mode=detection_mode,
+			stream_max_bytes=stream_max_bytes,
+			rules=rules)
+		count += 1
+		online += 1 if found else 0
+		bytes_replayed += len(captured.body)
+
+		expected: Optional[bool] = captured.extra.get('online')
+		if expected is not None and expected != found:
+			mismatches.append({
+				'url': captured.url,
+				'time': captured.time,
+				'status': captured.status,
+				'captured_online': expected,
+				'captured_reason': captured.extra.get('reason'),
+				'replayed_online': found,
+				'complete': captured.complete,
+			})
+	elapsed_s: float = time.perf_counter() - begin
+
+	return {
+		'responses': count,
+		'online': online,
+		'bytes': bytes_replayed,
+		'elapsed_s': elapsed_s,
+		'responses_per_s': count / elapsed_s if elapsed_s > 0 else None,
+		'mismatches': mismatches,
+	}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(
+		prog='ojala_cita_previa.monitor.replay',
+		description='Replay the responses of a capture archive through the detection.',
+	)
+	parser.add_argument(
+		'directory', type=str, help='The directory of the capture archive.')
+	parser.add_argument(
+		'--detection-mode',
+		choices=DETECTION_MODES,
+		default=DETECTION_MODE_STREAM,
+		help='The detection mode. Defaults to "stream".')
+	parser.add_argument(
+		'--stream-max-bytes',
+		type=int,
+		default=None,
+		help='In "stream" mode, the maximum number of bytes to inspect. Defaults to the whole body.'
+	)
+	parser.add_argument(
+		'--url',
+		type=str,
+		default=None,
+		help='Only replay the responses of this URL.')
+	parser.add_argument(
+		'--config',
+		type=str,
+		default=None,
+		help='Use the detection rules of this configuration file. Defaults to the default rules.'
+	)
+	args = parser.parse_args(argv)
+
+	rules: RuleSet = DEFAULT_RULES
+	if args.config is not None:
+		# Imported here, since the configuration is only needed for this option
+		from ojala_cita_previa.config.file_config import FileConfig
+		rules = RuleSet.from_config(
+			FileConfig.parse(args.config).detection_rules)
+
+	summary: Dict[str, Any] = replay(
+		read_archive(args.directory),
+		detection_mode=args.detection_mode,
+		stream_max_bytes=args.stream_max_bytes,
+		url=args.url,
+		rules=rules,
+	)
+
+	for mismatch in summary['mismatches']:
+		date: str = datetime.datetime.fromtimestamp(mismatch['time']).isoformat(
+			sep=' ', timespec='seconds')
+		print(
+			f'[{date}] {mismatch["url"]} (HTTP {mismatch["status"]}): captured {"online" if mismatch["captured_online"] else "offline"}, replayed {"online" if mismatch["replayed_online"] else "offline"}{"" if mismatch["complete"] else " (partial body)"}. Captured reason: {mismatch["captured_reason"]}'
+		)
+	print(
+		f'{summary["responses"]} responses replayed in {summary["elapsed_s"]:.3f}s ({summary["responses_per_s"] or 0:.0f}/s, {summary["bytes"]} bytes), {summary["online"]} online, {len(summary["mismatches"])} mismatches.'
+	)
+	if len(summary['mismatches']) > 0:
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
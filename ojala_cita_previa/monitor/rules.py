@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+import re
+from typing import Optional, List, Tuple, Dict, Any, Sequence, Union, \
+ Mapping, Pattern
+
+RULE_PRESENT: str = 'present'
+RULE_ABSENT: str = 'absent'
+RULE_EXPECTATIONS = (RULE_PRESENT, RULE_ABSENT)
+
+# The keys of a rule in the configuration
+RULE_KEYS = ('name', 'selector', 'tag', 'attributes', 'regex', 'expect',
+				'reason')
+
+# An element, as seen by the selectors: its tag and its attributes
+Element = Tuple[str, Dict[str, str]]
+
+# A compound selector: the tag (or `None` for any tag), and the attribute
+# conditions as (attribute, operator, value)
+_Compound = Tuple[Optional[str], Tuple[Tuple[str, str, Optional[str]], ...]]
+
+_TOKEN_PATTERN = re.compile(
+	r'''
+	\s*(?P<combinator>[>,])\s*
+	| (?P<space>\s+)
+	| (?P<tag>[a-zA-Z][\w-]*|\*)
+	| \#(?P<id>[\w-]+)
+	| \.(?P<class>[\w-]+)
+	| \[\s*(?P<attribute>[\w:-]+)\s*(?:
+		(?P<operator>[~^$*|]?=)\s*
+		(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[^\s\]]+))\s*
+	)?\]
+''', re.VERBOSE)
+
+
+def _check_attribute(
+	attributes: Dict[str, str],
+	name: str,
+	operator: str,
+	expected: Optional[str],
+) -> bool:
+	value: Optional[str] = attributes.get(name)
+	if value is None:
+		return False
+	if operator == '':
+		return True
+	if operator == '=':
+		return value == expected
+	if operator == '~=':
+		return expected in value.split()
+	if operator == '^=':
+		return expected != '' and value.startswith(expected)
+	if operator == '$=':
+		return expected != '' and value.endswith(expected)
+	if operator == '*=':
+		return expected != '' and expected in value
+	# "|="
+	return value == expected or value.startswith(expected + '-')
+
+
+class Selector:
+	"""
+	A compiled CSS selector. Only a subset of CSS is supported: the tag names,
+	"*", "#id", ".class", the attribute selectors ("[a]", "[a=v]", "[a~=v]",
+	"[a^=v]", "[a$=v]", "[a*=v]", "[a|=v]"), the descendant (" ") and child
+	(">") combinators, and the groups (",").
+	"""
+
+	__slots__ = ('source', '_groups')
+
+	def __init__(self, source: str):
+		"""
+		:param source: The selector.
+		:raise ValueError: Raised if the selector is not supported.
+		"""
+		self.source = source
+		# Each group is a list of (combinator, compound), from left to right
+		self._groups: List[List[Tuple[str, _Compound]]] = []
+
+		group: List[Tuple[str, _Compound]] = []
+		combinator: str = ' '
+		tag: Optional[str] = None
+		conditions: List[Tuple[str, str, Optional[str]]] = []
+		in_compound: bool = False
+		position: int = 0
+		source = source.strip()
+
+		def close_compound() -> None:
+			nonlocal tag, conditions, in_compound, combinator
+			if in_compound:
+				group.append((combinator, (tag, tuple(conditions))))
+				combinator = ' '
+			tag, conditions, in_compound = None, [], False
+
+		while position < len(source):
+			match = _TOKEN_PATTERN.match(source, position)
+			if match is None or match.end() == position:
+				raise ValueError(
+					f'Unsupported selector "{self.source}" at position {position}.'
+				)
+			position = match.end()
+			if match.group('combinator') is not None or match.group(
+				'space') is not None:
+				had_compound: bool = in_compound
+				close_compound()
+				if match.group('combinator') == ',':
+					if len(group) == 0:
+						raise ValueError(f'Empty selector in "{self.source}".')
+					self._groups.append(group)
+					group = []
+				elif match.group('combinator') == '>':
+					if not had_compound and len(group) == 0:
+						raise ValueError(
+							f'The selector "{self.source}" starts with ">".')
+					combinator = '>'
+			elif match.group('tag') is not None:
+				if in_compound:
+					raise ValueError(
+						f'Misplaced tag name in the selector "{self.source}".')
+				tag = match.group(
+					'tag').lower() if match.group('tag') != '*' else None
+				in_compound = True
+			elif match.group('id') is not None:
+				conditions.append(('id', '=', match.group('id')))
+				in_compound = True
+			elif match.group('class') is not None:
+				conditions.append(('class', '~=', match.group('class')))
+				in_compound = True
+			else:
+				value: Optional[str] = next(
+					(match.group(g) for g in ('dq', 'sq', 'bare')
+						if match.group(g) is not None), None)
+				conditions.append((match.group('attribute').lower(),
+									match.group('operator') or '', value))
+				in_compound = True
+		close_compound()
+		if len(group) == 0:
+			raise ValueError(f'Empty selector in "{self.source}".')
+		self._groups.append(group)
+
+	@classmethod
+	def from_attributes(
+		cls,
+		tag: Optional[str],
+		attributes: Optional[Mapping[str, str]] = None,
+	) -> 'Selector':
+		"""
+		Build the selector that matches the elements with the given tag (any
+		tag if `None`) and exactly the given attribute values.
+		"""
+		selector: Selector = cls.__new__(cls)
+		selector.source = (tag or '*') + ''.join(
+			f'[{name}="{value}"]' for name, value in (attributes or {}).items())
+		selector._groups = [[
+			(' ', (tag.lower() if tag is not None else None,
+					tuple((name.lower(), '=', str(value))
+							for name, value in (attributes or {}).items())))
+		]]
+		return selector
+
+	@property
+	def needs_ancestors(self) -> bool:
+		"""
+		`True` if the selector has a combinator, so the ancestors of the elements
+		must be known to match it.
+		"""
+		return any(len(group) > 1 for group in self._groups)
+
+	@staticmethod
+	def _match_compound(compound: _Compound, element: Element) -> bool:
+		tag, conditions = compound
+		if tag is not None and element[0] != tag:
+			return False
+		return all(
+			_check_attribute(element[1], name, operator, value)
+			for name, operator, value in conditions)
+
+	def _match_group(
+		self,
+		group: List[Tuple[str, _Compound]],
+		index: int,
+		ancestors: Sequence[Element],
+		position: int,
+	) -> bool:
+		"""
+		Check if the compounds before `index` match the ancestors before
+		`position`, knowing that the compound at `index` matched the element
+		at `position`.
+		"""
+		if index == 0:
+			return True
+		combinator: str = group[index][0]
+		compound: _Compound = group[index - 1][1]
+		if combinator == '>':
+			return position > 0 and self._match_compound(
+				compound, ancestors[position - 1]) and self._match_group(
+					group, index - 1, ancestors, position - 1)
+		for parent in range(position - 1, -1, -1):
+			if self._match_compound(compound,
+									ancestors[parent]) and self._match_group(
+										group, index - 1, ancestors, parent):
+				return True
+		return False
+
+	def matches(self, element: Element, ancestors: Sequence[Element]) -> bool:
+		"""
+		Check if `element` matches the selector.
+		:param element: The element, with its tag in lower case.
+		:param ancestors: Its ancestors, from the root to its parent.
+		"""
+		path: List[Element] = list(ancestors) + [element]
+		for group in self._groups:
+			if self._match_compound(group[-1][1],
+									element) and self._match_group(
+										group,
+										len(group) - 1, path,
+										len(path) - 1):
+				return True
+		return False
+
+	def __eq__(self, other) -> bool:
+		return isinstance(other, Selector) and self.source == other.source
+
+	def __hash__(self) -> int:
+		return hash(self.source)
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'Selector({self.source})'
+
+
+class DetectionRule:
+	"""
+	A signal to look for in a webpage: an element matching a CSS selector, an
+	element with some attribute values, or a regular expression matching the
+	text of the page.
+
+	A rule is either expected to be "present" for the appointments to be
+	available (like the form of the appointments), or "absent" (like a
+	maintenance banner).
+	"""
+
+	def __init__(
+		self,
+		name: str,
+		selector: Optional[str] = None,
+		tag: Optional[str] = None,
+		attributes: Optional[Mapping[str, str]] = None,
+		regex: Optional[str] = None,
+		expect: str = RULE_PRESENT,
+		reason: Optional[str] = None,
+	):
+		"""
+		:param name: The name of the rule, reported in the detection result.
+		:param selector: A CSS selector, see `Selector`.
+		:param tag: A tag name, to match the elements with this tag and the
+		given attributes.
+		:param attributes: The exact values of the attributes of the element.
+		:param regex: A regular expression, searched in the text of the page
+		(outside of the scripts and the styles).
+		:param expect: "present" or "absent".
+		:param reason: The reason given when the website is offline because of
+		this rule. Defaults to a generic message.
+		:raise ValueError: Raised if the rule is invalid.
+		"""
+		if sum([
+			selector is not None, tag is not None or attributes is not None,
+			regex is not None
+		]) != 1:
+			raise ValueError(
+				f'The rule "{name}" must have either a selector, a tag and attributes, or a regex.'
+			)
+		if expect not in RULE_EXPECTATIONS:
+			raise ValueError(
+				f'Unknown expectation "{expect}" for the rule "{name}". Expected one of: {", ".join(RULE_EXPECTATIONS)}.'
+			)
+
+		self.name = name
+		self.expect = expect
+		self.reason = reason
+		self.attributes: Optional[Tuple[Tuple[str, str], ...]] = tuple(
+			sorted((str(k), str(v)) for k, v in
+					attributes.items())) if attributes is not None else None
+		self.tag = tag
+		self.regex = regex
+		self.selector: Optional[Selector] = None
+		self.pattern: Optional[Pattern] = None
+		if selector is not None:
+			self.selector = Selector(selector)
+		elif regex is not None:
+			try:
+				self.pattern = re.compile(regex)
+			except re.error as e:
+				raise ValueError(
+					f'Invalid regex for the rule "{name}": {e}') from e
+		else:
+			self.selector = Selector.from_attributes(
+				tag, dict(self.attributes or ()))
+
+	@classmethod
+	def from_config(
+		cls,
+		rule: Union[Mapping[str, Any], Sequence[Tuple[str, Any]]],
+	) -> 'DetectionRule':
+		"""
+		Build a rule from its configuration, a mapping or a sequence of
+		(key, value) pairs.
+		:raise ValueError: Raised if the rule is invalid.
+		"""
+		options: Dict[str, Any] = dict(rule)
+		unknown: List[str] = [key for key in options if key not in RULE_KEYS]
+		if len(unknown) > 0:
+			raise ValueError(
+				f'Unknown keys for a detection rule: {", ".join(unknown)}. Expected: {", ".join(RULE_KEYS)}.'
+			)
+		if options.get('name') is None:
+			raise ValueError('A detection rule must have a name.')
+		if options.get('attributes') is not None:
+			options['attributes'] = dict(options['attributes'])
+		return cls(**options)
+
+	def offline_reason(self) -> str:
+		if self.reason is not None:
+			return self.reason
+		if self.expect == RULE_PRESENT:
+			return f'The rule "{self.name}" did not match.'
+		return f'The rule "{self.name}" matched.'
+
+	def members(self) -> tuple:
+		return self.name, self.selector, self.attributes, self.tag, self.regex, self.expect, self.reason
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, DetectionRule) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'DetectionRule(name: {self.name}, selector: {self.selector.source if self.selector is not None else None}, regex: {self.regex}, expect: {self.expect})'
+
+
+class RuleSet:
+	"""
+	The rules of the detection, compiled once and evaluated together in a
+	single pass over the page (see `RuleEvaluator`).
+
+	The appointments are available if all the "present" rules match, and none
+	of the "absent" rules.
+	"""
+
+	def __init__(self, rules: Sequence[DetectionRule]):
+		"""
+		:raise ValueError: Raised if there is no rule, or if two rules have the
+		same name.
+		"""
+		if len(rules) == 0:
+			raise ValueError('The detection needs at least one rule.')
+		names: List[str] = [rule.name for rule in rules]
+		if len(set(names)) != len(names):
+			raise ValueError(
+				f'The names of the detection rules must be unique, got: {", ".join(names)}.'
+			)
+
+		self.rules: Tuple[DetectionRule, ...] = tuple(rules)
+		self.element_rules: Tuple[DetectionRule, ...] = tuple(
+			rule for rule in rules if rule.selector is not None)
+		self.text_rules: Tuple[DetectionRule, ...] = tuple(
+			rule for rule in rules if rule.pattern is not None)
+		self.present: Tuple[DetectionRule, ...] = tuple(
+			rule for rule in rules if rule.expect == RULE_PRESENT)
+		self.absent: Tuple[DetectionRule, ...] = tuple(
+			rule for rule in rules if rule.expect == RULE_ABSENT)
+
+	@classmethod
+	def from_config(
+		cls,
+		rules: Optional[Sequence[Union[Mapping[str, Any],
+										Sequence[Tuple[str, Any]]]]],
+	) -> 'RuleSet':
+		"""
+		Build the rule set from the configuration. Without rules, the default
+		rule set is returned.
+		:raise ValueError: Raised if a rule is invalid.
+		"""
+		if rules is None or len(rules) == 0:
+			return DEFAULT_RULES
+		return cls([DetectionRule.from_config(rule) for rule in rules])
+
+	def members(self) -> tuple:
+		return self.rules
+
+	def __eq__(self, other) -> bool:
+		return isinstance(other, RuleSet) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'RuleSet(rules: {[rule.name for rule in self.rules]})'
+
+
+# The historical detection: the select of the appointment form
+DEFAULT_RULES: RuleSet = RuleSet([
+	DetectionRule(
+		name='form',
+		selector='select#form[name="form"]',
+		reason='The dropdown-button could not be found.',
+	)
+])
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+import random
+import time
+from typing import Optional, Union
+
+from ojala_cita_previa.monitor.probe import ProbeResult
+
+
+class PollingScheduler:
+	"""
+	Compute the delay to wait before probing a target again.
+
+	The target is polled every `interval_s` seconds. When the server does not
+	answer, or answers with a server error, the delay grows exponentially up to
+	`max_interval_s`, so a struggling server is not flooded with requests.
+	Right after a change of status, the scheduler enters a "hot" mode during
+	`hot_duration_s` seconds where the delay is capped to `hot_interval_s`, to
+	quickly confirm the new status. A random jitter is applied to every delay
+	so that the targets do not synchronize.
+	"""
+
+	def __init__(
+		self,
+		interval_s: Union[int, float] = 5,
+		max_interval_s: Union[int, float] = 120,
+		backoff_factor: Union[int, float] = 2,
+		jitter_ratio: Union[int, float] = 0.1,
+		hot_interval_s: Union[int, float] = 1,
+		hot_duration_s: Union[int, float] = 30,
+		rng: Optional[random.Random] = None,
+	):
+		"""
+		:param interval_s: The base delay between two probes, in seconds.
+		:param max_interval_s: The maximum delay when backing off, in seconds.
+		:param backoff_factor: The factor applied to the delay after each
+		consecutive failure.
+		:param jitter_ratio: The maximum relative variation applied to each
+		delay. For instance, 0.1 means ±10%.
+		:param hot_interval_s: The maximum delay in hot mode, in seconds.
+		:param hot_duration_s: How long the hot mode lasts after a change of
+		status, in seconds.
+		:param rng: The random generator used for the jitter. Defaults to a new
+		`random.Random` instance.
+		"""
+		self.interval_s = interval_s
+		self.max_interval_s = max_interval_s
+		self.backoff_factor = backoff_factor
+		self.jitter_ratio = jitter_ratio
+		self.hot_interval_s = hot_interval_s
+		self.hot_duration_s = hot_duration_s
+		self._rng = rng if rng is not None else random.Random()
+		self._failures: int = 0
+		self._hot_until: Optional[float] = None
+
+	@staticmethod
+	def is_failure(result: ProbeResult) -> bool:
+		"""
+		Indicates if the server failed to answer the probe. A page that is
+		served without the form is not a failure, since the server answered.
+		:param result: The result of the probe.
+		:return: Returns `True` if the server timed out, or returned a server
+		error or a "429 Too Many Requests".
+		"""
+		return result.http_status is None or result.http_status >= 500 or result.http_status == 429
+
+	def is_hot(self) -> bool:
+		"""
+		Indicates if the scheduler is in hot mode.
+		"""
+		return self._hot_until is not None and time.monotonic(
+		) < self._hot_until
+
+	def _backoff_delay(self) -> float:
+		"""
+		Return the delay after the consecutive failures, before being capped.
+		"""
+		return self.interval_s * self.backoff_factor**(self._failures - 1)
+
+	def next_delay(self, result: ProbeResult, changed: bool = False) -> float:
+		"""
+		Compute the delay to wait before the next probe.
+		:param result: The result of the last probe.
+		:param changed: `True` if the last probe changed the status of the
+		target.
+		:return: Returns the delay, in seconds.
+		"""
+		if changed:
+			self._hot_until = time.monotonic() + self.hot_duration_s
+
+		if not self.is_failure(result):
+			self._failures = 0
+		elif self._failures == 0 or self._backoff_delay() < self.max_interval_s:
+			# The failures are not counted beyond the maximum delay, so the power
+			# can not overflow during a long outage
+			self._failures += 1
+
+		delay: float = self.interval_s
+		if self._failures > 0:
+			delay = min(self._backoff_delay(), self.max_interval_s)
+
+		if self.is_hot():
+			delay = min(delay, self.hot_interval_s)
+
+		if self.jitter_ratio > 0:
+			delay *= 1 + self._rng.uniform(-self.jitter_ratio,
+											self.jitter_ratio)
+
+		return max(delay, 0.0)
+
+	def reset(self) -> None:
+		"""
+		Forget the consecutive failures and leave the hot mode.
+		"""
+		self._failures = 0
+		self._hot_until = None
+
+	def members(self) -> tuple:
+		return self.interval_s, self.max_interval_s, self.backoff_factor, self.jitter_ratio, self.hot_interval_s, self.hot_duration_s
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, PollingScheduler) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'PollingScheduler(interval_s: {self.interval_s}, max_interval_s: {self.max_interval_s}, backoff_factor: {self.backoff_factor}, jitter_ratio: {self.jitter_ratio}, hot_interval_s: {self.hot_interval_s}, hot_duration_s: {self.hot_duration_s})'
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+import copy
+import multiprocessing
+import multiprocessing.process
+import os
+import signal
+import sys
+import threading
+import time
+from typing import List, Optional, Dict, Callable, Tuple, Any, NoReturn
+
+from ojala_cita_previa.config.global_config import GlobalConfig
+from ojala_cita_previa.notification import Notifier, get_notifier_from_args
+from ojala_cita_previa.notification.dispatcher import NotificationDispatcher, \
+ queue_notifier
+from ojala_cita_previa.utils.hash_ring import HashRing
+
+# An event sent by a worker: the URL of the target, the notifier method, and its
+# arguments
+Event = Tuple[str, str, tuple, Dict[str, Any]]
+
+
+class ForwardingNotifier(Notifier):
+	"""
+	Notifier of the targets of a worker process, that forwards the
+	notifications to the supervisor.
+	"""
+
+	def __init__(self, events: multiprocessing.Queue, website_url: str):
+		self.events = events
+		self.website_url = website_url
+
+	def success(self, *args, **kwargs) -> NoReturn:
+		self.events.put((self.website_url, 'success', args, kwargs))
+
+	def error(self, *args, **kwargs) -> NoReturn:
+		self.events.put((self.website_url, 'error', args, kwargs))
+
+	def members(self) -> tuple:
+		return self.website_url,
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, ForwardingNotifier) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'ForwardingNotifier(website_url: {self.website_url})'
+
+
+def worker_file_path(file_path: str, index: int) -> str:
+	"""
+	Return the path of the file of the worker `index`, derived from the file of
+	the supervisor: "events.db" becomes "events-0.db".
+	"""
+	root, extension = os.path.splitext(file_path)
+	return f'{root}-{index}{extension}'
+
+
+def worker_config(
+	config: GlobalConfig,
+	index: int,
+	targets: List[str],
+) -> GlobalConfig:
+	"""
+	Build the configuration of a worker process.
+
+	The worker only monitors its own targets, and its metrics, capture archive
+	and event log are written apart from the ones of the other workers: the
+	metrics server of the worker `index` listens to the port
+	`metrics_port + index`. Since the targets are always split the same way, a
+	restarted worker restores the statuses of its own targets from its event
+	log.
+	:param config: The configuration of the supervisor.
+	:param index: The index of the worker.
+	:param targets: The targets of the worker.
+	:return: Returns the configuration of the worker.
+	"""
+	worker: GlobalConfig = copy.copy(config)
+	worker.targets = tuple(targets)
+	worker.workers = 1
+	worker.reload_watch_interval_s = None
+	if config.metrics_port is not None:
+		worker.metrics_port = config.metrics_port + index
+	if config.metrics_file is not None:
+		worker.metrics_file = worker_file_path(config.metrics_file, index)
+	if config.event_log_file is not None:
+		worker.event_log_file = worker_file_path(config.event_log_file, index)
+	if config.capture_dir is not None:
+		worker.capture_dir = os.path.join(config.capture_dir, f'worker-{index}')
+		worker.capture_max_bytes = config.capture_max_bytes // config.workers
+	return worker
+
+
+def _run_worker(config: GlobalConfig, events: multiprocessing.Queue) -> None:
+	"""
+	Entry point of a worker process.
+	"""
+	# Imported here, since this module is imported by the main module
+	from ojala_cita_previa.__main__ import main
+
+	# Leave the process group of the terminal, so that Ctrl+C only reaches the
+	# supervisor, which then stops the workers one by one
+	if hasattr(os, 'setpgrp'):
+		os.setpgrp()
+	if not config.verbose:
+		sys.stdout = open(os.devnull, mode='w')
+
+	# Stop if the supervisor died without stopping the worker
+	parent_pid: int = os.getppid()
+
+	def watch_parent() -> None:
+		while os.getppid() == parent_pid:
+			time.sleep(1)
+		os.kill(os.getpid(), signal.SIGINT)
+
+	threading.Thread(
+		target=watch_parent, name='ojala-parent-watcher', daemon=True).start()
+
+	main(
+		config,
+		notifier_factory=lambda config, website_url: ForwardingNotifier(
+			events, website_url),
+		reload=False,
+	)
+
+
+class Supervisor:
+	"""
+	Monitor the targets from several worker processes.
+
+	The targets are split between the workers with consistent hashing, so a
+	target is always probed by the same worker. Each worker runs its own
+	`MonitorEngine`, and forwards the status changes of its targets to the
+	supervisor, which is the only one to send notifications: a change is
+	notified once, even if a crashed worker is restarted and reports the
+	status of its targets again.
+	"""
+
+	def __init__(
+		self,
+		config: GlobalConfig,
+		notifier_factory: Optional[Callable[..., Optional[Notifier]]] = None,
+		restart_delay_s: float = 1,
+		max_restart_delay_s: float = 60,
+		stop_timeout_s: float = 30,
+	):
+		"""
+		:param config: The configuration. The number of workers is given by
+		`config.workers`.
+		:param notifier_factory: The function that builds the notifier of each
+		target, called with the keyword arguments `config` and `website_url`.
+		Defaults to `get_notifier_from_args`.
+		:param restart_delay_s: The delay before restarting a worker that
+		exited, in seconds. It doubles after each consecutive restart.
+		:param max_restart_delay_s: The maximum delay before restarting a
+		worker, in seconds. A worker that ran for longer is considered healthy,
+		and its delay is reset.
+		:param stop_timeout_s: How long a worker can take to stop before being
+		terminated, in seconds.
+		"""
+		if config.workers < 1:
+			raise ValueError(
+				f'The number of workers must be at least 1, got {config.workers}.'
+			)
+		if notifier_factory is None:
+			notifier_factory = get_notifier_from_args
+
+		self.config = config
+		self.notifier_factory = notifier_factory
+		self.restart_delay_s = restart_delay_s
+		self.max_restart_delay_s = max_restart_delay_s
+		self.stop_timeout_s = stop_timeout_s
+
+		ring: HashRing = HashRing(range(config.workers))
+		self.shards: List[List[str]] = [[] for _ in range(config.workers)]
+		for url in config.targets:
+			self.shards[ring.get(url)].append(url)
+
+		# The workers are started from a fresh interpreter, so they do not
+		# inherit the threads of the supervisor
+		self._context = multiprocessing.get_context('spawn')
+		self._events: multiprocessing.Queue = self._context.Queue()
+		self._processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+		self._started_at: Dict[int, float] = {}
+		self._restarts: Dict[int, int] = {}
+		self._restart_at: Dict[int, float] = {}
+		# The last status notified for each target
+		self._statuses: Dict[str, bool] = {}
+		self._notifiers: Dict[str, Optional[Notifier]] = {}
+		self._stop_requested: bool = False
+
+	def _start_worker(self, index: int) -> None:
+		process = self._context.Process(
+			target=_run_worker,
+			args=(
+				worker_config(self.config, index, self.shards[index]),
+				self._events,
+			),
+			name=f'ojala-worker-{index}',
+			daemon=True,
+		)
+		process.start()
+		self._processes[index] = process
+		self._started_at[index] = time.monotonic()
+
+	def _check_workers(self) -> None:
+		"""
+		Schedule the restart of the workers that exited, and restart the ones
+		whose delay is over.
+		"""
+		now: float = time.monotonic()
+		for index, process in list(self._processes.items()):
+			if process.exitcode is None:
+				continue
+
+			if index not in self._restart_at:
+				if now - self._started_at[index] > self.max_restart_delay_s:
+					self._restarts[index] = 0
+				delay_s: float = min(
+					self.restart_delay_s * 2**self._restarts.get(index, 0),
+					self.max_restart_delay_s)
+				self._restarts[index] = self._restarts.get(index, 0) + 1
+				self._restart_at[index] = now + delay_s
+				print(
+					f'The worker {index} exited with the code {process.exitcode}, restarting it in {delay_s:.0f}s.',
+					file=sys.stderr)
+			elif now >= self._restart_at[index]:
+				del self._restart_at[index]
+				self._start_worker(index)
+
+	def _stop_workers(self) -> None:
+		for process in self._processes.values():
+			if process.exitcode is None and hasattr(os, 'setpgrp'):
+				os.kill(process.pid, signal.SIGINT)
+		for process in self._processes.values():
+			process.join(self.stop_timeout_s)
+			if process.exitcode is None:
+				process.terminate()
+				process.join()
+
+	def _forward(self) -> None:
+		"""
+		Send the notifications of the events forwarded by the workers, until
+		the `None` sentinel is received.
+		"""
+		while True:
+			event: Optional[Event] = self._events.get()
+			if event is None:
+				return
+
+			url, method, args, kwargs = event
+			online: bool = method == 'success'
+			# A restarted worker reports the status of its targets again
+			if self._statuses.get(url) == online:
+				continue
+			self._statuses[url] = online
+
+			notifier: Optional[Notifier] = self._notifiers.get(url)
+			if notifier is not None:
+				getattr(notifier, method)(*args, **kwargs)
+
+	def stop(self) -> None:
+		"""
+		Ask the supervisor to stop. This method can be called from a signal
+		handler.
+		"""
+		self._stop_requested = True
+
+	def run(self) -> None:
+		"""
+		Start the workers and supervise them until `stop` is called or the
+		program receives SIGINT.
+		"""
+		dispatcher: NotificationDispatcher = NotificationDispatcher(
+			max_size=self.config.notification_queue_size,
+			workers=self.config.notification_workers,
+			overflow=self.config.notification_overflow,
+		)
+		for url in self.config.targets:
+			self._notifiers[url] = queue_notifier(
+				self.notifier_factory(config=self.config, website_url=url),
+				dispatcher=dispatcher,
+				key=url)
+
+		forwarder = threading.Thread(
+			target=self._forward, name='ojala-forwarder', daemon=True)
+		forwarder.start()
+
+		for index, shard in enumerate(self.shards):
+			if len(shard) > 0:
+				self._start_worker(index)
+
+		# noinspection PyUnusedLocal
+		def handle_exit_signals(signum=None, frame=None) -> None:
+			if self._stop_requested:
+				print('Dropping the pending notifications...')
+				dispatcher.close(drain=False, timeout=0)
+				return
+			self.stop()
+			print('Stopping program...')
+
+		# noinspection PyUnusedLocal
+		def handle_reload_signal(signum=None, frame=None) -> None:
+			print(
+				'The configuration cannot be reloaded with several workers, restart the program to apply it.',
+				file=sys.stderr)
+
+		signal.signal(signal.SIGINT, handle_exit_signals)
+		if hasattr(signal, 'SIGHUP'):
+			signal.signal(signal.SIGHUP, handle_reload_signal)
+
+		print(
+			f'Stalking {len(self.config.targets)} websites with {len(self._processes)} workers... Press Ctrl+C to stop it.'
+		)
+		try:
+			while not self._stop_requested:
+				time.sleep(0.2)
+				self._check_workers()
+		except KeyboardInterrupt:
+			handle_exit_signals()
+
+		self._stop_workers()
+		self._events.put(None)
+		forwarder.join()
+
+		if dispatcher.pending() > 0:
+			print(
+				'Sending the pending notifications... Press Ctrl+C to skip them.'
+			)
+		dispatcher.close(drain=True)
+		for notifier in self._notifiers.values():
+			if notifier is not None:
+				notifier.close()
+
+		print('Goodbye!')
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'Supervisor(workers: {self.config.workers}, shards: {[len(shard) for shard in self.shards]})'
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+from typing import Optional
+
+from ojala_cita_previa.monitor.probe import ProbeResult
+from ojala_cita_previa.monitor.scheduler import PollingScheduler
+from ojala_cita_previa.notification.abstract_notifier import Notifier
+
+
+class Target:
+	"""
+	A website to monitor, along with its own notifier, its polling scheduler
+	and its last known status.
+	"""
+
+	def __init__(
+		self,
+		url: str,
+		notifier: Optional[Notifier] = None,
+		scheduler: Optional[PollingScheduler] = None,
+		last_status: Optional[bool] = None,
+	):
+		"""
+		:param url: The URL of the website.
+		:param notifier: The notifier of the status changes.
+		:param scheduler: The polling scheduler. Defaults to a new one.
+		:param last_status: The status restored from a previous run, so the
+		first probe only notifies if it changed since.
+		"""
+		self.url = url
+		self.notifier = notifier
+		if scheduler is None:
+			scheduler = PollingScheduler()
+		self.scheduler = scheduler
+		self.last_status: Optional[bool] = last_status
+
+	def update(self, result: ProbeResult) -> bool:
+		"""
+		Update the status of the target with the given probe result, and notify
+		the user if the status changed.
+		:param result: The result of the last probe.
+		:return: Returns `True` if the status of the target changed.
+		"""
+		if result.online and self.last_status is not True:
+			if self.notifier is not None:
+				self.notifier.success()
+			self.last_status = True
+			return True
+		elif not result.online and self.last_status is not False:
+			if self.notifier is not None:
+				self.notifier.error(reason=result.reason)
+			self.last_status = False
+			return True
+
+		return False
+
+	def members(self) -> tuple:
+		return self.url, self.notifier, self.scheduler, self.last_status
+
+	def __eq__(self, other) -> bool:
+		return isinstance(other, Target) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'Target(url: {self.url}, notifier: {self.notifier}, scheduler: {self.scheduler}, last_status: {self.last_status})'
@@ -1,12 +1,27 @@
 #!/usr/bin/env python
-from typing import List, Optional
+from typing import List, Optional, Any, Dict, Tuple
 
-from ojala_cita_previa.notification.email import EmailNotifier
-from ojala_cita_previa.notification.message import MessageNotifier
-from ojala_cita_previa.notification.sound import SoundNotifier
 from ojala_cita_previa.notification.broadcast_notifier import BroadcastNotifier
 from ojala_cita_previa.config.global_config import GlobalConfig as _GlobalConfig
 from ojala_cita_previa.notification.abstract_notifier import Notifier
+from ojala_cita_previa.notification.rate_limit import RateLimitedNotifier, \
+ shared_bucket
+from ojala_cita_previa.notification.registry import get_notifier_class, \
+ register_notifier, available_notifiers
+
+# The notifiers that used to be imported by this package, now loaded on demand
+_LAZY_NOTIFIERS: Dict[str, str] = {
+	'SoundNotifier': 'sound',
+	'MessageNotifier': 'message',
+	'EmailNotifier': 'email',
+	'WebhookNotifier': 'webhook',
+}
+
+
+def __getattr__(name: str) -> Any:
+	if name in _LAZY_NOTIFIERS:
+		return get_notifier_class(_LAZY_NOTIFIERS[name])
+	raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def get_notifier_from_args(
@@ -15,22 +30,47 @@ def get_notifier_from_args(
 ) -> Optional[Notifier]:
 	"""
 	Return the notifier the application should used based on the configuration.
+	Only the modules of the enabled notifiers are imported. The notifiers with
+	a rate limit are wrapped in a `RateLimitedNotifier`, whose bucket is shared
+	by all the targets that send to the same destination.
 	:param config: The configuration.
 	:param website_url: The URL of the website to inspect.
 	:return: Returns a Notifier, or None if the configuration specify no
 	notifiers.
 	"""
 	notifiers: List[Notifier] = []
+	rate_limits: Dict[str, Tuple[int, float]] = {
+		name: (burst, interval_s)
+		for name, burst, interval_s in config.notification_rate_limits or ()
+	}
+
+	def add(name: str, sink: tuple, notifier: Notifier) -> None:
+		"""
+		:param sink: The destination of the notifications, which the rate limit
+		applies to, like the SMTP account or the webhook URL.
+		"""
+		if name in rate_limits:
+			burst, interval_s = rate_limits[name]
+			notifier = RateLimitedNotifier(
+				notifier,
+				burst=burst,
+				interval_s=interval_s,
+				bucket=shared_bucket((name, *sink), burst, interval_s),
+			)
+		notifiers.append(notifier)
 
 	if config.sound_enabled:
-		notifiers.append(SoundNotifier())
+		add('sound', (), get_notifier_class('sound')())
 
 	if config.message_enabled:
-		notifiers.append(MessageNotifier(website_url=website_url))
+		add('message', (),
+			get_notifier_class('message')(website_url=website_url))
 
 	if config.email_enabled:
-		notifiers.append(
-			EmailNotifier(
+		add(
+			'email',
+			(config.email_host, config.email_port, config.email_username),
+			get_notifier_class('email')(
 				website_url=website_url,
 				recipients=config.email_recipients,
 				host=config.email_host,
@@ -39,7 +79,24 @@ def get_notifier_from_args(
 				password=config.email_password,
 				from_email=config.email_from_email,
 				timeout_s=config.email_timeout_s,
-			),)
+				keepalive_s=config.email_keepalive_s,
+				digest_window_s=config.email_digest_window_s,
+			))
+
+	if config.webhook_enabled:
+		if config.webhook_url is None:
+			raise ValueError('The webhook notifier needs a URL.')
+		add(
+			'webhook', (config.webhook_url,),
+			get_notifier_class('webhook')(
+				website_url=website_url,
+				url=config.webhook_url,
+				headers=dict(config.webhook_headers or ()),
+				timeout_s=config.webhook_timeout_s,
+				batch_window_s=config.webhook_batch_window_s,
+				max_retries=config.webhook_max_retries,
+				backoff_s=config.webhook_backoff_s,
+			))
 
 	if len(notifiers) == 0:
 		return None
@@ -16,6 +16,13 @@ class Notifier(abc.ABC):
 	def error(self, *args, **kwargs) -> NoReturn:
 		raise NotImplementedError()
 
+	def close(self) -> NoReturn:
+		"""
+		Release the resources held by the notifier. It must be called once the
+		notifier is no longer used.
+		"""
+		pass
+
 	@abc.abstractmethod
 	def members(self) -> tuple:
 		raise NotImplementedError()
@@ -25,6 +25,10 @@ class BroadcastNotifier(Notifier):
 		for notifier in self.notifiers:
 			notifier.error(*args, **kwargs)
 
+	def close(self) -> NoReturn:
+		for notifier in self.notifiers:
+			notifier.close()
+
 	def members(self) -> tuple:
 		return self.notifiers,
 
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+import collections
+import sys
+import threading
+import traceback
+from typing import Optional, Hashable, Deque, List, Set, Union, NoReturn
+
+from ojala_cita_previa.metrics.monitor_metrics import MonitorMetrics
+from ojala_cita_previa.notification.abstract_notifier import Notifier
+from ojala_cita_previa.notification.broadcast_notifier import BroadcastNotifier
+from ojala_cita_previa.notification.rate_limit import RateLimitedNotifier
+from ojala_cita_previa.utils.stopwatch import Stopwatch
+
+OVERFLOW_BLOCK: str = 'block'
+OVERFLOW_DROP_OLDEST: str = 'drop-oldest'
+OVERFLOW_COALESCE: str = 'coalesce'
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE)
+
+# The methods whose events can be coalesced, since only the latest status
+# matters
+_STATUS_METHODS = ('success', 'error')
+
+
+class _Event:
+	"""
+	A notification waiting to be sent.
+	"""
+
+	__slots__ = ('notifier', 'method', 'key', 'args', 'kwargs')
+
+	def __init__(
+		self,
+		notifier: Notifier,
+		method: str,
+		key: Optional[Hashable],
+		args: tuple,
+		kwargs: dict,
+	):
+		self.notifier = notifier
+		self.method = method
+		self.key = key
+		self.args = args
+		self.kwargs = kwargs
+
+
+class NotificationDispatcher:
+	"""
+	Bounded queue of notifications, consumed by a pool of worker threads, so
+	that a slow notifier never delays the probes.
+
+	The events that share the same key (generally the URL of the target) are
+	always sent in order, one at a time. When the queue is full, the overflow
+	policy decides what happens:
+
+	* "block": the caller waits until a slot is available.
+	* "drop-oldest": the oldest pending event is dropped.
+	* "coalesce": a pending event with the same key is replaced by the new one,
+	  since only the latest status matters. Without such an event, the oldest
+	  pending event is dropped.
+	"""
+
+	def __init__(
+		self,
+		max_size: int = 100,
+		workers: int = 2,
+		overflow: str = OVERFLOW_BLOCK,
+		metrics: Optional[MonitorMetrics] = None,
+	):
+		"""
+		:param max_size: The maximum number of pending events.
+		:param workers: The number of worker threads.
+		:param overflow: The overflow policy: "block", "drop-oldest" or
+		"coalesce".
+		:param metrics: If given, the time spent in each notifier is recorded
+		in it.
+		"""
+		if overflow not in OVERFLOW_POLICIES:
+			raise ValueError(
+				f'Unknown overflow policy "{overflow}". Expected one of: {", ".join(OVERFLOW_POLICIES)}.'
+			)
+		if max_size < 1:
+			raise ValueError(
+				f'The queue size must be at least 1, got {max_size}.')
+		if workers < 1:
+			raise ValueError(
+				f'The number of workers must be at least 1, got {workers}.')
+
+		self.max_size = max_size
+		self.workers = workers
+		self.overflow = overflow
+		self.metrics = metrics
+		# Number of events that have been dropped or replaced by a newer one
+		self.dropped: int = 0
+		self._queue: Deque[_Event] = collections.deque()
+		self._in_flight: Set[Hashable] = set()
+		self._condition: threading.Condition = threading.Condition()
+		self._accepting: bool = True
+		self._running: bool = True
+		self._threads: List[threading.Thread] = []
+		for i in range(workers):
+			thread = threading.Thread(
+				target=self._work,
+				name=f'ojala-notifier-{i}',
+				daemon=True,
+			)
+			thread.start()
+			self._threads.append(thread)
+
+	def submit(
+		self,
+		notifier: Notifier,
+		method: str,
+		key: Optional[Hashable] = None,
+		*args,
+		**kwargs,
+	) -> bool:
+		"""
+		Enqueue a call to `notifier.<method>(*args, **kwargs)`.
+		:param notifier: The notifier to call.
+		:param method: The name of the method to call, "success", "error" or
+		"close".
+		:param key: The key used to order and coalesce the events, generally
+		the URL of the target.
+		:return: Returns `False` if the dispatcher is closed and the event has
+		been ignored.
+		"""
+		event = _Event(notifier, method, key, args, kwargs)
+		with self._condition:
+			if not self._accepting:
+				return False
+
+			if len(self._queue) >= self.max_size:
+				if self.overflow == OVERFLOW_BLOCK:
+					self._condition.wait_for(lambda: len(self._queue) < self.
+												max_size or not self._accepting)
+					if not self._accepting:
+						return False
+				else:
+					if self.overflow == OVERFLOW_COALESCE and key is not None and method in _STATUS_METHODS:
+						for i, pending in enumerate(self._queue):
+							if pending.key == key and pending.notifier is notifier and pending.method in _STATUS_METHODS:
+								self._queue[i] = event
+								self.dropped += 1
+								self._condition.notify_all()
+								return True
+					self._queue.popleft()
+					self.dropped += 1
+
+			self._queue.append(event)
+			self._condition.notify_all()
+			return True
+
+	def _next_event(self) -> Optional[_Event]:
+		"""
+		Pop the first event whose key is not being sent by another worker.
+		Must be called with the condition acquired.
+		"""
+		for i, event in enumerate(self._queue):
+			if event.key is None or event.key not in self._in_flight:
+				del self._queue[i]
+				return event
+		return None
+
+	def _work(self) -> None:
+		while True:
+			with self._condition:
+				event: Optional[_Event] = None
+				while self._running:
+					event = self._next_event()
+					if event is not None or not self._accepting and len(
+						self._queue) == 0:
+						break
+					self._condition.wait()
+
+				if event is None:
+					return
+
+				if event.key is not None:
+					self._in_flight.add(event.key)
+				self._condition.notify_all()
+
+			stopwatch: Stopwatch = Stopwatch(start_now=True)
+			try:
+				getattr(event.notifier, event.method)(*event.args,
+														**event.kwargs)
+			except Exception:
+				print(
+					f'The notifier {event.notifier} failed:\n{traceback.format_exc()}',
+					file=sys.stderr)
+			finally:
+				duration_s: Optional[float] = stopwatch.stop()
+				if self.metrics is not None and duration_s is not None:
+					self.metrics.observe_notification(
+						notifier=type(event.notifier).__name__,
+						method=event.method,
+						duration_s=duration_s,
+					)
+				with self._condition:
+					if event.key is not None:
+						self._in_flight.discard(event.key)
+					self._condition.notify_all()
+
+	def pending(self) -> int:
+		"""
+		Return the number of events waiting to be sent.
+		"""
+		with self._condition:
+			return len(self._queue)
+
+	def close(
+		self,
+		drain: bool = True,
+		timeout: Union[int, float, None] = None,
+	) -> None:
+		"""
+		Stop accepting new events and stop the workers.
+		:param drain: If `True`, the pending events are sent before the workers
+		stop. Otherwise, they are dropped.
+		:param timeout: The maximum time to wait for each worker, in seconds.
+		If `None`, wait until they are done.
+		"""
+		with self._condition:
+			self._accepting = False
+			if not drain:
+				self.dropped += len(self._queue)
+				self._queue.clear()
+				self._running = False
+			self._condition.notify_all()
+
+		for thread in self._threads:
+			if thread is not threading.current_thread():
+				thread.join(timeout)
+
+	def members(self) -> tuple:
+		return self.max_size, self.workers, self.overflow
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other,
+			NotificationDispatcher) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'NotificationDispatcher(max_size: {self.max_size}, workers: {self.workers}, overflow: {self.overflow})'
+
+
+class QueuedNotifier(Notifier):
+	"""
+	Notifier that sends its notifications through a `NotificationDispatcher`,
+	so the caller never waits for the wrapped notifier.
+	"""
+
+	def __init__(
+		self,
+		notifier: Notifier,
+		dispatcher: NotificationDispatcher,
+		key: Optional[Hashable] = None,
+	):
+		"""
+		:param notifier: The wrapped notifier.
+		:param dispatcher: The dispatcher that sends the notifications.
+		:param key: The key used to order and coalesce the events, generally
+		the URL of the target.
+		"""
+		self.notifier = notifier
+		self.dispatcher = dispatcher
+		self.key = key
+
+	def success(self, *args, **kwargs) -> NoReturn:
+		"""
+		Queue the notification, or send it right away if the dispatcher is
+		closed, like the summary of a rate limit sent on shutdown.
+		"""
+		if not self.dispatcher.submit(self.notifier, 'success', self.key, *args,
+										**kwargs):
+			self.notifier.success(*args, **kwargs)
+
+	def error(self, *args, **kwargs) -> NoReturn:
+		"""
+		Queue the notification, or send it right away if the dispatcher is
+		closed.
+		"""
+		if not self.dispatcher.submit(self.notifier, 'error', self.key, *args,
+										**kwargs):
+			self.notifier.error(*args, **kwargs)
+
+	def close(self) -> NoReturn:
+		"""
+		Close the wrapped notifier once its pending notifications are sent, or
+		right away if the dispatcher is closed.
+		"""
+		if not self.dispatcher.submit(self.notifier, 'close', self.key):
+			self.notifier.close()
+
+	def members(self) -> tuple:
+		return self.notifier, self.key
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, QueuedNotifier) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'QueuedNotifier(notifier: {self.notifier}, key: {self.key})'
+
+
+def queue_notifier(
+	notifier: Optional[Notifier],
+	dispatcher: NotificationDispatcher,
+	key: Optional[Hashable] = None,
+) -> Optional[Notifier]:
+	"""
+	Wrap `notifier` so its notifications are sent by `dispatcher`. The notifiers
+	of a `BroadcastNotifier` are queued on their own, so a slow one does not
+	delay the others.
+	:param notifier: The notifier to wrap.
+	:param dispatcher: The dispatcher that sends the notifications.
+	:param key: The key used to order and coalesce the events, generally the
+	URL of the target.
+	:return: Returns the wrapped notifier, or `None` if `notifier` is `None`.
+	"""
+	if notifier is None:
+		return None
+	elif isinstance(notifier, BroadcastNotifier):
+		return BroadcastNotifier(notifiers=[
+			_queue_one(notifier=n, dispatcher=dispatcher, key=(key, i))
+			for i, n in enumerate(notifier.notifiers)
+		])
+	return _queue_one(notifier=notifier, dispatcher=dispatcher, key=key)
+
+
+def _queue_one(
+	notifier: Notifier,
+	dispatcher: NotificationDispatcher,
+	key: Optional[Hashable],
+) -> Notifier:
+	"""
+	Wrap a single notifier. A rate limit is applied before the queue, so the
+	suppressed notifications never take a slot, and the dispatcher still sees
+	the actual notifier.
+	"""
+	if not isinstance(notifier, RateLimitedNotifier):
+		return QueuedNotifier(notifier=notifier, dispatcher=dispatcher, key=key)
+	return RateLimitedNotifier(
+		QueuedNotifier(
+			notifier=notifier.notifier, dispatcher=dispatcher, key=key),
+		burst=notifier.burst,
+		interval_s=notifier.interval_s,
+		clock=notifier.clock,
+		name=notifier.name,
+		listener=notifier.listener if dispatcher.metrics is None else
+		dispatcher.metrics.observe_suppressed,
+		bucket=notifier.bucket,
+	)
@@ -5,13 +5,24 @@ import sys
 from email.header import Header
 from email.mime.text import MIMEText
 import smtplib
-import ssl
-from typing import Union, List, Optional, NoReturn
+import threading
+import time
+from typing import Union, List, Optional, NoReturn, Tuple
 
 from ojala_cita_previa.notification.abstract_notifier import Notifier
+from ojala_cita_previa.notification.rate_limit import suppressed_text
+from ojala_cita_previa.notification.smtp_session import SMTPSession, \
+ get_ssl_context, acquire_session, release_session
 
 
 class EmailNotifier(Notifier):
+	"""
+	Notifier that sends an email when a new change is detected.
+
+	In digest mode, the changes that happen within `digest_window_s` seconds
+	are sent together in a single email, with their timeline. The first
+	"online" event of a window is still sent immediately.
+	"""
 
 	def __init__(
 		self,
@@ -23,6 +34,8 @@ class EmailNotifier(Notifier):
 		password: str,
 		from_email: Optional[str] = None,
 		timeout_s: int = 10,
+		keepalive_s: Union[int, float, None] = 60,
+		digest_window_s: Union[int, float, None] = None,
 	):
 		self.website_url = website_url
 		self.recipients = recipients
@@ -32,6 +45,25 @@ class EmailNotifier(Notifier):
 		self.password = password
 		self.from_email = from_email
 		self.timeout_s = timeout_s
+		self.keepalive_s = keepalive_s
+		self.digest_window_s = digest_window_s
+
+		# Events of the current digest window, as (timestamp, online, reason,
+		# already sent)
+		self._digest_events: List[Tuple[float, bool, Optional[str], bool]] = []
+		self._digest_timer: Optional[threading.Timer] = None
+		self._digest_online_sent: bool = False
+		self._digest_lock: threading.Lock = threading.Lock()
+
+		# The SMTP connection is kept open and reused by all the emails
+		self.session: SMTPSession = acquire_session(
+			host=host,
+			port=port,
+			username=username,
+			password=password,
+			timeout_s=timeout_s,
+			keepalive_s=keepalive_s,
+		)
 
 	@staticmethod
 	def send_email(
@@ -44,6 +76,7 @@ class EmailNotifier(Notifier):
 		password: str,
 		from_email: Optional[str] = None,
 		timeout_s: int = 5,
+		session: Optional[SMTPSession] = None,
 	) -> NoReturn:
 		"""
 		Send an email using SMTP.
@@ -56,12 +89,17 @@ class EmailNotifier(Notifier):
 		:param password: The password to login to the SMTP server.
 		:param from_email: The "From" field of the server. Defaults to "username".
 		:param timeout_s: The timeout, in seconds. Default to 5s.
+		:param session: The SMTP session to reuse. If not given, a new
+		connection is opened and closed for this email only.
 		"""
 		if from_email is None:
 			from_email = username
 
 		if isinstance(recipients, str):
-			recipients = [recipients]
+			recipients = [
+				recipient.strip() for recipient in recipients.split(',')
+				if recipient.strip()
+			]
 
 		recipients: List[str]
 
@@ -72,19 +110,23 @@ class EmailNotifier(Notifier):
 		msg['To'] = ', '.join(recipients)
 
 		# send it via SMTP
-		context = ssl.create_default_context()
-
 		try:
-			with smtplib.SMTP(
-				host=host, port=port, timeout=timeout_s) as server:
-				server.ehlo()
-				server.starttls(context=context)
-				server.ehlo()
-				server.login(username, password)
-				failed_recipients: Optional[dict] = server.sendmail(
+			if session is not None:
+				failed_recipients: Optional[dict] = session.sendmail(
 					from_addr=msg['From'],
-					to_addrs=msg['To'],
+					to_addrs=recipients,
 					msg=msg.as_string())
+			else:
+				with smtplib.SMTP(
+					host=host, port=port, timeout=timeout_s) as server:
+					server.ehlo()
+					server.starttls(context=get_ssl_context())
+					server.ehlo()
+					server.login(username, password)
+					failed_recipients = server.sendmail(
+						from_addr=msg['From'],
+						to_addrs=recipients,
+						msg=msg.as_string())
 
 			if len(failed_recipients) > 0:
 				print(
@@ -96,11 +138,14 @@ class EmailNotifier(Notifier):
 			print(
 				f'Could not send the email because of the timeout:\n{e}',
 				file=sys.stderr)
+		except OSError as e:
+			print(
+				f'Could not connect to the SMTP server:\n{e}', file=sys.stderr)
 
-	def success(self, *args, **kwargs) -> NoReturn:
+	def _send(self, subject: str, content: str) -> NoReturn:
 		self.send_email(
-			subject='[Ojala Cita Previa] Website is online!',
-			content=f'The website {self.website_url} is online!',
+			subject=subject,
+			content=content,
 			recipients=self.recipients,
 			host=self.host,
 			port=self.port,
@@ -108,23 +153,106 @@ class EmailNotifier(Notifier):
 			password=self.password,
 			from_email=self.from_email,
 			timeout_s=self.timeout_s,
+			session=self.session,
 		)
 
-	def error(self, reason: Optional[str] = None, *args, **kwargs) -> NoReturn:
-		self.send_email(
+	def _add_to_digest(self, online: bool, reason: Optional[str]) -> bool:
+		"""
+		Add an event to the current digest window, and open a new window if
+		needed.
+		:param online: `True` if the website is online.
+		:param reason: Why the website is offline.
+		:return: Returns `True` if the event must be sent immediately instead.
+		"""
+		with self._digest_lock:
+			if self._digest_timer is None:
+				self._digest_online_sent = False
+				self._digest_timer = threading.Timer(self.digest_window_s,
+														self.flush_digest)
+				self._digest_timer.daemon = True
+				self._digest_timer.start()
+
+			send_now: bool = online and not self._digest_online_sent
+			if send_now:
+				self._digest_online_sent = True
+
+			self._digest_events.append((time.time(), online, reason, send_now))
+			return send_now
+
+	def flush_digest(self) -> NoReturn:
+		"""
+		Close the current digest window, and send its events in a single email.
+		"""
+		with self._digest_lock:
+			if self._digest_timer is not None:
+				self._digest_timer.cancel()
+				self._digest_timer = None
+			events = self._digest_events
+			self._digest_events = []
+
+		if all(sent for _, _, _, sent in events):
+			return
+		elif len(events) == 1:
+			_, online, reason, _ = events[0]
+			if online:
+				self._send_success()
+			else:
+				self._send_error(reason)
+			return
+
+		timeline: str = '\n'.join(
+			f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))} - '
+			+ ('online' if online else
+				f'offline{f": {reason}" if reason is not None else ""}') + (
+					' (already notified)' if sent else '')
+			for timestamp, online, reason, sent in events)
+		last_online: bool = events[-1][1]
+		self._send(
+			subject=f'[Ojala Cita Previa] Website is {"online!" if last_online else "offline"} ({len(events)} changes)',
+			content=f'The website {self.website_url} changed its status {len(events)} times:\n\n{timeline}',
+		)
+
+	def _send_success(self, suppressed: int = 0) -> NoReturn:
+		self._send(
+			subject='[Ojala Cita Previa] Website is online!',
+			content=f'The website {self.website_url} is online!{suppressed_text(suppressed)}',
+		)
+
+	def _send_error(
+		self,
+		reason: Optional[str] = None,
+		suppressed: int = 0,
+	) -> NoReturn:
+		self._send(
 			subject='[Ojala Cita Previa] Website is offline',
-			content=f'The website {self.website_url} is offline{f": {reason}" if reason is not None else "."}',
-			recipients=self.recipients,
-			host=self.host,
-			port=self.port,
-			username=self.username,
-			password=self.password,
-			from_email=self.from_email,
-			timeout_s=self.timeout_s,
+			content=f'The website {self.website_url} is offline{f": {reason}" if reason is not None else "."}{suppressed_text(suppressed)}',
 		)
 
+	# The summaries of a rate limit already stand for several events, so they
+	# are sent immediately instead of joining the digest
+
+	def success(self, *args, suppressed: int = 0, **kwargs) -> NoReturn:
+		if self.digest_window_s is None or suppressed > 0 or self._add_to_digest(
+			online=True, reason=None):
+			self._send_success(suppressed)
+
+	def error(
+		self,
+		reason: Optional[str] = None,
+		*args,
+		suppressed: int = 0,
+		**kwargs,
+	) -> NoReturn:
+		if self.digest_window_s is None or suppressed > 0 or self._add_to_digest(
+			online=False, reason=reason):
+			self._send_error(reason, suppressed)
+
+	def close(self) -> NoReturn:
+		self.flush_digest()
+		release_session(self.session)
+
 	def members(self) -> tuple:
-		return self.website_url, self.recipients, self.host, self.port, self.username, self.password, self.from_email, self.timeout_s
+		return self.website_url, self.recipients, self.host, self.port, self.username, self.password, self.from_email, self.timeout_s, self.keepalive_s, self.digest_window_s
 
 	def __eq__(self, other) -> bool:
 		return isinstance(
@@ -146,4 +274,6 @@ class EmailNotifier(Notifier):
 			f'password: {self.password}'
 			f'from_email: {self.from_email}'
 			f'timeout_s: {self.timeout_s}'
+			f'keepalive_s: {self.keepalive_s}'
+			f'digest_window_s: {self.digest_window_s}'
 		]) + ')'
@@ -2,6 +2,7 @@
 from typing import NoReturn, Optional
 
 from ojala_cita_previa.notification.abstract_notifier import Notifier
+from ojala_cita_previa.notification.rate_limit import suppressed_text
 
 
 class MessageNotifier(Notifier):
@@ -12,12 +13,20 @@ class MessageNotifier(Notifier):
 	def __init__(self, website_url: str):
 		self.website_url = website_url
 
-	def success(self, *args, **kwargs) -> NoReturn:
-		print(f'The website {self.website_url} is online!')
+	def success(self, *args, suppressed: int = 0, **kwargs) -> NoReturn:
+		print(
+			f'The website {self.website_url} is online!{suppressed_text(suppressed)}'
+		)
 
-	def error(self, reason: Optional[str] = None, *args, **kwargs) -> NoReturn:
+	def error(
+		self,
+		reason: Optional[str] = None,
+		*args,
+		suppressed: int = 0,
+		**kwargs,
+	) -> NoReturn:
 		print(
-			f'The website {self.website_url} is offline{f": {reason}" if reason is not None else "."}'
+			f'The website {self.website_url} is offline{f": {reason}" if reason is not None else "."}{suppressed_text(suppressed)}'
 		)
 
 	def members(self) -> tuple:
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+import threading
+import time
+from typing import Optional, NoReturn, Dict, Tuple, Callable, Hashable
+
+from ojala_cita_previa.notification.abstract_notifier import Notifier
+from ojala_cita_previa.utils.token_bucket import TokenBucket
+
+_buckets: Dict[tuple, TokenBucket] = {}
+_buckets_lock: threading.Lock = threading.Lock()
+
+
+def suppressed_text(suppressed: int) -> str:
+	"""
+	Return the text appended to a notification that summarizes `suppressed`
+	events, or an empty string if no event has been suppressed.
+	"""
+	if suppressed <= 0:
+		return ''
+	return f' ({suppressed} event{"s" if suppressed > 1 else ""} suppressed)'
+
+
+def shared_bucket(sink: Hashable, burst: int, interval_s: float) -> TokenBucket:
+	"""
+	Return the token bucket of `sink`, the destination of the notifications,
+	like an SMTP account or a webhook. The notifiers of all the targets that
+	send to the same sink share the same bucket, so the limit applies to the
+	sink, whatever the number of targets.
+	:param sink: The key of the destination.
+	:param burst: The capacity of the bucket.
+	:param interval_s: The time it takes to add a token, in seconds.
+	:return: Returns the shared bucket.
+	:raise ValueError: Raised if `burst` or `interval_s` is invalid.
+	"""
+	key: tuple = (sink, burst, interval_s)
+	with _buckets_lock:
+		bucket: Optional[TokenBucket] = _buckets.get(key)
+		if bucket is None:
+			bucket = TokenBucket(capacity=burst, interval_s=interval_s)
+			_buckets[key] = bucket
+		return bucket
+
+
+class RateLimitedNotifier(Notifier):
+	"""
+	Notifier that limits the notifications of another notifier with a token
+	bucket: at most `burst` notifications are sent at once, then one every
+	`interval_s` seconds.
+
+	The notifications sent while the bucket is empty are suppressed. Once a
+	token is available again, the latest suppressed notification is sent, with
+	the number of suppressed events in the `suppressed` keyword argument, so
+	the last status is never lost. The bucket can be shared with the notifiers
+	of other targets, see `shared_bucket`, while each notifier keeps its own
+	suppressed notification.
+	"""
+
+	def __init__(
+		self,
+		notifier: Notifier,
+		burst: int = 3,
+		interval_s: float = 60,
+		clock: Callable[[], float] = time.monotonic,
+		name: Optional[str] = None,
+		listener: Optional[Callable[[str], None]] = None,
+		bucket: Optional[TokenBucket] = None,
+	):
+		"""
+		:param notifier: The wrapped notifier.
+		:param burst: The number of notifications that can be sent at once.
+		:param interval_s: The time it takes to earn a new notification, in
+		seconds.
+		:param clock: The monotonic clock, in seconds.
+		:param name: The name of the wrapped notifier, given to `listener`.
+		Defaults to the name of its class.
+		:param listener: If given, it is called with `name` for each suppressed
+		notification.
+		:param bucket: The bucket to use, shared with other notifiers. If
+		`None`, a new bucket of `burst` tokens is created, using `clock`.
+		:raise ValueError: Raised if `burst` or `interval_s` is invalid.
+		"""
+		self.notifier = notifier
+		self.burst = burst
+		self.interval_s = interval_s
+		self.clock = clock
+		self.name: str = name if name is not None else type(notifier).__name__
+		self.listener = listener
+		self.bucket: TokenBucket = bucket if bucket is not None else TokenBucket(
+			capacity=burst, interval_s=interval_s, clock=clock)
+		# The number of notifications sent, of suppressed notifications, and of
+		# summaries sent once the bucket refilled
+		self.counts: Dict[str, int] = {
+			'sent': 0,
+			'suppressed': 0,
+			'summary': 0,
+		}
+		# The latest suppressed notification, as (method, args, kwargs), and the
+		# number of notifications suppressed since the last one sent
+		self._latest: Optional[Tuple[str, tuple, dict]] = None
+		self._suppressed: int = 0
+		self._timer: Optional[threading.Timer] = None
+		self._lock: threading.Lock = threading.Lock()
+
+	def _notify(self, method: str, args: tuple, kwargs: dict) -> None:
+		with self._lock:
+			if not self.bucket.try_acquire():
+				self._latest = (method, args, kwargs)
+				self._suppressed += 1
+				self.counts['suppressed'] += 1
+				if self._timer is None:
+					self._schedule()
+				if self.listener is not None:
+					self.listener(self.name)
+				return
+
+			# The bucket refilled before the timer fired
+			suppressed: int = self._pop()
+			self.counts['sent'] += 1
+		self._send(method, args, kwargs, suppressed)
+
+	def _schedule(self) -> None:
+		"""
+		Send the summary once a token is available. Must be called with the lock
+		acquired.
+		"""
+		self._timer = threading.Timer(self.bucket.wait_s(), self.flush)
+		self._timer.daemon = True
+		self._timer.start()
+
+	def _pop(self) -> int:
+		"""
+		Forget the suppressed notifications, and return their number. Must be
+		called with the lock acquired.
+		"""
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		suppressed: int = self._suppressed
+		self._latest = None
+		self._suppressed = 0
+		return suppressed
+
+	def _send(
+		self,
+		method: str,
+		args: tuple,
+		kwargs: dict,
+		suppressed: int,
+	) -> None:
+		if suppressed > 0:
+			kwargs = dict(kwargs, suppressed=suppressed)
+		getattr(self.notifier, method)(*args, **kwargs)
+
+	def flush(self, force: bool = False) -> None:
+		"""
+		Send the latest suppressed notification along with the number of
+		suppressed events, if a token is available.
+		:param force: If `True`, it is sent even if the bucket is empty.
+		"""
+		with self._lock:
+			self._timer = None
+			if self._latest is None:
+				return
+			if not force and not self.bucket.try_acquire():
+				self._schedule()
+				return
+			method, args, kwargs = self._latest
+			suppressed: int = self._pop()
+			self.counts['summary'] += 1
+		# The latest event is the one delivered, so it is not counted as suppressed
+		self._send(method, args, kwargs, suppressed - 1)
+
+	def success(self, *args, **kwargs) -> NoReturn:
+		self._notify('success', args, kwargs)
+
+	def error(self, *args, **kwargs) -> NoReturn:
+		self._notify('error', args, kwargs)
+
+	def close(self) -> NoReturn:
+		"""
+		Send the pending summary, so the last status is not lost, and close the
+		wrapped notifier.
+		"""
+		self.flush(force=True)
+		self.notifier.close()
+
+	def members(self) -> tuple:
+		return self.notifier, self.burst, self.interval_s
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, RateLimitedNotifier) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'RateLimitedNotifier(notifier: {self.notifier}, burst: {self.burst}, interval_s: {self.interval_s}, counts: {self.counts})'
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+import importlib
+import threading
+from typing import Dict, Type, Union, List, Optional
+
+from ojala_cita_previa.notification.abstract_notifier import Notifier
+
+# Entry point group where other packages can declare their notifiers, as
+# "name = package.module:Class"
+ENTRY_POINT_GROUP: str = 'ojala_cita_previa.notifiers'
+
+# Location of each notifier, as "module:Class". The modules are only imported
+# when the notifier is used, so the dependencies of a disabled notifier (such
+# as the audio stack of the sound notifier) are never loaded.
+_registry: Dict[str, Union[str, Type[Notifier]]] = {
+	'sound': 'ojala_cita_previa.notification.sound:SoundNotifier',
+	'message': 'ojala_cita_previa.notification.message:MessageNotifier',
+	'email': 'ojala_cita_previa.notification.email:EmailNotifier',
+	'webhook': 'ojala_cita_previa.notification.webhook:WebhookNotifier',
+	'broadcast': 'ojala_cita_previa.notification.broadcast_notifier:BroadcastNotifier',
+}
+_lock: threading.Lock = threading.Lock()
+_entry_points_loaded: bool = False
+
+
+def register_notifier(name: str, notifier: Union[str, Type[Notifier]]) -> None:
+	"""
+	Register a notifier under `name`, replacing any notifier with the same name.
+	:param name: The name of the notifier.
+	:param notifier: The notifier class, or its location as "module:Class" to
+	import it only when it is used.
+	"""
+	with _lock:
+		_registry[name] = notifier
+
+
+def _load_entry_points() -> None:
+	"""
+	Register the notifiers declared by the installed packages. Must be called
+	with the lock acquired.
+	"""
+	global _entry_points_loaded
+	if _entry_points_loaded:
+		return
+	_entry_points_loaded = True
+
+	# Imported here, since it is slow to import
+	from importlib import metadata
+	entry_points = metadata.entry_points()
+	if hasattr(entry_points, 'select'):
+		group = entry_points.select(group=ENTRY_POINT_GROUP)
+	else:
+		group = entry_points.get(ENTRY_POINT_GROUP, ())
+	for entry_point in group:
+		_registry.setdefault(entry_point.name, entry_point.value)
+
+
+def get_notifier_class(name: str) -> Type[Notifier]:
+	"""
+	Return the notifier class registered under `name`, importing its module if
+	needed.
+	:param name: The name of the notifier.
+	:return: Returns the class.
+	:raise ValueError: Raised if no notifier is registered under `name`.
+	"""
+	with _lock:
+		notifier: Optional[Union[str, Type[Notifier]]] = _registry.get(name)
+		if notifier is None:
+			_load_entry_points()
+			notifier = _registry.get(name)
+	if notifier is None:
+		raise ValueError(
+			f'Unknown notifier "{name}". Expected one of: {", ".join(available_notifiers())}.'
+		)
+	if not isinstance(notifier, str):
+		return notifier
+
+	module_name, _, class_name = notifier.partition(':')
+	module = importlib.import_module(module_name)
+	notifier_class: Type[Notifier] = getattr(module, class_name)
+	with _lock:
+		_registry[name] = notifier_class
+	return notifier_class
+
+
+def available_notifiers() -> List[str]:
+	"""
+	Return the names of the registered notifiers, without importing them.
+	"""
+	with _lock:
+		_load_entry_points()
+		return sorted(_registry)
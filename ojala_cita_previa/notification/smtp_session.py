@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import smtplib
+import ssl
+import threading
+from typing import Optional, List, Union, Dict, Tuple
+
+_ssl_context: Optional[ssl.SSLContext] = None
+_ssl_context_lock: threading.Lock = threading.Lock()
+
+# Sessions shared between the notifiers, with their number of users
+_sessions: Dict[tuple, Tuple['SMTPSession', int]] = {}
+_sessions_lock: threading.Lock = threading.Lock()
+
+
+def get_ssl_context() -> ssl.SSLContext:
+	"""
+	Return the SSL context used by STARTTLS. It is created once, and then shared
+	by all SMTP connections.
+	:return: Returns the default SSL context.
+	"""
+	global _ssl_context
+	with _ssl_context_lock:
+		if _ssl_context is None:
+			_ssl_context = ssl.create_default_context()
+		return _ssl_context
+
+
+class SMTPSession:
+	"""
+	Long-lived, authenticated SMTP connection.
+
+	The connection is opened on the first email, and then reused by the next
+	ones. While idle, a background thread sends a NOOP command every
+	`keepalive_s` seconds to keep it warm, and reconnects if the server closed
+	it. If the server closed the connection anyway, the email is sent again on
+	a new connection.
+	"""
+
+	def __init__(
+		self,
+		host: str,
+		port: int,
+		username: str,
+		password: str,
+		timeout_s: Union[int, float] = 10,
+		keepalive_s: Union[int, float, None] = 60,
+	):
+		"""
+		:param host: The host of the server.
+		:param port: The SMTP port of the server.
+		:param username: The username to login to the SMTP server.
+		:param password: The password to login to the SMTP server.
+		:param timeout_s: The timeout, in seconds. Default to 10s.
+		:param keepalive_s: The delay between two NOOP commands, in seconds. If
+		`None`, no NOOP command is sent, and the connection is only checked
+		before sending an email.
+		"""
+		self.host = host
+		self.port = port
+		self.username = username
+		self.password = password
+		self.timeout_s = timeout_s
+		self.keepalive_s = keepalive_s
+		self._server: Optional[smtplib.SMTP] = None
+		self._lock: threading.RLock = threading.RLock()
+		self._closed: threading.Event = threading.Event()
+		self._keepalive_thread: Optional[threading.Thread] = None
+
+	def _connect(self) -> smtplib.SMTP:
+		"""
+		Open and authenticate a new connection.
+		:return: Returns the SMTP connection.
+		"""
+		server = smtplib.SMTP(
+			host=self.host, port=self.port, timeout=self.timeout_s)
+		try:
+			server.ehlo()
+			server.starttls(context=get_ssl_context())
+			server.ehlo()
+			server.login(self.username, self.password)
+		except BaseException:
+			server.close()
+			raise
+		return server
+
+	def _disconnect(self) -> None:
+		"""
+		Close the current connection, if any.
+		"""
+		with self._lock:
+			if self._server is not None:
+				try:
+					self._server.quit()
+				except (smtplib.SMTPException, OSError):
+					self._server.close()
+				self._server = None
+
+	def _get_server(self) -> smtplib.SMTP:
+		"""
+		Return the current connection, and open a new one if needed.
+		"""
+		with self._lock:
+			if self._server is None:
+				self._server = self._connect()
+				self._start_keepalive()
+			return self._server
+
+	def _start_keepalive(self) -> None:
+		if self.keepalive_s is None or self._keepalive_thread is not None:
+			return
+
+		self._keepalive_thread = threading.Thread(
+			target=self._keepalive_loop,
+			name='ojala-smtp-keepalive',
+			daemon=True)
+		self._keepalive_thread.start()
+
+	def _keepalive_loop(self) -> None:
+		while not self._closed.wait(self.keepalive_s):
+			self.noop()
+
+	def noop(self) -> bool:
+		"""
+		Send a NOOP command to keep the connection alive. If the connection has
+		been closed by the server, a new one is opened.
+		:return: Returns `True` if the connection is alive.
+		"""
+		with self._lock:
+			if self._closed.is_set():
+				return False
+
+			try:
+				if self._server is not None:
+					code, _ = self._server.noop()
+					if code == 250:
+						return True
+				self._disconnect()
+				self._get_server()
+				return True
+			except (smtplib.SMTPException, OSError):
+				self._disconnect()
+				return False
+
+	def sendmail(
+		self,
+		from_addr: str,
+		to_addrs: Union[List[str], str],
+		msg: str,
+	) -> Dict[str, Tuple[int, bytes]]:
+		"""
+		Send an email with the current connection. If the server closed the
+		connection, a new one is opened and the email is sent again.
+		:param from_addr: The "From" address.
+		:param to_addrs: The recipients.
+		:param msg: The message.
+		:return: Returns the recipients that have been refused, as
+		`smtplib.SMTP.sendmail` does.
+		"""
+		with self._lock:
+			if self._closed.is_set():
+				raise smtplib.SMTPServerDisconnected(
+					'The SMTP session has been closed.')
+
+			try:
+				return self._get_server().sendmail(
+					from_addr=from_addr, to_addrs=to_addrs, msg=msg)
+			except smtplib.SMTPServerDisconnected:
+				self._disconnect()
+				return self._get_server().sendmail(
+					from_addr=from_addr, to_addrs=to_addrs, msg=msg)
+
+	def close(self) -> None:
+		"""
+		Close the connection and stop the keepalive thread.
+		"""
+		self._closed.set()
+		self._disconnect()
+		if self._keepalive_thread is not None:
+			self._keepalive_thread.join(timeout=self.timeout_s)
+			self._keepalive_thread = None
+
+	def members(self) -> tuple:
+		return self.host, self.port, self.username, self.password, self.timeout_s, self.keepalive_s
+
+	def __eq__(self, other) -> bool:
+		return isinstance(other,
+							SMTPSession) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'SMTPSession(host: {self.host}, port: {self.port}, username: {self.username}, timeout_s: {self.timeout_s}, keepalive_s: {self.keepalive_s})'
+
+
+def acquire_session(
+	host: str,
+	port: int,
+	username: str,
+	password: str,
+	timeout_s: Union[int, float] = 10,
+	keepalive_s: Union[int, float, None] = 60,
+) -> SMTPSession:
+	"""
+	Return the SMTP session for the given server and credentials. Notifiers
+	that use the same server share the same session. Every call must be matched
+	by a call to `release_session`.
+	:param host: The host of the server.
+	:param port: The SMTP port of the server.
+	:param username: The username to login to the SMTP server.
+	:param password: The password to login to the SMTP server.
+	:param timeout_s: The timeout, in seconds. Default to 10s.
+	:param keepalive_s: The delay between two NOOP commands, in seconds.
+	:return: Returns the shared session.
+	"""
+	key: tuple = (host, port, username, password, timeout_s, keepalive_s)
+	with _sessions_lock:
+		session, references = _sessions.get(key, (None, 0))
+		if session is None:
+			session = SMTPSession(
+				host=host,
+				port=port,
+				username=username,
+				password=password,
+				timeout_s=timeout_s,
+				keepalive_s=keepalive_s,
+			)
+		_sessions[key] = (session, references + 1)
+		return session
+
+
+def release_session(session: SMTPSession) -> None:
+	"""
+	Release a session returned by `acquire_session`. The connection is closed
+	once it has no more users.
+	:param session: The session to release.
+	"""
+	key: tuple = session.members()
+	with _sessions_lock:
+		shared_session, references = _sessions.get(key, (None, 0))
+		if shared_session is not session:
+			session.close()
+			return
+
+		if references > 1:
+			_sessions[key] = (session, references - 1)
+			return
+
+		del _sessions[key]
+
+	session.close()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+import datetime
+import email.utils
+import json
+import queue
+import sys
+import threading
+import time
+from typing import Optional, NoReturn, List, Dict, Any, Tuple, Mapping
+
+import urllib3
+
+import ojala_cita_previa.io.network as net
+from ojala_cita_previa.notification.abstract_notifier import Notifier
+from ojala_cita_previa.notification.rate_limit import suppressed_text
+
+# The statuses after which a request is sent again
+_RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+# The longest delay between two retries, in seconds
+_MAX_BACKOFF_S: float = 300
+
+_senders: Dict[tuple, Tuple['WebhookSender', int]] = {}
+_senders_lock: threading.Lock = threading.Lock()
+
+
+class WebhookSender:
+	"""
+	Post the events of the webhook notifiers to an URL, as JSON, from a
+	background thread.
+
+	The events submitted within `batch_window_s` seconds, such as the status
+	changes of several targets probed in the same tick, are posted together in
+	a single request. A failed request is sent again after a delay that doubles
+	after each retry, and the events submitted meanwhile join the next
+	request. The requests use the keep-alive connections of the network module.
+	"""
+
+	def __init__(
+		self,
+		url: str,
+		headers: Optional[Mapping[str, str]] = None,
+		timeout_s: float = 10,
+		batch_window_s: float = 0.5,
+		max_batch: int = 100,
+		max_retries: int = 5,
+		backoff_s: float = 1,
+	):
+		"""
+		:param url: The URL of the webhook.
+		:param headers: Additional HTTP headers, like an authorization token.
+		:param timeout_s: The timeout of a request, in seconds.
+		:param batch_window_s: How long to wait for other events before posting
+		an event, in seconds.
+		:param max_batch: The maximum number of events posted in one request.
+		:param max_retries: The number of times a failed request is sent again
+		before its events are dropped.
+		:param backoff_s: The delay before the first retry, in seconds.
+		"""
+		self.url = url
+		self.headers: Tuple[Tuple[str, str], ...] = tuple(
+			sorted((headers or {}).items()))
+		self.timeout_s = timeout_s
+		self.batch_window_s = batch_window_s
+		self.max_batch = max_batch
+		self.max_retries = max_retries
+		self.backoff_s = backoff_s
+		# The number of requests, of retries, and of dropped events
+		self.counts: Dict[str, int] = {
+			'request': 0,
+			'retry': 0,
+			'dropped': 0,
+		}
+		self._queue: queue.Queue = queue.Queue()
+		self._closing: threading.Event = threading.Event()
+		self._thread: threading.Thread = threading.Thread(
+			target=self._run, name='ojala-webhook', daemon=True)
+		self._thread.start()
+
+	def submit(self, event: Dict[str, Any]) -> None:
+		"""
+		Queue an event. It is posted in the background.
+		"""
+		self._queue.put(event)
+
+	def _collect(self, first: Dict[str, Any]) -> List[Dict[str, Any]]:
+		"""
+		Collect the events submitted within the batch window after `first`.
+		"""
+		batch: List[Dict[str, Any]] = [first]
+		deadline: float = time.monotonic() + self.batch_window_s
+		while len(batch) < self.max_batch:
+			remaining_s: float = deadline - time.monotonic()
+			try:
+				event: Optional[Dict[str, Any]] = self._queue.get(
+					timeout=remaining_s
+				) if remaining_s > 0 else self._queue.get_nowait()
+			except queue.Empty:
+				break
+			if event is None:
+				# Stop once this batch is posted
+				self._queue.put(None)
+				break
+			batch.append(event)
+		return batch
+
+	def _run(self) -> None:
+		while True:
+			event: Optional[Dict[str, Any]] = self._queue.get()
+			if event is None:
+				return
+			self._post(self._collect(event))
+
+	def _post(self, events: List[Dict[str, Any]]) -> None:
+		"""
+		Post a batch of events, and send it again until it succeeds or the
+		retries are exhausted.
+		"""
+		body: bytes = json.dumps({
+			'text': '\n'.join(event['text'] for event in events),
+			'events': events,
+		}).encode('utf-8')
+		headers: Dict[str, str] = {'Content-Type': 'application/json'}
+		headers.update(self.headers)
+		error: str = ''
+		for attempt in range(self.max_retries + 1):
+			if attempt > 0:
+				self.counts['retry'] += 1
+			# The supervisor process of the workers does not probe, so it never
+			# initializes the network module
+			if not net.initialized():
+				net.init()
+
+			delay_s: float = min(self.backoff_s * 2**attempt, _MAX_BACKOFF_S)
+			self.counts['request'] += 1
+			try:
+				response: urllib3.response.HTTPResponse = net.request(
+					self.url,
+					method='POST',
+					body=body,
+					headers=headers,
+					timeout=urllib3.Timeout(total=self.timeout_s),
+					retries=False,
+				)
+			except (TimeoutError, urllib3.exceptions.HTTPError) as e:
+				error = str(e)
+			else:
+				if 200 <= response.status < 300:
+					return
+				error = f'HTTP code {response.status}'
+				if response.status not in _RETRY_STATUSES:
+					break
+				retry_after_s: Optional[float] = _retry_after(
+					response.headers.get('Retry-After'))
+				if retry_after_s is not None:
+					delay_s = min(max(delay_s, retry_after_s), _MAX_BACKOFF_S)
+
+			# While closing, the remaining retries are not delayed
+			if attempt < self.max_retries:
+				self._closing.wait(delay_s)
+
+		self.counts['dropped'] += len(events)
+		print(
+			f'Could not post {len(events)} events to the webhook {self.url}: {error}',
+			file=sys.stderr)
+
+	def close(self, timeout_s: Optional[float] = None) -> None:
+		"""
+		Post the pending events, and stop the background thread.
+		:param timeout_s: The maximum time to wait for the pending events, in
+		seconds. Defaults to twice the timeout of a request.
+		"""
+		self._closing.set()
+		self._queue.put(None)
+		self._thread.join(
+			timeout=timeout_s if timeout_s is not None else 2 * self.timeout_s)
+
+	def members(self) -> tuple:
+		return self.url, self.headers, self.timeout_s, self.batch_window_s, self.max_batch, self.max_retries, self.backoff_s
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, WebhookSender) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'WebhookSender(url: {self.url}, timeout_s: {self.timeout_s}, batch_window_s: {self.batch_window_s}, max_retries: {self.max_retries}, backoff_s: {self.backoff_s}, counts: {self.counts})'
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+	"""
+	Parse the "Retry-After" header, a number of seconds or an HTTP date.
+	"""
+	if value is None:
+		return None
+	try:
+		return max(0.0, float(value))
+	except ValueError:
+		pass
+	try:
+		date: datetime.datetime = email.utils.parsedate_to_datetime(value)
+	except (TypeError, ValueError):
+		return None
+	return max(0.0, date.timestamp() - time.time())
+
+
+def acquire_sender(
+	url: str,
+	headers: Optional[Mapping[str, str]] = None,
+	timeout_s: float = 10,
+	batch_window_s: float = 0.5,
+	max_retries: int = 5,
+	backoff_s: float = 1,
+) -> WebhookSender:
+	"""
+	Return the sender for the given webhook. Notifiers that use the same
+	webhook share the same sender, so their events are batched together. Every
+	call must be matched by a call to `release_sender`.
+	:param url: The URL of the webhook.
+	:param headers: Additional HTTP headers.
+	:param timeout_s: The timeout of a request, in seconds.
+	:param batch_window_s: How long to wait for other events before posting
+	an event, in seconds.
+	:param max_retries: The number of times a failed request is sent again.
+	:param backoff_s: The delay before the first retry, in seconds.
+	:return: Returns the shared sender.
+	"""
+	key: tuple = (url, tuple(sorted(
+		(headers or
+			{}).items())), timeout_s, batch_window_s, max_retries, backoff_s)
+	with _senders_lock:
+		sender, references = _senders.get(key, (None, 0))
+		if sender is None:
+			sender = WebhookSender(
+				url=url,
+				headers=headers,
+				timeout_s=timeout_s,
+				batch_window_s=batch_window_s,
+				max_retries=max_retries,
+				backoff_s=backoff_s,
+			)
+		_senders[key] = (sender, references + 1)
+		return sender
+
+
+def release_sender(sender: WebhookSender) -> None:
+	"""
+	Release a sender returned by `acquire_sender`. Its pending events are posted
+	and its thread is stopped once it has no more users.
+	"""
+	key: tuple = (sender.url, sender.headers, sender.timeout_s,
+					sender.batch_window_s, sender.max_retries, sender.backoff_s)
+	with _senders_lock:
+		shared_sender, references = _senders.get(key, (None, 0))
+		if shared_sender is sender and references > 1:
+			_senders[key] = (sender, references - 1)
+			return
+		if shared_sender is sender:
+			del _senders[key]
+
+	sender.close()
+
+
+class WebhookNotifier(Notifier):
+	"""
+	Notifier that posts the changes to a webhook, as JSON, like a chat or a
+	paging system.
+
+	The events are posted in the background by a sender shared by all the
+	notifiers of the same webhook, so the probes are never blocked, and the
+	changes of several targets are posted in a single request. The body of a
+	request is:
+
+	{"text": "...", "events": [{"url": ..., "online": ..., "reason": ...,
+	"time": ..., "suppressed": ..., "text": ...}, ...]}
+
+	where "text" is the text of the events, one per line, "time" the UNIX
+	timestamp of the event, and "suppressed" the number of events suppressed
+	by a rate limit before it.
+	"""
+
+	def __init__(
+		self,
+		website_url: str,
+		url: str,
+		headers: Optional[Mapping[str, str]] = None,
+		timeout_s: float = 10,
+		batch_window_s: float = 0.5,
+		max_retries: int = 5,
+		backoff_s: float = 1,
+	):
+		self.website_url = website_url
+		self.url = url
+		self.headers: Tuple[Tuple[str, str], ...] = tuple(
+			sorted((headers or {}).items()))
+		self.timeout_s = timeout_s
+		self.batch_window_s = batch_window_s
+		self.max_retries = max_retries
+		self.backoff_s = backoff_s
+
+		self.sender: WebhookSender = acquire_sender(
+			url=url,
+			headers=headers,
+			timeout_s=timeout_s,
+			batch_window_s=batch_window_s,
+			max_retries=max_retries,
+			backoff_s=backoff_s,
+		)
+
+	def _submit(
+		self,
+		online: bool,
+		reason: Optional[str],
+		suppressed: int,
+		text: str,
+	) -> None:
+		self.sender.submit({
+			'url': self.website_url,
+			'online': online,
+			'reason': reason,
+			'time': time.time(),
+			'suppressed': suppressed,
+			'text': text + suppressed_text(suppressed),
+		})
+
+	def success(self, *args, suppressed: int = 0, **kwargs) -> NoReturn:
+		self._submit(
+			online=True,
+			reason=None,
+			suppressed=suppressed,
+			text=f'The website {self.website_url} is online!')
+
+	def error(
+		self,
+		reason: Optional[str] = None,
+		*args,
+		suppressed: int = 0,
+		**kwargs,
+	) -> NoReturn:
+		self._submit(
+			online=False,
+			reason=reason,
+			suppressed=suppressed,
+			text=f'The website {self.website_url} is offline{f": {reason}" if reason is not None else "."}'
+		)
+
+	def close(self) -> NoReturn:
+		release_sender(self.sender)
+
+	def members(self) -> tuple:
+		return self.website_url, self.url, self.headers, self.timeout_s, self.batch_window_s, self.max_retries, self.backoff_s
+
+	def __eq__(self, other) -> bool:
+		return isinstance(
+			other, WebhookNotifier) and self.members() == other.members()
+
+	def __hash__(self) -> int:
+		return hash(self.members())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'WebhookNotifier(website_url: {self.website_url}, url: {self.url}, timeout_s: {self.timeout_s}, batch_window_s: {self.batch_window_s}, max_retries: {self.max_retries}, backoff_s: {self.backoff_s})'
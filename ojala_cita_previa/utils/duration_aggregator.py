@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+from array import array
+from typing import Optional, Union, Dict, Sequence, Tuple
+
+# Each power of two is split in 2^SUB_BUCKET_BITS buckets, so the relative
+# error of the percentiles is at most 1/16th
+SUB_BUCKET_BITS: int = 4
+SUB_BUCKET_COUNT: int = 1 << SUB_BUCKET_BITS
+# Enough buckets to hold any duration up to 2^64 ns
+BUCKET_COUNT: int = (64 - SUB_BUCKET_BITS + 1) * SUB_BUCKET_COUNT
+
+DEFAULT_PERCENTILES: Sequence[float] = (50, 90, 99)
+
+
+def _bucket_index(value_ns: int) -> int:
+	shift: int = value_ns.bit_length() - SUB_BUCKET_BITS - 1
+	if shift <= 0:
+		return value_ns
+	return shift * SUB_BUCKET_COUNT + (value_ns >> shift)
+
+
+def _bucket_bounds(index: int) -> Tuple[int, int]:
+	"""
+	Return the lowest and the highest values, in nanoseconds, that fall in the
+	bucket at the given index.
+	"""
+	if index < 2 * SUB_BUCKET_COUNT:
+		return index, index
+	shift: int = index // SUB_BUCKET_COUNT - 1
+	mantissa: int = index - shift * SUB_BUCKET_COUNT
+	return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+class DurationAggregator:
+	"""
+	Streaming summary of durations: count, minimum, maximum, mean and
+	percentiles.
+
+	The durations are counted in a fixed array of logarithmic buckets (like an
+	HDR histogram), so recording a duration never allocates memory, and the
+	percentiles are estimated with a relative error of at most 1/16th.
+	It is thread-safe.
+	"""
+
+	__slots__ = ('_counts', '_count', '_sum_ns', '_min_ns', '_max_ns', '_lock')
+
+	def __init__(self):
+		self._counts: array = array('Q', bytes(8 * BUCKET_COUNT))
+		self._count: int = 0
+		self._sum_ns: int = 0
+		self._min_ns: Optional[int] = None
+		self._max_ns: Optional[int] = None
+		self._lock: threading.Lock = threading.Lock()
+
+	def record(self, duration_s: Union[int, float]) -> None:
+		"""
+		Record a duration.
+		:param duration_s: The duration, in seconds.
+		"""
+		self.record_ns(int(duration_s * 1_000_000_000))
+
+	def record_ns(self, duration_ns: int) -> None:
+		"""
+		Record a duration.
+		:param duration_ns: The duration, in nanoseconds. Negative durations are
+		counted as 0.
+		"""
+		if duration_ns < 0:
+			duration_ns = 0
+		index: int = _bucket_index(duration_ns)
+		with self._lock:
+			self._counts[index] += 1
+			self._count += 1
+			self._sum_ns += duration_ns
+			if self._min_ns is None or duration_ns < self._min_ns:
+				self._min_ns = duration_ns
+			if self._max_ns is None or duration_ns > self._max_ns:
+				self._max_ns = duration_ns
+
+	def reset(self) -> None:
+		with self._lock:
+			for i in range(BUCKET_COUNT):
+				self._counts[i] = 0
+			self._count = 0
+			self._sum_ns = 0
+			self._min_ns = None
+			self._max_ns = None
+
+	@property
+	def count(self) -> int:
+		return self._count
+
+	@property
+	def min(self) -> Optional[float]:
+		"""
+		The shortest duration, in seconds, or `None` if nothing was recorded.
+		"""
+		min_ns: Optional[int] = self._min_ns
+		return min_ns / 1e9 if min_ns is not None else None
+
+	@property
+	def max(self) -> Optional[float]:
+		"""
+		The longest duration, in seconds, or `None` if nothing was recorded.
+		"""
+		max_ns: Optional[int] = self._max_ns
+		return max_ns / 1e9 if max_ns is not None else None
+
+	@property
+	def mean(self) -> Optional[float]:
+		"""
+		The mean duration, in seconds, or `None` if nothing was recorded.
+		"""
+		with self._lock:
+			if self._count == 0:
+				return None
+			return self._sum_ns / self._count / 1e9
+
+	def percentile(self, percentile: Union[int, float]) -> Optional[float]:
+		"""
+		Estimate a percentile of the durations.
+		:param percentile: The percentile, between 0 and 100.
+		:return: Returns the estimated duration in seconds, or `None` if
+		nothing was recorded.
+		"""
+		if not 0 <= percentile <= 100:
+			raise ValueError(
+				f'The percentile must be between 0 and 100, got {percentile}.')
+
+		with self._lock:
+			if self._count == 0:
+				return None
+			# Rank of the wanted duration, starting from 1
+			rank: int = max(1, int(-(-self._count * percentile // 100)))
+			cumulative: int = 0
+			for index, count in enumerate(self._counts):
+				cumulative += count
+				if cumulative >= rank:
+					low, high = _bucket_bounds(index)
+					value_ns: int = (low + high) // 2
+					# The estimate can't be outside of the recorded durations
+					value_ns = max(self._min_ns, min(self._max_ns, value_ns))
+					return value_ns / 1e9
+		return self.max
+
+	def summary(
+		self,
+		percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+	) -> Dict[str, Optional[float]]:
+		"""
+		Return the count, the minimum, the maximum, the mean and the given
+		percentiles (under the keys "p50", "p90"...) in a dictionary. The
+		durations are in seconds.
+		"""
+		summary: Dict[str, Optional[float]] = {
+			'count': self.count,
+			'min': self.min,
+			'max': self.max,
+			'mean': self.mean,
+		}
+		for percentile in percentiles:
+			summary[f'p{percentile:g}'] = self.percentile(percentile)
+		return summary
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'DurationAggregator(count: {self.count}, min: {self.min}, max: {self.max}, mean: {self.mean})'
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+import bisect
+import hashlib
+from typing import List, Hashable, Sequence, Dict
+
+
+class HashRing:
+	"""
+	Consistent hashing ring, that assigns keys to nodes.
+
+	Each node is placed several times on the ring (its replicas), and a key is
+	assigned to the first node that follows its hash. When a node is added or
+	removed, only the keys of this node move to another one.
+	"""
+
+	def __init__(self, nodes: Sequence[Hashable] = (), replicas: int = 160):
+		"""
+		:param nodes: The nodes.
+		:param replicas: The number of times each node is placed on the ring.
+		The more replicas, the more even the distribution of the keys.
+		"""
+		if replicas < 1:
+			raise ValueError(
+				f'The number of replicas must be at least 1, got {replicas}.')
+
+		self.replicas = replicas
+		self._hashes: List[int] = []
+		self._nodes: Dict[int, Hashable] = {}
+		for node in nodes:
+			self.add(node)
+
+	@staticmethod
+	def hash(key: str) -> int:
+		return int.from_bytes(
+			hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+	def add(self, node: Hashable) -> None:
+		for replica in range(self.replicas):
+			node_hash: int = self.hash(f'{node}#{replica}')
+			if node_hash not in self._nodes:
+				bisect.insort(self._hashes, node_hash)
+			self._nodes[node_hash] = node
+
+	def remove(self, node: Hashable) -> None:
+		for replica in range(self.replicas):
+			node_hash: int = self.hash(f'{node}#{replica}')
+			if self._nodes.get(node_hash) == node:
+				del self._nodes[node_hash]
+				self._hashes.remove(node_hash)
+
+	def get(self, key: str) -> Hashable:
+		"""
+		Return the node assigned to `key`.
+		:raise LookupError: Raised if the ring is empty.
+		"""
+		if len(self._hashes) == 0:
+			raise LookupError('The ring has no nodes.')
+		index: int = bisect.bisect(self._hashes, self.hash(key))
+		return self._nodes[self._hashes[index % len(self._hashes)]]
+
+	def nodes(self) -> List[Hashable]:
+		return list(dict.fromkeys(self._nodes[h] for h in self._hashes))
+
+	def __len__(self) -> int:
+		return len(self.nodes())
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'HashRing(nodes: {self.nodes()}, replicas: {self.replicas})'
@@ -1,52 +1,168 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import functools
 import time
-from typing import Optional
+from typing import Optional, List, Callable, Any
 
+from ojala_cita_previa.utils.duration_aggregator import DurationAggregator
 
-class Stopwatch:
-
-	def __init__(self, start_now: bool = True):
-		self._begin = time.time() if start_now else -1
-		self._end = -1
+NS_PER_S: int = 1_000_000_000
 
-	def start(self):
-		self._begin = time.time()
-		self._end = -1
 
-	def stop(self):
-		if self._begin >= 0:
-			self._end = time.time()
+class Stopwatch:
+	"""
+	Measure elapsed time with the monotonic, high-resolution clock
+	`time.perf_counter_ns`.
+
+	It can be started and stopped manually, used as a context manager, or
+	used to time a function with `Stopwatch.timed`. Each measure can be fed to
+	a `DurationAggregator`.
+	"""
+
+	__slots__ = ('_begin', '_end', '_last_lap', '_laps', 'aggregator')
+
+	def __init__(
+		self,
+		start_now: bool = True,
+		aggregator: Optional[DurationAggregator] = None,
+	):
+		"""
+		:param start_now: If `True`, the stopwatch is started immediately.
+		:param aggregator: If given, every measure is recorded in it when the
+		stopwatch is stopped.
+		"""
+		self._begin: Optional[int] = time.perf_counter_ns(
+		) if start_now else None
+		self._end: Optional[int] = None
+		self._last_lap: Optional[int] = self._begin
+		self._laps: List[int] = []
+		self.aggregator = aggregator
+
+	def start(self) -> None:
+		self._begin = time.perf_counter_ns()
+		self._end = None
+		self._last_lap = self._begin
+		self._laps.clear()
+
+	def stop(self) -> Optional[float]:
+		"""
+		Stop the stopwatch.
+		:return: Returns the elapsed time in seconds, or `None` if the stopwatch
+		was not started.
+		"""
+		if self._begin is not None and self._end is None:
+			self._end = time.perf_counter_ns()
+			if self.aggregator is not None:
+				self.aggregator.record_ns(self._end - self._begin)
 		return self.elapsed()
 
 	def elapsed(self) -> Optional[float]:
-		if self._begin >= 0 and self._end >= 0:
+		"""
+		Return the time between the start and the stop, in seconds, or `None`
+		if the stopwatch is not stopped.
+		"""
+		elapsed_ns: Optional[int] = self.elapsed_ns()
+		return elapsed_ns / NS_PER_S if elapsed_ns is not None else None
+
+	def elapsed_ns(self) -> Optional[int]:
+		"""
+		Return the time between the start and the stop, in nanoseconds, or
+		`None` if the stopwatch is not stopped.
+		"""
+		if self._begin is not None and self._end is not None:
 			return self._end - self._begin
 		else:
 			return None
 
+	def split(self) -> Optional[float]:
+		"""
+		Return the time since the start in seconds, without stopping the
+		stopwatch, or `None` if it was not started.
+		"""
+		if self._begin is None:
+			return None
+		end: int = self._end if self._end is not None else time.perf_counter_ns(
+		)
+		return (end - self._begin) / NS_PER_S
+
+	def lap(self) -> Optional[float]:
+		"""
+		Record a lap, and return the time since the previous lap (or the start)
+		in seconds, or `None` if the stopwatch was not started.
+		"""
+		if self._last_lap is None:
+			return None
+		now: int = time.perf_counter_ns()
+		lap_ns: int = now - self._last_lap
+		self._last_lap = now
+		self._laps.append(lap_ns)
+		return lap_ns / NS_PER_S
+
+	def laps(self) -> List[float]:
+		"""
+		Return the duration of all the laps recorded since the start, in
+		seconds.
+		"""
+		return [lap_ns / NS_PER_S for lap_ns in self._laps]
+
+	@staticmethod
+	def timed(aggregator: DurationAggregator) -> Callable[[Callable], Callable]:
+		"""
+		Decorator that records the duration of every call of the decorated
+		function in `aggregator`.
+		:param aggregator: The aggregator.
+		:return: Returns the decorator.
+		"""
+
+		def decorator(function: Callable) -> Callable:
+
+			@functools.wraps(function)
+			def wrapper(*args, **kwargs) -> Any:
+				begin: int = time.perf_counter_ns()
+				try:
+					return function(*args, **kwargs)
+				finally:
+					aggregator.record_ns(time.perf_counter_ns() - begin)
+
+			return wrapper
+
+		return decorator
+
 	# GETTERS & SETTERS
 
-	def get_begin(self) -> float:
+	def get_begin(self) -> Optional[int]:
 		return self._begin
 
-	def set_begin(self, begin: float) -> None:
+	def set_begin(self, begin: Optional[int]) -> None:
 		self._begin = begin
 
-	begin = property(get_begin, set_begin)
+	begin = property(
+		get_begin,
+		set_begin,
+		doc='The value of `time.perf_counter_ns()` when the stopwatch started.')
 
-	def get_end(self) -> float:
+	def get_end(self) -> Optional[int]:
 		return self._end
 
-	def set_end(self, end: float) -> None:
+	def set_end(self, end: Optional[int]) -> None:
 		self._end = end
 
-	end = property(get_end, set_end)
+	end = property(
+		get_end,
+		set_end,
+		doc='The value of `time.perf_counter_ns()` when the stopwatch stopped.')
 
 	# MAGIC FUNCTIONS
 
+	def __enter__(self) -> 'Stopwatch':
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+		self.stop()
+
 	def __call__(self, *args, **kwargs) -> Optional[float]:
-		if self._begin >= 0 and self._end == -1:
+		if self._begin is not None and self._end is None:
 			self.stop()
 		else:
 			self.start()
@@ -58,8 +174,11 @@ class Stopwatch:
 		else:
 			return False
 
-	def __str__(self):
-		return self.elapsed()
+	def __hash__(self) -> int:
+		return hash((self._begin, self._end))
 
-	def __repr__(self):
-		return self.elapsed()
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'Stopwatch(elapsed: {self.elapsed()})'
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucket:
+	"""
+	Token bucket: it holds up to `capacity` tokens, and a token is added every
+	`interval_s` seconds. Each action consumes a token, so at most `capacity`
+	actions can happen at once, and one every `interval_s` seconds on average.
+	It is thread-safe.
+	"""
+
+	def __init__(
+		self,
+		capacity: int,
+		interval_s: float,
+		clock: Callable[[], float] = time.monotonic,
+	):
+		"""
+		:param capacity: The maximum number of tokens. The bucket starts full.
+		:param interval_s: The time it takes to add a token, in seconds.
+		:param clock: The monotonic clock, in seconds.
+		:raise ValueError: Raised if the capacity or the interval is invalid.
+		"""
+		if capacity < 1:
+			raise ValueError(
+				f'The capacity of a token bucket must be at least 1, got {capacity}.'
+			)
+		if interval_s <= 0:
+			raise ValueError(
+				f'The interval of a token bucket must be positive, got {interval_s} seconds.'
+			)
+
+		self.capacity = capacity
+		self.interval_s = interval_s
+		self.clock = clock
+		self._tokens: float = capacity
+		self._updated: float = clock()
+		self._lock: threading.Lock = threading.Lock()
+
+	def _refill(self) -> None:
+		"""
+		Add the tokens earned since the last update. Must be called with the lock
+		acquired.
+		"""
+		now: float = self.clock()
+		self._tokens = min(
+			self.capacity,
+			self._tokens + (now - self._updated) / self.interval_s)
+		self._updated = now
+
+	def try_acquire(self) -> bool:
+		"""
+		Consume a token if there is one.
+		:return: Returns `True` if a token has been consumed.
+		"""
+		with self._lock:
+			self._refill()
+			if self._tokens < 1:
+				return False
+			self._tokens -= 1
+			return True
+
+	def wait_s(self) -> float:
+		"""
+		Return the time until the next token is available, in seconds.
+		"""
+		with self._lock:
+			self._refill()
+			return max(0.0, (1 - self._tokens) * self.interval_s)
+
+	@property
+	def tokens(self) -> float:
+		"""
+		The number of tokens currently available.
+		"""
+		with self._lock:
+			self._refill()
+			return self._tokens
+
+	def __str__(self) -> str:
+		return self.__repr__()
+
+	def __repr__(self) -> str:
+		return f'TokenBucket(capacity: {self.capacity}, interval_s: {self.interval_s}, tokens: {self.tokens:.2f})'